@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 from decouple import config
+from corsheaders.defaults import default_headers
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -94,6 +95,10 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # A file rather than the in-memory default: the concurrency tests run
+        # threads with their own connections, which must wait for each
+        # other's locks instead of failing with "database table is locked"
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -176,6 +181,20 @@ SIMPLE_JWT = {
     'UPDATE_LAST_LOGIN': True,
 }
 
+# Caches. 'catalog' holds the public catalog API responses (see
+# catalog.response_cache); point it at a shared file or Redis cache when
+# running several workers, e.g. CATALOG_CACHE_BACKEND=
+# django.core.cache.backends.redis.RedisCache and CATALOG_CACHE_LOCATION=redis://...
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': config('CATALOG_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CATALOG_CACHE_LOCATION', default='catalog-responses'),
+    },
+}
+
 # CORS settings (for React frontend)
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # React development server (Create React App)
@@ -189,6 +208,10 @@ CORS_ALLOWED_ORIGINS = [
 # For development only - allows all origins (REMOVE in production)
 CORS_ALLOW_ALL_ORIGINS = config('CORS_ALLOW_ALL_ORIGINS', default=True, cast=bool)
 
+# Order and cart mutations accept an Idempotency-Key (see orders.idempotency)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
+
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -10,6 +10,16 @@ from django.utils.safestring import mark_safe
 from django.db.models import Count, Avg
 from django.contrib.admin import SimpleListFilter
 from .models import Category, Brand, Product, ProductImage, ProductReview
+from .ratings import set_reviews_approval
+from . import counters, facets, response_cache
+
+
+def catalog_changed():
+    """Bulk update() bypasses the signals that keep cached catalog data current"""
+    counters.refresh(Product)
+    facets.invalidate()
+    response_cache.invalidate()
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -42,7 +52,7 @@ class ProductImageInline(admin.TabularInline):
     """Inline admin for product images"""
     model = ProductImage
     extra = 1
-    fields = ['image', 'alt_text', 'is_primary', 'sort_order', 'image_preview']
+    fields = ['image', 'alt_text', 'is_primary', 'is_try_on_garment', 'sort_order', 'image_preview']
     readonly_fields = ['image_preview']
     
     def image_preview(self, obj):
@@ -181,30 +191,35 @@ class ProductAdmin(admin.ModelAdmin):
     def make_available(self, request, queryset):
         """Bulk action to make products available"""
         updated = queryset.update(is_available=True)
+        catalog_changed()
         self.message_user(request, f'{updated} products marked as available.')
     make_available.short_description = "Mark selected products as available"
     
     def make_unavailable(self, request, queryset):
         """Bulk action to make products unavailable"""
         updated = queryset.update(is_available=False)
+        catalog_changed()
         self.message_user(request, f'{updated} products marked as unavailable.')
     make_unavailable.short_description = "Mark selected products as unavailable"
     
     def enable_try_on(self, request, queryset):
         """Bulk action to enable try-on for products"""
         updated = queryset.update(is_try_on_enabled=True)
+        catalog_changed()
         self.message_user(request, f'{updated} products enabled for try-on.')
     enable_try_on.short_description = "Enable try-on for selected products"
     
     def disable_try_on(self, request, queryset):
         """Bulk action to disable try-on for products"""
         updated = queryset.update(is_try_on_enabled=False)
+        catalog_changed()
         self.message_user(request, f'{updated} products disabled for try-on.')
     disable_try_on.short_description = "Disable try-on for selected products"
     
     def mark_featured(self, request, queryset):
         """Bulk action to mark products as featured"""
         updated = queryset.update(is_featured=True)
+        catalog_changed()
         self.message_user(request, f'{updated} products marked as featured.')
     mark_featured.short_description = "Mark selected products as featured"
     
@@ -224,8 +239,8 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
     """Admin configuration for ProductImage model"""
-    list_display = ['product', 'image_preview', 'alt_text', 'is_primary', 'sort_order', 'created_at']
-    list_filter = ['is_primary', 'created_at']
+    list_display = ['product', 'image_preview', 'alt_text', 'is_primary', 'is_try_on_garment', 'sort_order', 'created_at']
+    list_filter = ['is_primary', 'is_try_on_garment', 'created_at']
     search_fields = ['product__name', 'alt_text']
     ordering = ['product', 'sort_order']
     
@@ -265,13 +280,13 @@ class ProductReviewAdmin(admin.ModelAdmin):
     
     def approve_reviews(self, request, queryset):
         """Bulk action to approve reviews"""
-        updated = queryset.update(is_approved=True)
+        updated = set_reviews_approval(queryset, True)
         self.message_user(request, f'{updated} reviews approved.')
     approve_reviews.short_description = "Approve selected reviews"
     
     def disapprove_reviews(self, request, queryset):
         """Bulk action to disapprove reviews"""
-        updated = queryset.update(is_approved=False)
+        updated = set_reviews_approval(queryset, False)
         self.message_user(request, f'{updated} reviews disapproved.')
     disapprove_reviews.short_description = "Disapprove selected reviews"
 
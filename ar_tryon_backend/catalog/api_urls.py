@@ -10,6 +10,7 @@ app_name = 'catalog_api'
 
 urlpatterns = [
     # Product API endpoints
+    path('suggest/', api_views.suggest_view, name='suggest'),
     path('products/', api_views.ProductListAPIView.as_view(), name='product_list_api'),
     path('products/<slug:slug>/', api_views.ProductDetailAPIView.as_view(), name='product_detail_api'),
     
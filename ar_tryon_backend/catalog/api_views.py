@@ -5,68 +5,62 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from django.db.models import Q
+from django.utils.decorators import method_decorator
 from .models import Product, Category, Brand
-from .serializers import ProductSerializer, CategorySerializer, BrandSerializer
+from .counters import get_counters
+from .pagination import ProductPageNumberPagination, KEYSET_ORDERINGS
+from .popularity import record_view
+from .response_cache import cached_response
+from .facets import parse_filters, apply_filters, get_facets
+from .search import order_by_relevance
+from .suggest import suggest
+from .serializers import (
+    ProductSerializer, ProductListSerializer, ProductCardSerializer,
+    CategorySerializer, BrandSerializer
+)
 
 
+def _record_cached_view(meta):
+    """A product detail served from the cache still counts as a view"""
+    record_view(meta['product_id'])
+
+
+@method_decorator(cached_response(), name='dispatch')
 class ProductListAPIView(generics.ListAPIView):
     """
-    API endpoint for listing products with filtering and search
+    API endpoint for listing products with filtering and search.
+    Pass `view=card` for the slim card representation, `facets=true`
+    to include facet counts for the active filters and `pagination=cursor`
+    for keyset pagination (name, price, newest and popular sorts).
     """
-    serializer_class = ProductSerializer
+    serializer_class = ProductListSerializer
     permission_classes = [AllowAny]  # Allow public access
+    pagination_class = ProductPageNumberPagination
+    
+    def get_serializer_class(self):
+        if self.request.query_params.get('view') == 'card':
+            return ProductCardSerializer
+        return ProductListSerializer
     
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True).select_related('category', 'brand')
-        
-        # Search functionality
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search) |
-                Q(brand__name__icontains=search)
-            )
-        
-        # Category filter
-        category = self.request.query_params.get('category', None)
-        if category:
-            queryset = queryset.filter(category__slug=category)
-        
-        # Brand filter
-        brand = self.request.query_params.get('brand', None)
-        if brand:
-            queryset = queryset.filter(brand__slug=brand)
-        
-        # Gender filter
-        gender = self.request.query_params.get('gender', None)
-        if gender:
-            queryset = queryset.filter(gender=gender)
-        
-        # Price range filter
-        min_price = self.request.query_params.get('min_price', None)
-        max_price = self.request.query_params.get('max_price', None)
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+        queryset = Product.objects.filter(is_active=True).with_listing_relations()
         
-        # Featured filter
-        featured = self.request.query_params.get('featured', None)
-        if featured and featured.lower() == 'true':
-            queryset = queryset.filter(is_featured=True)
+        # Search (full-text index), category, brand, gender, price range and featured
+        self.filters = parse_filters(self.request.query_params)
+        queryset = apply_filters(queryset, self.filters)
         
-        # Sorting
-        sort = self.request.query_params.get('sort', 'name')
-        if sort == 'price_low':
+        # Sorting (search results default to relevance)
+        sort = self.sort = self.request.query_params.get('sort', 'relevance' if self.filters.search else 'name')
+        if sort == 'relevance':
+            queryset = order_by_relevance(queryset)
+        elif sort == 'price_low':
             queryset = queryset.order_by('price')
         elif sort == 'price_high':
             queryset = queryset.order_by('-price')
         elif sort == 'newest':
             queryset = queryset.order_by('-created_at')
         elif sort == 'popular':
-            queryset = queryset.order_by('-view_count')
+            queryset = queryset.order_by('-popularity_score', '-id')
         else:
             queryset = queryset.order_by('name')
         
@@ -80,18 +74,41 @@ class ProductListAPIView(generics.ListAPIView):
                 pass
         
         return queryset
+    
+    def get_keyset_ordering(self):
+        """Composite sort key for ?pagination=cursor, if the chosen sort has one"""
+        if self.request.query_params.get('limit'):
+            return None
+        return KEYSET_ORDERINGS.get(self.sort)
+    
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets', '').lower() == 'true':
+            response.data['facets'] = get_facets(
+                'api', Product.objects.filter(is_active=True), self.filters
+            )
+        return response
 
 
+@method_decorator(cached_response(on_hit=_record_cached_view), name='dispatch')
 class ProductDetailAPIView(generics.RetrieveAPIView):
     """
     API endpoint for retrieving a single product
     """
-    queryset = Product.objects.filter(is_active=True)
+    queryset = Product.objects.filter(is_active=True).with_listing_relations()
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]  # Allow public access
     lookup_field = 'slug'
+    
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        record_view(instance.pk)
+        response = Response(self.get_serializer(instance).data)
+        response.cache_meta = {'product_id': instance.pk}
+        return response
 
 
+@method_decorator(cached_response(), name='dispatch')
 class CategoryListAPIView(generics.ListAPIView):
     """
     API endpoint for listing categories
@@ -101,6 +118,7 @@ class CategoryListAPIView(generics.ListAPIView):
     permission_classes = [AllowAny]  # Allow public access
 
 
+@method_decorator(cached_response(), name='dispatch')
 class BrandListAPIView(generics.ListAPIView):
     """
     API endpoint for listing brands
@@ -110,17 +128,36 @@ class BrandListAPIView(generics.ListAPIView):
     permission_classes = [AllowAny]  # Allow public access
 
 
+@cached_response()
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def catalog_stats(request):
     """
-    API endpoint for catalog statistics
+    API endpoint for catalog statistics, read from the maintained counters
+    (see catalog.counters) in one query.
     """
+    counts = get_counters()
     stats = {
-        'total_products': Product.objects.filter(is_active=True).count(),
-        'total_categories': Category.objects.filter(is_active=True).count(),
-        'total_brands': Brand.objects.filter(is_active=True).count(),
-        'featured_products': Product.objects.filter(is_active=True, is_featured=True).count(),
-        'ar_enabled_products': Product.objects.filter(is_active=True, ar_enabled=True).count(),
+        'total_products': counts.active_products,
+        'total_categories': counts.categories,
+        'total_brands': counts.brands,
+        'featured_products': counts.featured_products,
+        'ar_enabled_products': counts.try_on_products,
     }
     return Response(stats)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def suggest_view(request):
+    """
+    API endpoint for search-box autocomplete.
+    Returns up to `limit` (default 8, max 20) products, brands and categories
+    with a word starting with `q`, served from the in-process prefix index.
+    """
+    query = request.query_params.get('q', '')
+    try:
+        limit = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+    except ValueError:
+        limit = 8
+    return Response({'query': query, 'results': suggest(query, limit)})
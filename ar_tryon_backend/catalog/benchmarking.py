@@ -0,0 +1,183 @@
+"""
+Helpers shared by the benchmark management commands.
+They build large throwaway catalogs with bulk inserts and measure queries and latency.
+The commands only measure; what they exercise is checked by the apps' tests.
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from . import counters
+from .models import Category, Brand, Product, ProductImage
+
+
+class BenchmarkRollback(Exception):
+    """Raised inside `rolled_back()` to discard everything the benchmark wrote"""
+
+
+@contextmanager
+def rolled_back():
+    """
+    Run a block inside a transaction that is always rolled back,
+    so benchmarks never leave fixture data behind.
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise BenchmarkRollback
+    except BenchmarkRollback:
+        pass
+
+
+def build_catalog_fixture(product_count, images_per_product=3, category_count=12,
+                          brand_count=20, batch_size=2000, seed=42):
+    """
+    Bulk-create a synthetic catalog and return the created categories and brands.
+    Images only get file names, no files are written to disk.
+    """
+    rng = random.Random(seed)
+    categories = Category.objects.bulk_create([
+        Category(name=f'Bench Category {i}', slug=f'bench-category-{i}', sort_order=i)
+        for i in range(category_count)
+    ])
+    brands = Brand.objects.bulk_create([
+        Brand(name=f'Bench Brand {i}', slug=f'bench-brand-{i}')
+        for i in range(brand_count)
+    ])
+    if not categories[0].pk:
+        # Backends without RETURNING support don't set primary keys on bulk_create
+        categories = list(Category.objects.filter(slug__startswith='bench-category-'))
+        brands = list(Brand.objects.filter(slug__startswith='bench-brand-'))
+
+    words = ['Classic', 'Slim', 'Relaxed', 'Cotton', 'Denim', 'Linen', 'Printed',
+             'Striped', 'Oversized', 'Summer', 'Winter', 'Casual', 'Formal']
+    garments = ['Shirt', 'T-Shirt', 'Jeans', 'Dress', 'Jacket', 'Hoodie', 'Skirt', 'Shorts']
+
+    for start in range(0, product_count, batch_size):
+        products = []
+        for i in range(start, min(start + batch_size, product_count)):
+            price = Decimal(rng.randrange(299, 15000))
+            name = f'{rng.choice(words)} {rng.choice(words)} {rng.choice(garments)} {i}'
+            products.append(Product(
+                name=name,
+                slug=f'bench-product-{i}',
+                description=f'{name} made for everyday comfort.',
+                short_description=name,
+                category=rng.choice(categories),
+                brand=rng.choice(brands),
+                price=price,
+                sale_price=price * Decimal('0.8') if rng.random() < 0.2 else None,
+                gender=rng.choice('MFUK'),
+                stock_quantity=rng.randrange(0, 200),
+                is_featured=rng.random() < 0.05,
+            ))
+        products = Product.objects.bulk_create(products)
+        if images_per_product:
+            if not products[0].pk:
+                products = list(Product.objects.filter(
+                    slug__in=[product.slug for product in products]
+                ))
+            ProductImage.objects.bulk_create([
+                ProductImage(
+                    product=product,
+                    image=f'products/{product.slug}-{n}.jpg',
+                    alt_text=f'{product.name} - Image {n + 1}',
+                    is_primary=(n == 0),
+                    sort_order=n,
+                )
+                for product in products
+                for n in range(images_per_product)
+            ])
+        # bulk_create() bypasses the signals that maintain the counters
+        counters.reconcile()
+
+    return {'categories': categories, 'brands': brands}
+
+
+@contextmanager
+def committed_fixture(product_count, users=None, **options):
+    """
+    Build a catalog fixture (see build_catalog_fixture) that is committed,
+    and delete it again on exit, with the `users` queryset the command
+    created. For benchmarks whose client threads use their own database
+    connections, which can't see a fixture inside rolled_back().
+    """
+    if Product.objects.filter(slug__startswith='bench-product-').exists():
+        raise CommandError('Benchmark products already exist; remove them before running this benchmark')
+    if users is not None and users.exists():
+        raise CommandError('Benchmark users already exist; remove them before running this benchmark')
+    build_catalog_fixture(product_count, **options)
+    try:
+        yield Product.objects.filter(slug__startswith='bench-product-')
+    finally:
+        if users is not None:
+            users.delete()
+        Product.objects.filter(slug__startswith='bench-product-').delete()
+        Category.objects.filter(slug__startswith='bench-category-').delete()
+        Brand.objects.filter(slug__startswith='bench-brand-').delete()
+
+
+def run_clients(calls):
+    """
+    Run every call in its own thread, all started at once, and return the
+    elapsed seconds and the exceptions they raised.
+    """
+    barrier = threading.Barrier(len(calls))
+    errors = []
+
+    def run(call):
+        try:
+            barrier.wait()
+            call()
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(call,)) for call in calls]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, errors
+
+
+def api_request_factory():
+    """Request factory whose requests pass the ALLOWED_HOSTS check"""
+    host = next((h for h in settings.ALLOWED_HOSTS if h and '*' not in h), 'localhost')
+    return APIRequestFactory(SERVER_NAME=host.lstrip('.'))
+
+
+@contextmanager
+def count_queries():
+    """Capture the queries run on the default connection"""
+    with CaptureQueriesContext(connection) as context:
+        yield context
+
+
+def time_calls(func, repeat):
+    """Call `func` `repeat` times and return the sorted latencies in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
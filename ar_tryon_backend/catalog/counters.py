@@ -0,0 +1,103 @@
+"""
+Maintenance of the catalog-wide counts in CatalogCounters.
+Each counter counts the objects of one model that match some field values
+(see COUNTERS). Saving or deleting an object moves the counters by what the
+object counted for before and after (see catalog.signals), with F()
+expressions so concurrent changes never lose an update. Bulk update()s
+bypass signals, so they are followed by refresh() of the affected model,
+which recounts its counters in one aggregate query; reconcile() recounts
+everything.
+"""
+
+from collections import Counter
+
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Brand, CatalogCounters, Category, Product, ProductImage, ProductReview
+
+COUNTERS_PK = 1
+
+# Counter: (model, field values an object needs to be counted)
+COUNTERS = {
+    'products': (Product, {}),
+    'active_products': (Product, {'is_active': True}),
+    'available_products': (Product, {'is_available': True}),
+    'featured_products': (Product, {'is_active': True, 'is_featured': True}),
+    'featured_available_products': (Product, {'is_available': True, 'is_featured': True}),
+    'try_on_products': (Product, {'is_active': True, 'is_try_on_enabled': True}),
+    'categories': (Category, {'is_active': True}),
+    'brands': (Brand, {'is_active': True}),
+    'images': (ProductImage, {}),
+    'reviews': (ProductReview, {}),
+    'pending_reviews': (ProductReview, {'is_approved': False}),
+}
+COUNTED_MODELS = {model for model, _ in COUNTERS.values()}
+
+
+def _counters_of(model):
+    return {name: values for name, (counted, values) in COUNTERS.items() if counted is model}
+
+
+def counted_fields(model):
+    """Fields whose values decide what an object of `model` counts for"""
+    return sorted({field for values in _counters_of(model).values() for field in values})
+
+
+def contribution(model, values):
+    """
+    Set of counters an object counts for, from an instance or a dict of its
+    counted field values.
+    """
+    def get(field):
+        return values[field] if isinstance(values, dict) else getattr(values, field)
+    return {
+        name for name, required in _counters_of(model).items()
+        if all(get(field) == value for field, value in required.items())
+    }
+
+
+def stored_contribution(model, pk):
+    """What the stored row of an object counts for (empty if it doesn't exist)"""
+    row = model.objects.filter(pk=pk).values('pk', *counted_fields(model)).first()
+    return contribution(model, row) if row is not None else set()
+
+
+def apply(previous, current):
+    """Move the counters from one contribution to another"""
+    deltas = Counter(current)
+    deltas.subtract(previous)
+    updates = {name: F(name) + n for name, n in deltas.items() if n}
+    if updates:
+        CatalogCounters.objects.filter(pk=COUNTERS_PK).update(**updates)
+
+
+def count(model):
+    """{counter: value} for one model's counters, in one aggregate query"""
+    return model.objects.aggregate(**{
+        name: Count('pk', filter=Q(**required)) if required else Count('pk')
+        for name, required in _counters_of(model).items()
+    })
+
+
+def refresh(model):
+    """Recount the counters of one model, after a bulk update() or bulk_create()"""
+    updated = CatalogCounters.objects.filter(pk=COUNTERS_PK).update(
+        updated_at=timezone.now(), **count(model)
+    )
+    if not updated:
+        reconcile()
+
+
+def reconcile():
+    """Recount every counter and return the counters row"""
+    values = {}
+    for model in COUNTED_MODELS:
+        values.update(count(model))
+    counters, _ = CatalogCounters.objects.update_or_create(pk=COUNTERS_PK, defaults=values)
+    return counters
+
+
+def get_counters():
+    """The counters row, built on first use"""
+    return CatalogCounters.objects.filter(pk=COUNTERS_PK).first() or reconcile()
@@ -0,0 +1,214 @@
+"""
+Facet counts for product listings.
+For the active filters (search, category, brand, gender, price range, featured)
+this counts matching products per category, brand, gender, size, colour and price
+bucket in two grouped queries. Each facet is counted with every filter applied
+except its own, so the sidebar shows what picking another value would return.
+Results are cached per normalized filter tuple and dropped when the catalog changes.
+"""
+
+import hashlib
+import time
+from collections import Counter, namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, IntegerField, Q, Value, When
+
+from .models import Product
+from .search import search_products, tokenize
+
+# Upper bounds of the price buckets; the last bucket has no upper bound
+PRICE_BUCKETS = getattr(settings, 'CATALOG_PRICE_BUCKETS', (25, 50, 100, 200))
+CACHE_TIMEOUT = getattr(settings, 'CATALOG_FACETS_CACHE_TIMEOUT', 300)
+CACHE_PREFIX = 'catalog:facets'
+VERSION_KEY = 'catalog:facets:version'
+
+SIZE_ORDER = ['XXS', 'XS', 'S', 'M', 'L', 'XL', 'XXL', 'XXXL']
+GENDERS = dict(Product.GENDER_CHOICES)
+
+Filters = namedtuple(
+    'Filters', ['search', 'category', 'brand', 'gender', 'min_price', 'max_price', 'featured']
+)
+
+
+def _parse_price(value):
+    try:
+        price = Decimal((value or '').strip())
+    except InvalidOperation:
+        return None
+    if not price.is_finite() or price < 0:
+        return None
+    return price.quantize(Decimal('0.01'))
+
+
+def parse_filters(params):
+    """
+    Normalized Filters from request query parameters. Invalid values are dropped,
+    so equivalent requests share one cache entry.
+    """
+    gender = (params.get('gender') or '').strip().upper()
+    return Filters(
+        search=' '.join(tokenize(params.get('search'))),
+        category=(params.get('category') or '').strip(),
+        brand=(params.get('brand') or '').strip(),
+        gender=gender if gender in GENDERS else '',
+        min_price=_parse_price(params.get('min_price')),
+        max_price=_parse_price(params.get('max_price')),
+        featured=(params.get('featured') or '').strip().lower() == 'true',
+    )
+
+
+def _price_range_q(filters):
+    condition = Q()
+    if filters.min_price is not None:
+        condition &= Q(price__gte=filters.min_price)
+    if filters.max_price is not None:
+        condition &= Q(price__lte=filters.max_price)
+    return condition
+
+
+def apply_filters(queryset, filters, skip_search=False):
+    """Restrict a Product queryset to the products matching `filters`"""
+    if filters.search and not skip_search:
+        queryset = search_products(queryset, filters.search)
+    if filters.category:
+        queryset = queryset.filter(category__slug=filters.category)
+    if filters.brand:
+        queryset = queryset.filter(brand__slug=filters.brand)
+    if filters.gender:
+        queryset = queryset.filter(gender=filters.gender)
+    if filters.featured:
+        queryset = queryset.filter(is_featured=True)
+    return queryset.filter(_price_range_q(filters))
+
+
+def _price_bucket():
+    whens = [When(price__lt=bound, then=Value(i)) for i, bound in enumerate(PRICE_BUCKETS)]
+    return Case(*whens, default=Value(len(PRICE_BUCKETS)), output_field=IntegerField())
+
+
+def _row_matches(row, filters, skip):
+    """Whether a grouped row passes every filter except the `skip` facet"""
+    return (
+        (skip == 'category' or not filters.category or row['category__slug'] == filters.category)
+        and (skip == 'brand' or not filters.brand or row['brand__slug'] == filters.brand)
+        and (skip == 'gender' or not filters.gender or row['gender'] == filters.gender)
+        and (skip == 'featured' or not filters.featured or row['is_featured'])
+        and (skip == 'price' or row['in_price_range'])
+    )
+
+
+def _split_counts(rows, field):
+    counts = Counter()
+    for row in rows:
+        for value in row[field].split(','):
+            value = value.strip()
+            if value:
+                counts[value] += row['count']
+    return counts
+
+
+def compute_facets(base, filters):
+    """
+    Facet counts for `filters` over the `base` Product queryset.
+    One query groups products by category, brand, gender, featured flag and
+    price bucket; a second groups the fully filtered products by their size
+    and colour lists.
+    """
+    searched = search_products(base, filters.search) if filters.search else base
+    price_range = _price_range_q(filters)
+    in_price_range = (
+        Case(When(price_range, then=Value(True)), default=Value(False), output_field=BooleanField())
+        if price_range else Value(True, output_field=BooleanField())
+    )
+    rows = list(
+        searched.order_by()
+        .annotate(price_bucket=_price_bucket(), in_price_range=in_price_range)
+        .values(
+            'category__slug', 'category__name', 'brand__slug', 'brand__name',
+            'gender', 'is_featured', 'price_bucket', 'in_price_range',
+        )
+        .annotate(count=Count('pk'))
+    )
+
+    categories, brands, genders, buckets = {}, {}, Counter(), Counter()
+    total = featured = 0
+    for row in rows:
+        count = row['count']
+        if _row_matches(row, filters, None):
+            total += count
+        if _row_matches(row, filters, 'category'):
+            entry = categories.setdefault(
+                row['category__slug'], {'slug': row['category__slug'], 'name': row['category__name'], 'count': 0}
+            )
+            entry['count'] += count
+        if _row_matches(row, filters, 'brand'):
+            entry = brands.setdefault(
+                row['brand__slug'], {'slug': row['brand__slug'], 'name': row['brand__name'], 'count': 0}
+            )
+            entry['count'] += count
+        if _row_matches(row, filters, 'gender'):
+            genders[row['gender']] += count
+        if _row_matches(row, filters, 'featured') and row['is_featured']:
+            featured += count
+        if _row_matches(row, filters, 'price'):
+            buckets[row['price_bucket']] += count
+
+    variants = []
+    if total:
+        variants = list(
+            apply_filters(searched, filters, skip_search=True).order_by()
+            .values('available_sizes', 'available_colors')
+            .annotate(count=Count('pk'))
+        )
+    sizes = _split_counts(variants, 'available_sizes')
+    colors = _split_counts(variants, 'available_colors')
+
+    bounds = [None, *PRICE_BUCKETS, None]
+    return {
+        'total': total,
+        'categories': sorted(categories.values(), key=lambda entry: entry['name']),
+        'brands': sorted(brands.values(), key=lambda entry: entry['name']),
+        'genders': [
+            {'value': value, 'label': label, 'count': genders[value]}
+            for value, label in Product.GENDER_CHOICES if genders[value]
+        ],
+        'sizes': [
+            {'value': size, 'count': count}
+            for size, count in sorted(
+                sizes.items(),
+                key=lambda item: (SIZE_ORDER.index(item[0]) if item[0] in SIZE_ORDER else len(SIZE_ORDER), item[0]),
+            )
+        ],
+        'colors': [{'value': color, 'count': count} for color, count in sorted(colors.items())],
+        'price_ranges': [
+            {'min': bounds[i], 'max': bounds[i + 1], 'count': buckets[i]}
+            for i in range(len(PRICE_BUCKETS) + 1) if buckets[i]
+        ],
+        'featured': featured,
+    }
+
+
+def _version():
+    return cache.get_or_set(VERSION_KEY, lambda: repr(time.time()), None)
+
+
+def invalidate():
+    """Drop every cached facet vector (called when products, brands or categories change)"""
+    cache.set(VERSION_KEY, repr(time.time()), None)
+
+
+def get_facets(scope, base, filters):
+    """
+    Cached compute_facets(). `scope` names the base queryset, since listings
+    that start from different products must not share cache entries.
+    """
+    digest = hashlib.md5(repr(tuple(filters)).encode()).hexdigest()
+    key = f'{CACHE_PREFIX}:{scope}:{_version()}:{digest}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(base, filters)
+        cache.set(key, facets, CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,213 @@
+"""
+Database-backed queue for image processing.
+Saving a product image or an avatar only records an ImageJob; the renditions,
+EXIF orientation fix and metadata (see catalog.renditions) are produced by
+`manage.py run_image_worker` processes, off the request path. No broker is
+needed: workers claim jobs with a conditional UPDATE, so several processes can
+share the table, and a job whose worker died is picked up again after
+LOCK_TIMEOUT. Failed jobs are retried with exponential backoff up to
+MAX_ATTEMPTS times.
+
+The same queue prepares the try-on assets of garment images (see tryon.assets).
+
+With CATALOG_IMAGE_JOBS_EAGER = True jobs run in-process right after the
+transaction that queued them commits, which is handy for tests and local
+development without a worker.
+"""
+
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import renditions, response_cache
+from .models import ImageJob
+
+EAGER = getattr(settings, 'CATALOG_IMAGE_JOBS_EAGER', False)
+MAX_ATTEMPTS = getattr(settings, 'CATALOG_IMAGE_JOB_MAX_ATTEMPTS', 5)
+# Delay before the first retry; doubled on every further attempt
+RETRY_DELAY = getattr(settings, 'CATALOG_IMAGE_JOB_RETRY_DELAY', 30)
+# A job still processing after this long is assumed lost with its worker
+LOCK_TIMEOUT = timedelta(seconds=getattr(settings, 'CATALOG_IMAGE_JOB_LOCK_TIMEOUT', 600))
+
+logger = logging.getLogger(__name__)
+
+
+def _renditions(widths):
+    """Builder of rendition manifests in `widths`"""
+    def build(file):
+        manifest = renditions.generate(file, widths)
+        return manifest, bool(manifest['formats'])
+    return build
+
+
+def _try_on_assets(file):
+    """Builder of the try-on assets manifest of a garment image"""
+    # Imported here so the catalog doesn't depend on the try-on app to load
+    from tryon import assets as tryon_assets
+
+    try:
+        return tryon_assets.generate(file.name), True
+    except (OSError, ValueError):
+        logger.warning('Could not prepare try-on garment %s', file.name, exc_info=True)
+        return {'source': file.name, 'version': tryon_assets.ASSET_VERSION}, False
+
+
+# What each job kind processes: model, image field, manifest field, the builder
+# returning (manifest, whether the image was usable), and the field values an
+# object needs to still be processed
+TARGETS = {
+    ImageJob.PRODUCT_IMAGE: ('catalog.ProductImage', 'image', 'renditions', _renditions(renditions.PRODUCT_WIDTHS), {}),
+    ImageJob.AVATAR: ('users.UserProfile', 'avatar', 'avatar_renditions', _renditions(renditions.AVATAR_WIDTHS), {}),
+    ImageJob.TRYON_GARMENT: ('catalog.ProductImage', 'image', 'try_on_assets', _try_on_assets,
+                             {'is_try_on_garment': True}),
+}
+
+
+class UnreadableImage(Exception):
+    """The file is not an image Pillow can decode; retrying won't help"""
+
+
+def enqueue(kind, object_id):
+    """
+    Queue processing for an object, unless a job for it is already waiting.
+    Returns the new job, or None.
+    """
+    if ImageJob.objects.filter(kind=kind, object_id=object_id, status='pending').exists():
+        return None
+    job = ImageJob.objects.create(kind=kind, object_id=object_id)
+    if EAGER:
+        transaction.on_commit(run_pending)
+    return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def requeue_stale(now=None):
+    """Put jobs whose worker stopped responding back in the queue"""
+    now = now or timezone.now()
+    return ImageJob.objects.filter(status='processing', locked_at__lt=now - LOCK_TIMEOUT).update(
+        status='pending', locked_by='', locked_at=None
+    )
+
+
+def claim(worker, limit=1):
+    """
+    Mark up to `limit` due jobs as processing by `worker` and return them.
+    The UPDATE only takes rows that are still pending, so two workers never
+    get the same job.
+    """
+    now = timezone.now()
+    requeue_stale(now)
+    due = list(
+        ImageJob.objects.filter(status='pending', run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('pk', flat=True)[:limit]
+    )
+    if not due:
+        return []
+    token = f'{worker}:{uuid.uuid4().hex[:8]}'
+    ImageJob.objects.filter(pk__in=due, status='pending').update(
+        status='processing', locked_by=token, locked_at=now, attempts=F('attempts') + 1
+    )
+    return list(ImageJob.objects.filter(locked_by=token, status='processing').order_by('run_after', 'id'))
+
+
+def process(job):
+    """Build the manifest for the job's object and store it"""
+    model_label, field, manifest_field, build, only = TARGETS[job.kind]
+    model = apps.get_model(model_label)
+    obj = model.objects.filter(pk=job.object_id, **only).first()
+    if obj is None or not getattr(obj, field):
+        # Deleted, cleared or unflagged since the job was queued
+        return
+    file = getattr(obj, field)
+    manifest, usable = build(file)
+    # Skip the write if the file was replaced meanwhile; that change queued its own job
+    updated = model.objects.filter(pk=obj.pk, **{field: file.name}).update(**{manifest_field: manifest})
+    if updated and job.kind == ImageJob.PRODUCT_IMAGE:
+        # Product image srcsets are part of the cached catalog responses
+        response_cache.invalidate()
+    if not usable:
+        raise UnreadableImage(f'Could not read {file.name}')
+
+
+def _give_up(job):
+    """Store an empty manifest so the object shows as failed rather than processing"""
+    model_label, field, manifest_field, _, _ = TARGETS[job.kind]
+    model = apps.get_model(model_label)
+    obj = model.objects.filter(pk=job.object_id).only(field).first()
+    if obj is not None and getattr(obj, field):
+        name = getattr(obj, field).name
+        model.objects.filter(pk=obj.pk, **{field: name}).update(**{manifest_field: {'source': name, 'formats': {}}})
+
+
+def _finish(job, **fields):
+    # Guarded by the claim token in case the job was requeued as stale
+    ImageJob.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        locked_by='', locked_at=None, updated_at=timezone.now(), **fields
+    )
+
+
+def run_job(job):
+    """Process a claimed job and record the outcome. Returns the new status."""
+    try:
+        process(job)
+    except UnreadableImage as exc:
+        _finish(job, status='failed', last_error=str(exc))
+        return 'failed'
+    except Exception as exc:
+        logger.exception('Image job %s failed (attempt %d)', job.pk, job.attempts)
+        if job.attempts >= MAX_ATTEMPTS:
+            _give_up(job)
+            _finish(job, status='failed', last_error=repr(exc))
+            return 'failed'
+        delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+        _finish(job, status='pending', last_error=repr(exc), run_after=timezone.now() + timedelta(seconds=delay))
+        return 'pending'
+    _finish(job, status='done', last_error='')
+    return 'done'
+
+
+def run_pending(worker=None, limit=None):
+    """Run due jobs in this process until none are left (or `limit` ran). Returns the count."""
+    worker = worker or worker_name()
+    ran = 0
+    while limit is None or ran < limit:
+        jobs = claim(worker)
+        if not jobs:
+            break
+        for job in jobs:
+            run_job(job)
+            ran += 1
+    return ran
+
+
+def work(worker=None, batch=1, poll=2.0, once=False):
+    """
+    Worker loop: claim and run jobs, sleeping `poll` seconds when the queue is
+    empty. With `once` it returns as soon as the queue is empty.
+    """
+    worker = worker or worker_name()
+    ran = 0
+    while True:
+        close_old_connections()
+        jobs = claim(worker, batch)
+        if not jobs:
+            if once:
+                return ran
+            time.sleep(poll)
+            continue
+        for job in jobs:
+            run_job(job)
+            ran += 1
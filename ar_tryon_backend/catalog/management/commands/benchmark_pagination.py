@@ -0,0 +1,78 @@
+"""
+Django management command to benchmark product list pagination.
+It compares page 1 and a deep page for OFFSET (Paginator) and keyset pagination
+under every sort that supports cursors.
+"""
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from catalog.benchmarking import rolled_back, build_catalog_fixture, time_calls, percentile
+from catalog.models import Product
+from catalog.pagination import KEYSET_ORDERINGS, encode_cursor, keyset_paginate
+
+
+class Command(BaseCommand):
+    help = 'Benchmark page 1 against page 500 for OFFSET and keyset pagination'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=50000,
+            help='Number of products in the throwaway fixture (default: 50000)',
+        )
+        parser.add_argument(
+            '--page',
+            type=int,
+            default=500,
+            help='Deep page to compare against page 1 (default: 500)',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Products per page (default: 20)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Timed requests per page (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        page_size, deep_page = options['page_size'], options['page']
+        base = Product.objects.filter(is_active=True)
+
+        with rolled_back():
+            self.stdout.write(f'Building fixture with {options["products"]} products...')
+            build_catalog_fixture(options['products'], images_per_product=0)
+
+            for sort, ordering in KEYSET_ORDERINGS.items():
+                queryset = base.order_by(*ordering)
+
+                def offset_page(number):
+                    page = Paginator(queryset, page_size).page(number)
+                    return list(page.object_list)
+
+                # Cursor pointing at the last row of the page before the deep page
+                anchor = queryset[(deep_page - 1) * page_size - 1]
+                deep_cursor = encode_cursor(
+                    ordering, [getattr(anchor, field.lstrip('-')) for field in ordering]
+                )
+                if keyset_paginate(queryset, ordering, deep_cursor, page_size).object_list != offset_page(deep_page):
+                    self.stdout.write(self.style.ERROR(f'{sort}: keyset and offset pages differ'))
+
+                for label, first, deep in [
+                    ('offset', lambda: offset_page(1), lambda: offset_page(deep_page)),
+                    ('keyset', lambda: keyset_paginate(queryset, ordering, None, page_size),
+                     lambda: keyset_paginate(queryset, ordering, deep_cursor, page_size)),
+                ]:
+                    first_timings = time_calls(first, options['repeat'])
+                    deep_timings = time_calls(deep, options['repeat'])
+                    self.stdout.write(
+                        f'  {sort:<10} {label:<6} page 1 p50={percentile(first_timings, 50):.2f}ms  '
+                        f'page {deep_page} p50={percentile(deep_timings, 50):.2f}ms '
+                        f'p95={percentile(deep_timings, 95):.2f}ms'
+                    )
@@ -0,0 +1,71 @@
+"""
+Django management command to benchmark the product list API.
+It shows the queries and latency per page size, uncached and served from
+the response cache.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import response_cache
+from catalog.api_views import ProductListAPIView
+from catalog.benchmarking import (
+    rolled_back, build_catalog_fixture, api_request_factory, count_queries,
+    time_calls, percentile
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark query count and latency of the product list API on a large catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=10000,
+            help='Number of products in the throwaway fixture (default: 10000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Timed requests per configuration (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        view = ProductListAPIView.as_view()
+        factory = api_request_factory()
+
+        def fetch(params):
+            response = view(factory.get('/api/catalog/products/', params))
+            if hasattr(response, 'render'):
+                response.render()
+            if response.status_code != 200:
+                raise CommandError(f'Product list returned {response.status_code}')
+            return response
+
+        with rolled_back():
+            self.stdout.write(f'Building fixture with {options["products"]} products...')
+            build_catalog_fixture(options['products'])
+
+            with response_cache.bypassed():
+                for mode in ['full', 'card']:
+                    for page_size in [10, 20, 50, 100]:
+                        params = {'page_size': page_size, 'view': mode}
+                        with count_queries() as queries:
+                            fetch(params)
+                        timings = time_calls(lambda: fetch(params), options['repeat'])
+                        self.stdout.write(
+                            f'  {mode:<5} page_size={page_size:<4} queries={len(queries):<3} '
+                            f'p50={percentile(timings, 50):.1f}ms p95={percentile(timings, 95):.1f}ms'
+                        )
+
+            for mode in ['full', 'card']:
+                params = {'page_size': 20, 'view': mode}
+                fetch(params)
+                with count_queries() as queries:
+                    fetch(params)
+                timings = time_calls(lambda: fetch(params), options['repeat'])
+                self.stdout.write(
+                    f'  {mode:<5} cached         queries={len(queries):<3} '
+                    f'p50={percentile(timings, 50):.1f}ms p95={percentile(timings, 95):.1f}ms'
+                )
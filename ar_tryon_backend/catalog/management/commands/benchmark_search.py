@@ -0,0 +1,67 @@
+"""
+Django management command to benchmark product search.
+It compares the full-text index against the old icontains scan on a large catalog.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from catalog import search
+from catalog.benchmarking import rolled_back, build_catalog_fixture, time_calls, percentile
+from catalog.models import Product
+
+QUERIES = ['shirt', 'slim jeans', 'cott', 'oversized hoodie', 'bench brand 7', 'summer dress', 'xyz']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark p50/p95 search latency of the full-text index against icontains'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=100000,
+            help='Number of products in the throwaway fixture (default: 100000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Timed searches per query (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        base = Product.objects.filter(is_active=True)
+
+        def indexed(query):
+            results = search.order_by_relevance(search.search_products(base, query))
+            return results.count(), list(results[:20])
+
+        def icontains(query):
+            results = base.filter(
+                Q(name__icontains=query) |
+                Q(description__icontains=query) |
+                Q(brand__name__icontains=query)
+            ).order_by('name')
+            return results.count(), list(results[:20])
+
+        with rolled_back():
+            self.stdout.write(f'Building fixture with {options["products"]} products...')
+            build_catalog_fixture(options['products'], images_per_product=0)
+            search.rebuild_index()
+
+            for label, run in [('index', indexed), ('icontains', icontains)]:
+                all_timings = []
+                for query in QUERIES:
+                    matches, _ = run(query)
+                    timings = time_calls(lambda: run(query), options['repeat'])
+                    all_timings.extend(timings)
+                    self.stdout.write(
+                        f'  {label:<9} {query!r:<20} matches={matches:<7} '
+                        f'p50={percentile(timings, 50):.1f}ms p95={percentile(timings, 95):.1f}ms'
+                    )
+                all_timings.sort()
+                self.stdout.write(self.style.SUCCESS(
+                    f'{label}: overall p50={percentile(all_timings, 50):.1f}ms '
+                    f'p95={percentile(all_timings, 95):.1f}ms'
+                ))
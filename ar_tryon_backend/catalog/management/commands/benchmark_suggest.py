@@ -0,0 +1,59 @@
+"""
+Django management command to benchmark search-box autocomplete.
+It measures index build time and per-keystroke suggestion latency,
+both for the first lookup of a prefix and for repeated ones.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import suggest
+from catalog.benchmarking import rolled_back, build_catalog_fixture, time_calls, percentile
+
+QUERIES = ['s', 'sh', 'shi', 'slim j', 'cott', 'bench b', 'hood', 'xyz']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark p50/p95 latency of the autocomplete prefix index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=100000,
+            help='Number of products in the throwaway fixture (default: 100000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Timed suggestions per query (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        index = suggest.SuggestionIndex()
+
+        with rolled_back():
+            self.stdout.write(f'Building fixture with {options["products"]} products...')
+            build_catalog_fixture(options['products'], images_per_product=0)
+            started = time.perf_counter()
+            index.load()
+            self.stdout.write(f'Index built in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+        all_timings = []
+        for query in QUERIES:
+            started = time.perf_counter()
+            matches = index.suggest(query)
+            first = (time.perf_counter() - started) * 1000
+            timings = time_calls(lambda: index.suggest(query), options['repeat'])
+            all_timings.extend(timings)
+            self.stdout.write(
+                f'  {query!r:<10} results={len(matches):<3} first={first:.3f}ms '
+                f'p50={percentile(timings, 50):.3f}ms p95={percentile(timings, 95):.3f}ms'
+            )
+        all_timings.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f'suggest: overall p50={percentile(all_timings, 50):.3f}ms '
+            f'p95={percentile(all_timings, 95):.3f}ms'
+        ))
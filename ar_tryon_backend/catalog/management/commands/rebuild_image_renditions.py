@@ -0,0 +1,47 @@
+"""
+Django management command to build responsive renditions for existing images.
+Images uploaded before renditions existed, or added with bulk_create, have an
+empty manifest; --all also rebuilds current ones (e.g. after changing widths).
+The jobs go through the image queue and are run here unless --queue-only is
+given, in which case the run_image_worker processes pick them up.
+"""
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from catalog import image_jobs, renditions
+from catalog.models import ImageJob
+
+
+class Command(BaseCommand):
+    help = 'Queue (and by default run) rendition jobs for product images and avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild every image, not only those without current renditions',
+        )
+        parser.add_argument(
+            '--queue-only',
+            action='store_true',
+            help='Only queue the jobs and leave them to run_image_worker',
+        )
+
+    def handle(self, *args, **options):
+        for kind, (model_label, field, manifest_field, _, _) in image_jobs.TARGETS.items():
+            if kind == ImageJob.TRYON_GARMENT:
+                # Built by build_tryon_assets
+                continue
+            model = apps.get_model(model_label)
+            queued = 0
+            for obj in model.objects.exclude(**{field: ''}).only(field, manifest_field).iterator():
+                if not options['all'] and renditions.is_current(getattr(obj, manifest_field), getattr(obj, field)):
+                    continue
+                if image_jobs.enqueue(kind, obj.pk):
+                    queued += 1
+            self.stdout.write(f'{model.__name__}: {queued} jobs queued')
+
+        if not options['queue_only']:
+            ran = image_jobs.run_pending()
+            self.stdout.write(self.style.SUCCESS(f'Image renditions rebuilt ({ran} jobs run).'))
@@ -0,0 +1,24 @@
+"""
+Django management command to rebuild the review counters on products.
+Run it after importing reviews in bulk or if the counters ever drift.
+"""
+
+from django.core.management.base import BaseCommand
+from catalog.ratings import rebuild_rating_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating_sum, rating_count and the star histogram of every product'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of products written per UPDATE batch (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding product rating counters...')
+        reviewed = rebuild_rating_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rating counters rebuilt. {reviewed} products have reviews.'))
@@ -0,0 +1,17 @@
+"""
+Django management command to rebuild the product search index.
+Needed after bulk imports that bypass model signals (bulk_create, raw SQL).
+"""
+
+from django.core.management.base import BaseCommand
+from catalog import search
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over all products'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Indexing {Product.objects.count()} products with {type(search.get_backend()).__name__}...')
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,82 @@
+"""
+Django management command to run image processing workers.
+Each worker process claims jobs from the ImageJob table and builds the
+renditions, so image uploads never wait for Pillow. Run it under a process
+supervisor; --once drains the queue and exits (e.g. from cron or in CI).
+"""
+
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+
+from catalog import image_jobs
+from catalog.models import ImageJob
+
+
+def _work(index, batch, poll, once):
+    # Each process opens its own database connection on first use
+    name = f'{image_jobs.worker_name()}-{index}'
+    try:
+        image_jobs.work(name, batch=batch, poll=poll, once=once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Process queued product image and avatar jobs (renditions, orientation, metadata)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=2,
+            help='Worker processes (default: 2)',
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=1,
+            help='Jobs claimed per query by each worker (default: 1)',
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=2.0,
+            help='Seconds to wait when the queue is empty (default: 2)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs',
+        )
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        pending = ImageJob.objects.filter(status='pending').count()
+        self.stdout.write(f'Starting {processes} image worker(s), {pending} jobs pending...')
+
+        worker_args = (options['batch'], options['poll'], options['once'])
+        if processes == 1:
+            _work(0, *worker_args)
+        else:
+            # Children must not share the parent's database connection
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            workers = [context.Process(target=_work, args=(i, *worker_args)) for i in range(processes)]
+            for worker in workers:
+                worker.start()
+            try:
+                for worker in workers:
+                    worker.join()
+            except KeyboardInterrupt:
+                for worker in workers:
+                    worker.join()
+
+        counts = dict(ImageJob.objects.values_list('status').annotate(n=Count('pk')).order_by())
+        self.stdout.write(self.style.SUCCESS(
+            'Image workers stopped. ' + ', '.join(f'{status}: {counts.get(status, 0)}' for status, _ in ImageJob.STATUS_CHOICES)
+        ))
@@ -0,0 +1,81 @@
+"""
+Django management command to measure buffered product view counting under load.
+Concurrent clients request product detail pages through the API; it reports
+the throughput and how few UPDATEs the buffered counts were written with.
+"""
+
+import random
+import threading
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from catalog import popularity
+from catalog.benchmarking import api_request_factory, committed_fixture, run_clients
+from catalog.api_views import ProductDetailAPIView
+
+
+class Command(BaseCommand):
+    help = 'Hit product detail pages from concurrent clients and measure the view counting writes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=16,
+            help='Concurrent client threads (default: 16)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=250,
+            help='Requests per client (default: 250)',
+        )
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=50,
+            help='Number of products in the fixture (default: 50)',
+        )
+
+    def handle(self, *args, **options):
+        popularity.flush_views()
+        with committed_fixture(options['products'], images_per_product=0) as products:
+            self.run_clients(list(products.values_list('slug', flat=True)), options)
+
+    def run_clients(self, slugs, options):
+        factory = api_request_factory()
+        view = ProductDetailAPIView.as_view()
+
+        # Count the product UPDATEs issued by client threads and the final flush
+        # (the background flusher's own writes are not included)
+        updates = Counter()
+        lock = threading.Lock()
+
+        def count_updates(execute, sql, params, many, context):
+            if sql.startswith('UPDATE "catalog_product"'):
+                with lock:
+                    updates['statements'] += 1
+            return execute(sql, params, many, context)
+
+        def client(seed):
+            rng = random.Random(seed)
+            with connection.execute_wrapper(count_updates):
+                for _ in range(options['requests']):
+                    slug = rng.choice(slugs)
+                    response = view(factory.get(f'/api/catalog/products/{slug}/'), slug=slug)
+                    if response.status_code != 200:
+                        raise RuntimeError(f'HTTP {response.status_code} for {slug}')
+
+        elapsed, errors = run_clients([lambda seed=i: client(seed) for i in range(options['clients'])])
+        with connection.execute_wrapper(count_updates):
+            popularity.flush_views()
+
+        requests = options['clients'] * options['requests']
+        self.stdout.write(
+            f'{requests} views from {options["clients"]} clients in {elapsed:.1f}s '
+            f'({requests / elapsed:.0f} req/s), {updates["statements"]} UPDATE statements'
+        )
+        for exc in errors:
+            self.stdout.write(self.style.ERROR(f'Client error: {exc!r}'))
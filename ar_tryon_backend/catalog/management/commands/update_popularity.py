@@ -0,0 +1,33 @@
+"""
+Django management command to refresh product popularity scores.
+Schedule it (e.g. hourly with cron) and pass the time since the previous run,
+so recent views decay at the configured half-life.
+"""
+
+from django.core.management.base import BaseCommand
+from catalog.popularity import flush_views, prune_view_batches, update_popularity
+
+
+class Command(BaseCommand):
+    help = 'Decay recent product views and recompute popularity scores from views, orders and reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=1.0,
+            help='Hours since the previous run, used for the decay (default: 1)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of products written per UPDATE batch (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        flush_views()
+        prune_view_batches()
+        self.stdout.write('Updating popularity scores...')
+        ordered = update_popularity(options['hours'] / 24, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Popularity scores updated. {ordered} products have recent orders.'))
@@ -0,0 +1,70 @@
+# Full-text search index for products (see catalog/search.py)
+
+from django.db import migrations
+
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE catalog_product_fts USING fts5(
+    name, short_description, description, brand, category,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+SQLITE_POPULATE = """
+INSERT INTO catalog_product_fts (rowid, name, short_description, description, brand, category)
+SELECT p.id, p.name, p.short_description, p.description, b.name, c.name
+FROM catalog_product p
+JOIN catalog_brand b ON b.id = p.brand_id
+JOIN catalog_category c ON c.id = p.category_id
+"""
+
+POSTGRES_CREATE = """
+CREATE TABLE catalog_product_search (
+    product_id bigint PRIMARY KEY
+        REFERENCES catalog_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    document tsvector NOT NULL
+);
+CREATE INDEX catalog_product_search_document_gin ON catalog_product_search USING GIN (document)
+"""
+
+POSTGRES_POPULATE = """
+INSERT INTO catalog_product_search (product_id, document)
+SELECT p.id,
+    setweight(to_tsvector('simple', p.name), 'A') ||
+    setweight(to_tsvector('simple', b.name), 'B') ||
+    setweight(to_tsvector('simple', c.name), 'B') ||
+    setweight(to_tsvector('simple', p.short_description), 'C') ||
+    setweight(to_tsvector('simple', p.description), 'D')
+FROM catalog_product p
+JOIN catalog_brand b ON b.id = p.brand_id
+JOIN catalog_category c ON c.id = p.category_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_POPULATE)
+    elif vendor == "postgresql":
+        schema_editor.execute(POSTGRES_CREATE)
+        schema_editor.execute(POSTGRES_POPULATE)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS catalog_product_fts")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP TABLE IF EXISTS catalog_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0002_product_rating_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
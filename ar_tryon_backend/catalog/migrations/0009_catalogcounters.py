@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_imagejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('products', models.IntegerField(default=0)),
+                ('active_products', models.IntegerField(default=0)),
+                ('available_products', models.IntegerField(default=0)),
+                ('featured_products', models.IntegerField(default=0)),
+                ('try_on_products', models.IntegerField(default=0)),
+                ('categories', models.IntegerField(default=0)),
+                ('brands', models.IntegerField(default=0)),
+                ('images', models.IntegerField(default=0)),
+                ('reviews', models.IntegerField(default=0)),
+                ('pending_reviews', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Catalog Counters',
+                'verbose_name_plural': 'Catalog Counters',
+            },
+        ),
+    ]
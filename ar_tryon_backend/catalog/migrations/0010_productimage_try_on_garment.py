@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_catalogcounters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='is_try_on_garment',
+            field=models.BooleanField(default=False, help_text='Flat shot of the garment on a plain background, used for virtual try-on'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='try_on_assets',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='imagejob',
+            name='kind',
+            field=models.CharField(choices=[('product_image', 'Product image'), ('avatar', 'Avatar'), ('tryon_garment', 'Try-on garment')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_productimage_try_on_garment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='catalog.product')),
+            ],
+            options={
+                'db_table': 'catalog_product_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:43
+
+from django.db import migrations, models
+
+
+def count_featured_available_products(apps, schema_editor):
+    CatalogCounters = apps.get_model('catalog', 'CatalogCounters')
+    Product = apps.get_model('catalog', 'Product')
+    CatalogCounters.objects.update(
+        featured_available_products=Product.objects.filter(is_available=True, is_featured=True).count()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_product_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogcounters',
+            name='featured_available_products',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_featured_available_products, migrations.RunPython.noop),
+    ]
@@ -6,9 +6,11 @@ This app handles product catalog functionality including categories, brands, and
 from django.db import models
 from django.urls import reverse
 from django.contrib.auth.models import User
-from PIL import Image
+from django.utils import timezone
 import os
 
+from . import renditions as image_renditions
+
 class Category(models.Model):
     """
     Product categories (e.g., Shirts, Pants, Dresses, etc.)
@@ -61,6 +63,23 @@ class Brand(models.Model):
     def get_absolute_url(self):
         return reverse('catalog:brand_detail', kwargs={'slug': self.slug})
 
+class ProductQuerySet(models.QuerySet):
+    """
+    Custom queryset with helpers for loading products efficiently.
+    """
+
+    def with_listing_relations(self):
+        """
+        Load everything a product listing needs in a fixed number of queries:
+        category and brand are joined, images are fetched in one batch with
+        the primary image first so `images.all|first` is the main image.
+        """
+        ordered_images = ProductImage.objects.order_by('-is_primary', 'sort_order', 'created_at')
+        return self.select_related('category', 'brand').prefetch_related(
+            models.Prefetch('images', queryset=ordered_images)
+        )
+
+
 class Product(models.Model):
     """
     Individual products/clothing items.
@@ -135,12 +154,35 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Denormalized counters over approved reviews (maintained by catalog.ratings)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Popularity (maintained by catalog.popularity)
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    recent_views = models.FloatField(default=0, editable=False, help_text="Views with time decay applied")
+    popularity_score = models.FloatField(default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['category', 'is_active']),
             models.Index(fields=['brand', 'is_active']),
             models.Index(fields=['is_featured', 'is_active']),
+            # Composite sort keys used by keyset pagination (see catalog.pagination)
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['category', 'name', 'id']),
+            models.Index(fields=['brand', 'name', 'id']),
+            models.Index(fields=['popularity_score', 'id']),
         ]
     
     def __str__(self):
@@ -166,6 +208,18 @@ class Product(models.Model):
             return int(((self.price - self.sale_price) / self.price) * 100)
         return 0
     
+    @property
+    def average_rating(self):
+        """Average of approved review ratings, rounded to one decimal"""
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 1)
+    
+    @property
+    def rating_histogram(self):
+        """Number of approved reviews per star rating, from 5 stars down to 1"""
+        return {stars: getattr(self, f'rating_{stars}_count') for stars in range(5, 0, -1)}
+    
     def get_available_sizes_list(self):
         """Convert comma-separated sizes to list"""
         return [size.strip() for size in self.available_sizes.split(',') if size.strip()]
@@ -174,6 +228,81 @@ class Product(models.Model):
         """Convert comma-separated colors to list"""
         return [color.strip() for color in self.available_colors.split(',') if color.strip()]
 
+class ProductSearchDocument(models.Model):
+    """
+    A product's row in the SQLite full-text index, so searches can join it
+    (see catalog.search). The FTS5 table is created by migration 0003 and
+    written with raw SQL; Django only reads through it.
+    """
+    product = models.OneToOneField(
+        Product, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_document',
+    )
+    
+    class Meta:
+        managed = False
+        db_table = 'catalog_product_fts'
+
+class ViewCountBatch(models.Model):
+    """
+    A batch of buffered product views that has been written to the counters.
+    Flushing records the batch id in the same transaction, so a batch that is
+    retried after an ambiguous failure is never counted twice.
+    """
+    batch_id = models.UUIDField(unique=True)
+    views = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"View batch {self.batch_id} ({self.views} views)"
+
+class ImageJob(models.Model):
+    """
+    Background processing of an uploaded product image or avatar: EXIF
+    orientation, metadata and renditions. Jobs are run by
+    `manage.py run_image_worker` (see catalog.image_jobs) and retried with
+    backoff when they fail.
+    """
+    PRODUCT_IMAGE = 'product_image'
+    AVATAR = 'avatar'
+    TRYON_GARMENT = 'tryon_garment'
+    KIND_CHOICES = [
+        (PRODUCT_IMAGE, 'Product image'),
+        (AVATAR, 'Avatar'),
+        (TRYON_GARMENT, 'Try-on garment'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    # Not picked up before this time (retry backoff)
+    run_after = models.DateTimeField(default=timezone.now)
+    # Claim token of the worker running the job
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.object_id} ({self.status})"
+
 class ProductImage(models.Model):
     """
     Product images. Each product can have multiple images.
@@ -182,7 +311,15 @@ class ProductImage(models.Model):
     image = models.ImageField(upload_to='products/')
     alt_text = models.CharField(max_length=200, help_text="Alternative text for accessibility")
     is_primary = models.BooleanField(default=False, help_text="Main product image")
+    is_try_on_garment = models.BooleanField(
+        default=False,
+        help_text="Flat shot of the garment on a plain background, used for virtual try-on"
+    )
     sort_order = models.IntegerField(default=0)
+    # Responsive sizes of the image, built in the background (see catalog.image_jobs)
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    # Try-on cutout, pyramid and anchors of a garment image (see tryon.assets)
+    try_on_assets = models.JSONField(default=dict, blank=True, editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -194,25 +331,26 @@ class ProductImage(models.Model):
     
     def save(self, *args, **kwargs):
         """
-        Override save to handle primary image logic and resize images.
+        Override save to handle primary image logic.
+        Renditions are built in the background (see catalog.signals).
         """
         # If this is being set as primary, unset all other primary images for this product
         if self.is_primary:
             ProductImage.objects.filter(product=self.product, is_primary=True).update(is_primary=False)
+        # Likewise a product has one try-on garment image
+        if self.is_try_on_garment:
+            ProductImage.objects.filter(
+                product=self.product, is_try_on_garment=True
+            ).exclude(pk=self.pk).update(is_try_on_garment=False)
         
         super().save(*args, **kwargs)
-        
-        # Resize image if it's too large
-        if self.image:
-            try:
-                img = Image.open(self.image.path)
-                if img.height > 800 or img.width > 800:
-                    output_size = (800, 800)
-                    img.thumbnail(output_size)
-                    img.save(self.image.path)
-            except Exception as e:
-                # If image processing fails, continue
-                pass
+    
+    @property
+    def rendition_status(self):
+        """'processing' until the renditions are built, then 'ready' or 'failed'"""
+        if not image_renditions.is_current(self.renditions, self.image):
+            return 'processing'
+        return 'ready' if self.renditions.get('formats') else 'failed'
 
 class ProductReview(models.Model):
     """
@@ -246,3 +384,48 @@ class ProductReview(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating}/5)"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember what this review already contributes to the product counters"""
+        instance = super().from_db(db, field_names, values)
+        if {'product_id', 'rating', 'is_approved'} <= set(field_names):
+            instance._counted_rating = instance.rating_contribution()
+        return instance
+    
+    def rating_contribution(self):
+        """(product_id, rating) this review adds to the product rating counters, or None"""
+        if self.is_approved:
+            return (self.product_id, self.rating)
+        return None
+
+
+class CatalogCounters(models.Model):
+    """
+    Catalog-wide counts for the stats endpoint, the catalog home page and the
+    dashboard, kept in a single row (pk=1) so reading them is one primary key
+    lookup. Signals adjust the counts as objects change (see catalog.counters);
+    `manage.py reconcile_catalog_counters` recounts them from scratch.
+    """
+    products = models.IntegerField(default=0)
+    active_products = models.IntegerField(default=0)
+    available_products = models.IntegerField(default=0)
+    # Among active products
+    featured_products = models.IntegerField(default=0)
+    # Among available products, as the catalog home page features them
+    featured_available_products = models.IntegerField(default=0)
+    try_on_products = models.IntegerField(default=0)
+    # Active categories and brands
+    categories = models.IntegerField(default=0)
+    brands = models.IntegerField(default=0)
+    images = models.IntegerField(default=0)
+    reviews = models.IntegerField(default=0)
+    pending_reviews = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Catalog Counters"
+        verbose_name_plural = "Catalog Counters"
+    
+    def __str__(self):
+        return f"Catalog counters ({self.products} products)"
@@ -0,0 +1,228 @@
+"""
+Pagination classes for catalog API endpoints, and keyset (cursor) pagination
+shared by API and HTML listings.
+Keyset pagination filters on the sort key of the last row seen instead of using
+OFFSET, so a deep page costs the same as the first one and no COUNT(*) is run.
+"""
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Composite sort keys for keyset pagination; the trailing id makes every key unique
+KEYSET_ORDERINGS = {
+    'name': ('name', 'id'),
+    'price_low': ('price', 'id'),
+    'price_high': ('-price', '-id'),
+    'newest': ('-created_at', '-id'),
+    'popular': ('-popularity_score', '-id'),
+}
+
+CURSOR_PARAM = 'cursor'
+MODE_PARAM = 'pagination'
+
+
+def wants_cursor(params):
+    """Whether the request asked for keyset pagination (?pagination=cursor or a cursor)"""
+    return params.get(MODE_PARAM) == 'cursor' or bool(params.get(CURSOR_PARAM))
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(ordering, values, backwards=False):
+    payload = json.dumps({
+        'o': list(ordering),
+        'v': [_encode_value(value) for value in values],
+        'b': backwards,
+    })
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(model, ordering, cursor):
+    """
+    Sort key values and direction from a cursor.
+    Raises ValueError if the cursor is malformed or doesn't fit `ordering`.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values, backwards = payload['v'], bool(payload['b'])
+        cursor_ordering = payload['o']
+    except (TypeError, KeyError, ValueError):
+        raise ValueError('Invalid cursor')
+    # A cursor taken under another sort would land on an arbitrary position
+    if cursor_ordering != list(ordering) or not isinstance(values, list) or len(values) != len(ordering):
+        raise ValueError('Invalid cursor')
+    try:
+        values = [
+            model._meta.get_field(field.lstrip('-')).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except Exception:
+        raise ValueError('Invalid cursor')
+    return values, backwards
+
+
+def keyset_filter(ordering, values, backwards=False):
+    """
+    Rows strictly after `values` in `ordering` (before them if `backwards`):
+    a >= x AND ((a > x) OR (a = x AND b > y) OR ...)
+    The redundant bound on the leading column lets the database seek the index.
+    """
+    leading = ordering[0].lstrip('-')
+    leading_descending = ordering[0].startswith('-') != backwards
+    bound = Q(**{f'{leading}__{"lte" if leading_descending else "gte"}': values[0]})
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        descending = field.startswith('-') != backwards
+        branch = Q(**{f'{name}__{"lt" if descending else "gt"}': values[i]})
+        for previous, value in zip(ordering[:i], values[:i]):
+            branch &= Q(**{previous.lstrip('-'): value})
+        condition |= branch
+    return bound & condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+class KeysetPage:
+    """
+    One page of keyset-paginated results. It quacks enough like a Django
+    Page (iteration, has_next/has_previous) for the listing templates.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.next_url = self.previous_url = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=20):
+    """
+    The page of `queryset` after (or, for a backwards cursor, before) the cursor
+    position, in `ordering`. Raises ValueError for an invalid cursor.
+    """
+    values, backwards = decode_cursor(queryset.model, ordering, cursor) if cursor else (None, False)
+    queryset = queryset.order_by(*(_reverse(ordering) if backwards else ordering))
+    if values is not None:
+        queryset = queryset.filter(keyset_filter(ordering, values, backwards))
+
+    rows = list(queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def position(row):
+        return [getattr(row, field.lstrip('-')) for field in ordering]
+
+    has_next = has_more if not backwards else True
+    has_previous = has_more if backwards else values is not None
+    return KeysetPage(
+        rows,
+        encode_cursor(ordering, position(rows[-1])) if rows and has_next else None,
+        encode_cursor(ordering, position(rows[0]), backwards=True) if rows and has_previous else None,
+    )
+
+
+def keyset_page_for_request(request, queryset, ordering, page_size):
+    """
+    keyset_paginate() for an HTML view: reads the cursor from the query string
+    and sets next_url/previous_url to links that keep the other parameters.
+    An invalid cursor shows the first page, like Paginator.get_page().
+    """
+    try:
+        page = keyset_paginate(queryset, ordering, request.GET.get(CURSOR_PARAM), page_size)
+    except ValueError:
+        page = keyset_paginate(queryset, ordering, None, page_size)
+
+    def url_for(cursor):
+        params = request.GET.copy()
+        params.pop('page', None)
+        params[MODE_PARAM] = 'cursor'
+        params[CURSOR_PARAM] = cursor
+        return f'?{params.urlencode()}'
+
+    if page.next_cursor:
+        page.next_url = url_for(page.next_cursor)
+    if page.previous_cursor:
+        page.previous_url = url_for(page.previous_cursor)
+    return page
+
+
+class KeysetPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination that switches to keyset pagination when the client
+    sends ?pagination=cursor (or a cursor) and the view defines
+    get_keyset_ordering() returning a composite sort key for the request.
+    Keyset responses have next/previous links and results, but no count.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_page = None
+        get_ordering = getattr(view, 'get_keyset_ordering', None)
+        ordering = get_ordering() if get_ordering else None
+        if not ordering or not wants_cursor(request.query_params):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request) or 20
+        try:
+            self.keyset_page = keyset_paginate(
+                queryset, ordering, request.query_params.get(CURSOR_PARAM), page_size
+            )
+        except ValueError:
+            raise NotFound('Invalid cursor')
+        return self.keyset_page.object_list
+
+    def _keyset_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        url = replace_query_param(url, MODE_PARAM, 'cursor')
+        return replace_query_param(url, CURSOR_PARAM, cursor)
+
+    def get_paginated_response(self, data):
+        if self.keyset_page is None:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self._keyset_link(self.keyset_page.next_cursor),
+            'previous': self._keyset_link(self.keyset_page.previous_cursor),
+            'results': data,
+        })
+
+
+class ProductPageNumberPagination(KeysetPageNumberPagination):
+    """Page number pagination that lets clients pick the page size"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,231 @@
+"""
+Popularity score behind the "popular" sort.
+Product views are buffered in process and written in batches (see ViewBuffer),
+so serving a product never writes to the database. The score blends
+recent views, recent order volume and approved review count:
+
+    popularity_score = VIEW_WEIGHT * recent_views
+                     + ORDER_WEIGHT * decayed units ordered in the last ORDER_WINDOW_DAYS
+                     + REVIEW_WEIGHT * rating_count
+
+recent_views decays with a half-life of HALF_LIFE_DAYS; the update_popularity
+command applies the decay and recomputes the order part periodically.
+
+Views are counted at most once. A retried batch is never counted twice, but
+the views a process still buffers when it is killed outright (SIGKILL, the
+OOM killer), so that its exit handlers don't run, are lost: up to
+VIEW_FLUSH_EVERY views, or VIEW_FLUSH_SECONDS worth, per process. That is
+noise for a popularity signal, and cheaper than writing every view.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import Product, ViewCountBatch
+from . import response_cache
+
+VIEW_WEIGHT = getattr(settings, 'CATALOG_POPULARITY_VIEW_WEIGHT', 1.0)
+ORDER_WEIGHT = getattr(settings, 'CATALOG_POPULARITY_ORDER_WEIGHT', 25.0)
+REVIEW_WEIGHT = getattr(settings, 'CATALOG_POPULARITY_REVIEW_WEIGHT', 5.0)
+HALF_LIFE_DAYS = getattr(settings, 'CATALOG_POPULARITY_HALF_LIFE_DAYS', 7)
+ORDER_WINDOW_DAYS = getattr(settings, 'CATALOG_POPULARITY_ORDER_WINDOW_DAYS', 60)
+
+# Buffered views are written once this many are pending or this many seconds passed
+VIEW_FLUSH_EVERY = getattr(settings, 'CATALOG_VIEW_FLUSH_EVERY', 100)
+VIEW_FLUSH_SECONDS = getattr(settings, 'CATALOG_VIEW_FLUSH_SECONDS', 10)
+# Products per UPDATE; each one adds seven parameters to the statement
+VIEW_FLUSH_CHUNK = 100
+# Applied batch ids are kept this long for de-duplicating retries
+VIEW_BATCH_RETENTION = timedelta(days=1)
+
+# Orders in these states don't count towards popularity
+EXCLUDED_ORDER_STATUSES = ['cancelled', 'refunded']
+
+logger = logging.getLogger(__name__)
+
+
+def decay_factor(days):
+    """How much a contribution shrinks over `days`"""
+    return 0.5 ** (days / HALF_LIFE_DAYS)
+
+
+class ViewBuffer:
+    """
+    Per-process view counts, written to the database in batches by whichever
+    comes first: VIEW_FLUSH_EVERY views, or a background flush every
+    VIEW_FLUSH_SECONDS. Each batch carries an id that is stored when it is
+    applied, so a batch retried after a failed flush is counted once. Pending
+    views are flushed at interpreter exit (but lost if the process is killed),
+    and a forked worker drops the counts it inherited from its parent, which
+    still owns them.
+    """
+
+    def __init__(self):
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        # One flush at a time, so a flush returning means earlier ones are written
+        self._flush_lock = threading.Lock()
+        self._pending = Counter()
+        self._pending_total = 0
+        self._failed = []
+        self._flusher = None
+
+    def add(self, product_id):
+        with self._lock:
+            self._pending[product_id] += 1
+            self._pending_total += 1
+            due = self._pending_total >= VIEW_FLUSH_EVERY
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically, name='view-count-flusher', daemon=True
+                )
+                self._flusher.start()
+        if due:
+            self.flush()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(VIEW_FLUSH_SECONDS)
+            try:
+                self.flush()
+            except Exception:
+                # Keep the thread alive so later views are still flushed
+                logger.exception('Periodic view count flush failed')
+            finally:
+                connection.close()
+
+    def flush(self):
+        """
+        Write the pending views and retry earlier failed batches.
+        Returns the number of views written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batches = self._failed
+                if self._pending:
+                    batches.append((uuid.uuid4(), self._pending))
+                self._failed, self._pending, self._pending_total = [], Counter(), 0
+
+            written = 0
+            failed = []
+            for batch_id, views in batches:
+                try:
+                    apply_views(views, batch_id)
+                    written += sum(views.values())
+                except DatabaseError:
+                    logger.exception('Could not write %d buffered product views, will retry', sum(views.values()))
+                    failed.append((batch_id, views))
+            if failed:
+                with self._lock:
+                    self._failed = failed + self._failed
+            return written
+
+    @property
+    def pending(self):
+        with self._lock:
+            return self._pending_total + sum(sum(views.values()) for _, views in self._failed)
+
+
+def apply_views(views, batch_id):
+    """
+    Add {product_id: views} to the view counters and the live score with one
+    CASE update per VIEW_FLUSH_CHUNK products. Returns False if the batch was
+    already applied.
+    """
+    with transaction.atomic():
+        _, created = ViewCountBatch.objects.get_or_create(
+            batch_id=batch_id, defaults={'views': sum(views.values())}
+        )
+        if not created:
+            return False
+        items = sorted(views.items())
+        for start in range(0, len(items), VIEW_FLUSH_CHUNK):
+            chunk = items[start:start + VIEW_FLUSH_CHUNK]
+
+            def delta():
+                whens = [When(pk=product_id, then=Value(n)) for product_id, n in chunk]
+                return Case(*whens, default=Value(0), output_field=IntegerField())
+
+            Product.objects.filter(pk__in=[product_id for product_id, _ in chunk]).update(
+                view_count=F('view_count') + delta(),
+                recent_views=F('recent_views') + delta(),
+                popularity_score=F('popularity_score') + VIEW_WEIGHT * delta(),
+            )
+    return True
+
+
+_views = ViewBuffer()
+atexit.register(_views.flush)
+
+
+def record_view(product_id):
+    """Count a product view; it reaches the database with the next batch"""
+    _views.add(product_id)
+
+
+def flush_views():
+    return _views.flush()
+
+
+def prune_view_batches():
+    """Forget applied batch ids older than VIEW_BATCH_RETENTION"""
+    return ViewCountBatch.objects.filter(created_at__lt=timezone.now() - VIEW_BATCH_RETENTION).delete()[0]
+
+
+def decayed_order_volume(now=None):
+    """
+    {product_id: units ordered in the last ORDER_WINDOW_DAYS}, each order day
+    weighted by its age, from one grouped query.
+    """
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    now = now or timezone.now()
+    since = now - timedelta(days=ORDER_WINDOW_DAYS)
+    rows = (
+        OrderItem.objects.filter(order__created_at__gte=since)
+        .exclude(order__status__in=EXCLUDED_ORDER_STATUSES)
+        .order_by()
+        .values('product_id', 'order__created_at__date')
+        .annotate(units=Sum('quantity'))
+    )
+    volume = defaultdict(float)
+    for row in rows:
+        age = (now.date() - row['order__created_at__date']).days
+        volume[row['product_id']] += row['units'] * decay_factor(max(age, 0))
+    return volume
+
+
+def update_popularity(elapsed_days, batch_size=1000):
+    """
+    Decay recent views by `elapsed_days` and recompute every popularity score.
+    Returns the number of products with recent orders.
+    """
+    factor = decay_factor(elapsed_days)
+    volume = decayed_order_volume()
+    with transaction.atomic():
+        Product.objects.update(
+            recent_views=F('recent_views') * factor,
+            popularity_score=VIEW_WEIGHT * F('recent_views') * factor + REVIEW_WEIGHT * F('rating_count'),
+        )
+        products = []
+        rows = Product.objects.filter(pk__in=list(volume)).values_list('pk', 'popularity_score')
+        for product_id, score in rows.iterator():
+            products.append(Product(pk=product_id, popularity_score=score + ORDER_WEIGHT * volume[product_id]))
+        Product.objects.bulk_update(products, ['popularity_score'], batch_size=batch_size)
+    # The popular sort order has moved
+    response_cache.invalidate()
+    return len(products)
@@ -0,0 +1,118 @@
+"""
+Maintenance of the denormalized review counters on Product.
+Only approved reviews are counted. Counters are updated with F() expressions,
+so concurrent reviews on the same product never lose an update.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Product, ProductReview
+from . import counters, response_cache
+
+RATING_VALUES = range(1, 6)
+
+
+def _counter_updates(deltas):
+    """
+    Turn {rating: review_count_delta} into update() kwargs for one product.
+    """
+    updates = {
+        'rating_sum': F('rating_sum') + sum(rating * n for rating, n in deltas.items()),
+        'rating_count': F('rating_count') + sum(deltas.values()),
+    }
+    for rating, n in deltas.items():
+        updates[f'rating_{rating}_count'] = F(f'rating_{rating}_count') + n
+    return updates
+
+
+def apply_rating_deltas(deltas_by_product):
+    """
+    Apply {product_id: {rating: delta}} to the product counters,
+    one UPDATE per product.
+    """
+    changed = False
+    for product_id, deltas in deltas_by_product.items():
+        deltas = {rating: n for rating, n in deltas.items() if n}
+        if deltas:
+            Product.objects.filter(pk=product_id).update(**_counter_updates(deltas))
+            changed = True
+    if changed:
+        # Ratings are part of the product representations
+        response_cache.invalidate()
+
+
+def sync_review_counters(previous, current):
+    """
+    Move a single review's contribution from `previous` to `current`.
+    Both are (product_id, rating) tuples or None, see ProductReview.rating_contribution.
+    """
+    if previous == current:
+        return
+    deltas = defaultdict(lambda: defaultdict(int))
+    if previous:
+        deltas[previous[0]][previous[1]] -= 1
+    if current:
+        deltas[current[0]][current[1]] += 1
+    apply_rating_deltas(deltas)
+
+
+def set_reviews_approval(queryset, is_approved):
+    """
+    Bulk approve or disapprove reviews and adjust the counters of the affected
+    products. Used instead of queryset.update(), which bypasses signals.
+    Returns the number of reviews whose approval changed.
+    """
+    sign = 1 if is_approved else -1
+    with transaction.atomic():
+        changing = queryset.exclude(is_approved=is_approved)
+        grouped = list(
+            changing.order_by().values('product_id', 'rating').annotate(n=Count('id'))
+        )
+        updated = ProductReview.objects.filter(
+            pk__in=list(changing.values_list('pk', flat=True))
+        ).update(is_approved=is_approved)
+
+        deltas = defaultdict(lambda: defaultdict(int))
+        for row in grouped:
+            deltas[row['product_id']][row['rating']] += sign * row['n']
+        apply_rating_deltas(deltas)
+        if updated:
+            counters.refresh(ProductReview)
+    return updated
+
+
+def rebuild_rating_counters(batch_size=1000):
+    """
+    Recompute every product's counters from the approved reviews with one
+    grouped query. Returns the number of products that have reviews.
+    """
+    aggregates = {
+        'total': Sum('rating'),
+        'count': Count('id'),
+    }
+    for rating in RATING_VALUES:
+        aggregates[f'stars_{rating}'] = Count('id', filter=Q(rating=rating))
+
+    rows = (
+        ProductReview.objects.filter(is_approved=True)
+        .order_by()
+        .values('product_id')
+        .annotate(**aggregates)
+    )
+
+    counter_fields = ['rating_sum', 'rating_count'] + [
+        f'rating_{rating}_count' for rating in RATING_VALUES
+    ]
+    with transaction.atomic():
+        Product.objects.update(**{field: 0 for field in counter_fields})
+        products = []
+        for row in rows:
+            product = Product(pk=row['product_id'], rating_sum=row['total'], rating_count=row['count'])
+            for rating in RATING_VALUES:
+                setattr(product, f'rating_{rating}_count', row[f'stars_{rating}'])
+            products.append(product)
+        Product.objects.bulk_update(products, counter_fields, batch_size=batch_size)
+    return len(products)
@@ -0,0 +1,203 @@
+"""
+Responsive image renditions.
+An uploaded image is resized once to a fixed set of widths and encoded as WebP
+(and AVIF when Pillow supports it) plus the original format. Files are named by
+a hash of the source content, so identical uploads share renditions and the
+URLs never change content and can be cached forever.
+
+The result is a manifest stored on the model next to the image field:
+
+    {'source': 'products/shirt.jpg', 'hash': '3f2a...', 'width': 2400, 'height': 3000,
+     'format': 'JPEG', 'bytes': 912331, 'color': '#a08f7c',
+     'widths': {'thumb': 160, 'card': 480, ...}, 'fallback': 'jpeg',
+     'formats': {'webp': {'160': 'renditions/3f/3f2a...-160w.webp', ...}, 'jpeg': {...}}}
+
+Width and height are after EXIF orientation is applied; renditions are
+stored upright and without the upload's EXIF data. `color` is the average
+colour, usable as a placeholder while the image loads.
+An empty 'formats' means the image could not be read; templates and
+serializers then fall back to the original file.
+"""
+
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+# Named widths in pixels; an image is never upscaled past its own width
+PRODUCT_WIDTHS = getattr(settings, 'CATALOG_PRODUCT_IMAGE_WIDTHS', {
+    'thumb': 160,
+    'card': 480,
+    'detail': 960,
+    'zoom': 1600,
+})
+AVATAR_WIDTHS = getattr(settings, 'CATALOG_AVATAR_IMAGE_WIDTHS', {
+    'thumb': 64,
+    'small': 150,
+    'medium': 300,
+})
+
+QUALITY = {'avif': 55, 'webp': 80, 'jpeg': 85}
+# AVIF support is built into Pillow 11.2+; older releases don't know the module name
+AVIF_ENABLED = (
+    getattr(settings, 'CATALOG_IMAGE_AVIF', True)
+    and 'avif' in features.modules
+    and features.check_module('avif')
+)
+WEBP_ENABLED = features.check('webp')
+
+# Bump when the encoding settings change so new renditions get new names
+RENDITION_VERSION = 2
+UPLOAD_DIR = 'renditions'
+
+# Preference order for <source> elements and srcset maps
+FORMAT_ORDER = ['avif', 'webp', 'jpeg', 'png']
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+PIL_FORMATS = {'avif': 'AVIF', 'webp': 'WEBP', 'jpeg': 'JPEG', 'png': 'PNG'}
+
+logger = logging.getLogger(__name__)
+
+
+def _has_alpha(img):
+    return img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+
+
+def _fallback_format(img):
+    """Format for browsers without WebP/AVIF: the upload's own if it's JPEG or PNG"""
+    if img.format in ('JPEG', 'PNG'):
+        return img.format.lower()
+    return 'png' if _has_alpha(img) else 'jpeg'
+
+
+def output_formats(img):
+    """Formats to encode, most efficient first; the last one is the <img> fallback"""
+    formats = []
+    if AVIF_ENABLED:
+        formats.append('avif')
+    if WEBP_ENABLED:
+        formats.append('webp')
+    formats.append(_fallback_format(img))
+    return formats
+
+
+def _encode(img, fmt):
+    if fmt == 'jpeg' and img.mode != 'RGB':
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    options = {'quality': QUALITY[fmt]} if fmt in QUALITY else {'optimize': True}
+    if fmt == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    img.save(buffer, PIL_FORMATS[fmt], **options)
+    return buffer.getvalue()
+
+
+def _average_color(img):
+    red, green, blue = img.convert('RGB').resize((1, 1), Image.BOX).getpixel((0, 0))
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def _target_widths(source_width, widths):
+    """{name: pixel width}, capping every width at the source width"""
+    return {name: min(width, source_width) for name, width in widths.items()}
+
+
+def generate(field_file, widths, storage=None):
+    """
+    Build the renditions for an image FieldFile and return the manifest.
+    Renditions that already exist in storage (same content hash) are reused.
+    """
+    storage = storage or default_storage
+    manifest = {'source': field_file.name, 'formats': {}}
+    try:
+        with field_file.open('rb') as f:
+            data = f.read()
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning('Could not read image %s for renditions', field_file.name, exc_info=True)
+        return manifest
+
+    digest = hashlib.sha256(data + f':v{RENDITION_VERSION}'.encode()).hexdigest()[:32]
+    source_format = img.format
+    formats = output_formats(img)
+    # Phone photos are often stored sideways with an EXIF orientation tag
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if _has_alpha(img) else 'RGB')
+    source_width, source_height = img.size
+    named = _target_widths(source_width, widths)
+
+    files = {fmt: {} for fmt in formats}
+    # Largest first, each step resized from the previous one
+    current = img
+    for width in sorted(set(named.values()), reverse=True):
+        height = max(1, round(source_height * width / source_width))
+        if current.width != width:
+            current = current.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            name = f'{UPLOAD_DIR}/{digest[:2]}/{digest}-{width}w.{fmt}'
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(_encode(current, fmt)))
+            files[fmt][str(width)] = name
+
+    manifest.update({
+        'hash': digest,
+        'width': source_width,
+        'height': source_height,
+        'format': source_format,
+        'bytes': len(data),
+        'color': _average_color(current),
+        'widths': named,
+        'fallback': formats[-1],
+        'formats': files,
+    })
+    return manifest
+
+
+def is_current(manifest, field_file):
+    """Whether `manifest` was built from the file currently in `field_file`"""
+    return bool(manifest) and manifest.get('source') == field_file.name
+
+
+def _url(name, request=None):
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def srcset(manifest, fmt, request=None):
+    """'url 160w, url 480w, ...' for one format of a manifest"""
+    files = (manifest or {}).get('formats', {}).get(fmt, {})
+    return ', '.join(
+        f'{_url(name, request)} {width}w'
+        for width, name in sorted(files.items(), key=lambda item: int(item[0]))
+    )
+
+
+def manifest_formats(manifest):
+    """Formats in the manifest, most efficient first"""
+    formats = (manifest or {}).get('formats', {})
+    return [fmt for fmt in FORMAT_ORDER if fmt in formats]
+
+
+def srcset_map(manifest, request=None):
+    """{format: srcset} for every format in the manifest, most efficient first"""
+    return {fmt: srcset(manifest, fmt, request) for fmt in manifest_formats(manifest)}
+
+
+def rendition_url(manifest, size, fmt=None, request=None):
+    """
+    URL of the named size (e.g. 'card') in `fmt`, by default the fallback
+    format. None if the manifest has no renditions.
+    """
+    formats = (manifest or {}).get('formats')
+    if not formats:
+        return None
+    fmt = fmt or manifest['fallback']
+    widths = manifest['widths']
+    width = widths.get(size, max(widths.values()))
+    name = formats.get(fmt, {}).get(str(width))
+    return _url(name, request) if name else None
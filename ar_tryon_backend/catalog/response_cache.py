@@ -0,0 +1,136 @@
+"""
+Shared response cache for the public catalog API.
+Product lists, product details, categories, brands and catalog stats are
+the same for every visitor, so their rendered JSON is cached per path and
+normalized query string and served without touching the database.
+
+Entries are keyed by the catalog generation, the time of the last catalog
+change. invalidate() moves the generation on (from the catalog signals, admin
+and dashboard bulk actions, rating changes and finished image jobs), which
+retires every entry at once. The generation is also the Last-Modified
+date, and each response carries an ETag and a public Cache-Control max-age,
+so browsers revalidate with 304s and a CDN or nginx can cache the responses
+too.
+Stock levels and popularity scores change with every checkout and view flush
+and do not invalidate the cache; they can lag by up to CACHE_TIMEOUT.
+
+Entries live in the cache named by CATALOG_RESPONSE_CACHE ('catalog'; see
+CACHES in settings): local memory for tests and single-process development,
+a file or Redis cache shared by all workers in production.
+"""
+
+import functools
+import hashlib
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+CACHE_ALIAS = getattr(settings, 'CATALOG_RESPONSE_CACHE', 'catalog')
+CACHE_TIMEOUT = getattr(settings, 'CATALOG_RESPONSE_CACHE_TIMEOUT', 300)
+# How long browsers and shared caches may reuse a response without revalidating
+MAX_AGE = getattr(settings, 'CATALOG_RESPONSE_MAX_AGE', 60)
+CACHE_PREFIX = 'catalog:responses'
+GENERATION_KEY = f'{CACHE_PREFIX}:generation'
+
+_bypassed = False
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def generation():
+    """Time of the last catalog change, as a float timestamp"""
+    return _cache().get_or_set(GENERATION_KEY, time.time, None)
+
+
+def _bump():
+    _cache().set(GENERATION_KEY, time.time(), None)
+
+
+def invalidate():
+    """Retire every cached response, once the current transaction commits"""
+    transaction.on_commit(_bump)
+
+
+@contextmanager
+def bypassed():
+    """Run the views uncached, e.g. to benchmark them"""
+    global _bypassed
+    previous, _bypassed = _bypassed, True
+    try:
+        yield
+    finally:
+        _bypassed = previous
+
+
+def _wants_json(request):
+    # The browsable API is HTML with the user's name in it; only JSON is shared
+    if request.GET.get('format') not in (None, 'json'):
+        return False
+    accept = request.headers.get('Accept', '')
+    return 'text/html' not in accept
+
+
+def cache_key(request, gen):
+    query = urlencode(sorted((key, value) for key, values in request.GET.lists() for value in values))
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'{CACHE_PREFIX}:{gen!r}:{digest}'
+
+
+def _finish(request, response, etag, gen):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(gen)
+    patch_cache_control(response, public=True, max_age=MAX_AGE)
+    patch_vary_headers(response, ['Accept'])
+    return get_conditional_response(request, etag=etag, last_modified=int(gen), response=response)
+
+
+def cached_response(on_hit=None):
+    """
+    Decorator for a catalog view (a function view, or a class-based view's
+    dispatch) that serves successful GET responses from the cache.
+    A view can put a dict in `response.cache_meta`; it is stored with the
+    entry and passed to `on_hit(meta)` whenever the entry is served, for
+    per-request side effects such as counting product views.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if _bypassed or request.method not in ('GET', 'HEAD') or not _wants_json(request):
+                return view(request, *args, **kwargs)
+
+            gen = generation()
+            key = cache_key(request, gen)
+            entry = _cache().get(key)
+            if entry is not None:
+                if on_hit is not None:
+                    on_hit(entry['meta'])
+                response = HttpResponse(entry['content'], content_type=entry['content_type'])
+                response['X-Cache'] = 'HIT'
+                return _finish(request, response, entry['etag'], gen)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if hasattr(response, 'render'):
+                response.render()
+            etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+            _cache().set(key, {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': etag,
+                'meta': getattr(response, 'cache_meta', None),
+            }, CACHE_TIMEOUT)
+            response['X-Cache'] = 'MISS'
+            return _finish(request, response, etag, gen)
+
+        return wrapper
+    return decorator
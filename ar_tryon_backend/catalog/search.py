@@ -0,0 +1,213 @@
+"""
+Full-text product search.
+Products are indexed by name, short description, description, brand and category
+in an inverted index: an FTS5 table on SQLite, a tsvector table with a GIN index
+on PostgreSQL. Other backends fall back to icontains filtering. Searches are
+plain querysets: on SQLite they join the index through ProductSearchDocument,
+on PostgreSQL they select the matches from the index and rank them with
+SearchRank.
+"""
+
+import re
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+SQLITE_TABLE = 'catalog_product_fts'
+POSTGRES_TABLE = 'catalog_product_search'
+POSTGRES_CONFIG = 'simple'
+
+# Relevance weights for name, short_description, description, brand, category
+SQLITE_WEIGHTS = '10.0, 4.0, 1.0, 6.0, 3.0'
+
+# Products re-indexed per statement, well below SQLite's parameter limit
+REINDEX_CHUNK = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_QUERY_TOKENS = 8
+
+# Products joined with the brand and category names that get indexed
+SOURCE_FROM = '''
+    FROM catalog_product p
+    JOIN catalog_brand b ON b.id = p.brand_id
+    JOIN catalog_category c ON c.id = p.category_id
+'''
+
+
+def _selection(product_ids):
+    """WHERE clause (on the `p` alias of SOURCE_FROM) and parameters selecting `product_ids`, or every product"""
+    if product_ids is None:
+        return '', []
+    return f'WHERE p.id IN ({", ".join(["%s"] * len(product_ids))})', list(product_ids)
+
+
+def tokenize(query):
+    """Split a user query into lowercase word tokens safe for both query syntaxes"""
+    return [token.lower() for token in TOKEN_RE.findall(query or '')][:MAX_QUERY_TOKENS]
+
+
+class SQLiteSearchBackend:
+    """FTS5 index, ranked with bm25()"""
+
+    def filter(self, queryset, tokens):
+        # Every token must match, as a prefix so results update while typing
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        # The join to the index makes the FTS5 query drive the lookup
+        return queryset.filter(
+            RawSQL(f'{SQLITE_TABLE} MATCH %s', [match], output_field=BooleanField()),
+            search_document__isnull=False,
+        ).annotate(
+            search_rank=RawSQL(f'-bm25({SQLITE_TABLE}, {SQLITE_WEIGHTS})', [], output_field=FloatField())
+        )
+
+    def reindex(self, cursor, product_ids=None):
+        where, params = _selection(product_ids)
+        if product_ids is not None:
+            self.remove(cursor, product_ids)
+        cursor.execute(
+            f'INSERT INTO {SQLITE_TABLE} (rowid, name, short_description, description, brand, category) '
+            f'SELECT p.id, p.name, p.short_description, p.description, b.name, c.name '
+            f'{SOURCE_FROM} {where}',
+            params,
+        )
+
+    def remove(self, cursor, product_ids):
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE}')
+
+
+class PostgresSearchBackend:
+    """tsvector table with a GIN index, ranked with ts_rank_cd()"""
+
+    def filter(self, queryset, tokens):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+        raw_query = ' & '.join(f'{token}:*' for token in tokens)
+        # The GIN index finds the matches; each match's document is then read by key to rank it
+        matches = RawSQL(
+            f'SELECT product_id FROM {POSTGRES_TABLE} WHERE document @@ to_tsquery(%s, %s)',
+            [POSTGRES_CONFIG, raw_query],
+        )
+        document = RawSQL(
+            f'SELECT document FROM {POSTGRES_TABLE} WHERE product_id = {Product._meta.db_table}.id',
+            [],
+            output_field=SearchVectorField(),
+        )
+        query = SearchQuery(raw_query, config=POSTGRES_CONFIG, search_type='raw')
+        return queryset.filter(pk__in=matches).annotate(
+            search_rank=SearchRank(document, query, cover_density=True)
+        )
+
+    def reindex(self, cursor, product_ids=None):
+        where, params = _selection(product_ids)
+        config = POSTGRES_CONFIG
+        cursor.execute(
+            f'''
+            INSERT INTO {POSTGRES_TABLE} (product_id, document)
+            SELECT p.id,
+                setweight(to_tsvector('{config}', p.name), 'A') ||
+                setweight(to_tsvector('{config}', b.name), 'B') ||
+                setweight(to_tsvector('{config}', c.name), 'B') ||
+                setweight(to_tsvector('{config}', p.short_description), 'C') ||
+                setweight(to_tsvector('{config}', p.description), 'D')
+            {SOURCE_FROM}
+            {where}
+            ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document
+            ''',
+            params,
+        )
+
+    def remove(self, cursor, product_ids):
+        cursor.execute(f'DELETE FROM {POSTGRES_TABLE} WHERE product_id = ANY(%s)', [list(product_ids)])
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {POSTGRES_TABLE}')
+
+
+class FallbackSearchBackend:
+    """No index: substring matching on the main text fields"""
+
+    def filter(self, queryset, tokens):
+        for token in tokens:
+            queryset = queryset.filter(
+                Q(name__icontains=token) |
+                Q(short_description__icontains=token) |
+                Q(description__icontains=token) |
+                Q(brand__name__icontains=token) |
+                Q(category__name__icontains=token)
+            )
+        return queryset
+
+    def reindex(self, cursor, product_ids=None):
+        pass
+
+    def remove(self, cursor, product_ids):
+        pass
+
+    def clear(self, cursor):
+        pass
+
+
+def get_backend():
+    """Search backend for the database vendor in use"""
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return FallbackSearchBackend()
+
+
+def search_products(queryset, query):
+    """
+    Restrict a Product queryset to products matching every word of `query`.
+    On indexed backends the result is annotated with `search_rank`
+    (higher is more relevant); order by `-search_rank` to rank it.
+    Returns the queryset unchanged if the query has no words.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+    return get_backend().filter(queryset, tokens)
+
+
+def order_by_relevance(queryset):
+    """Order a `search_products()` result by relevance, best match first"""
+    if 'search_rank' in queryset.query.annotations:
+        return queryset.order_by('-search_rank', 'name')
+    return queryset.order_by('name')
+
+
+def reindex_products(product_ids):
+    """Add or refresh products in the index, REINDEX_CHUNK at a time"""
+    product_ids = list(product_ids)
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), REINDEX_CHUNK):
+            backend.reindex(cursor, product_ids[start:start + REINDEX_CHUNK])
+
+
+def index_product(product_id):
+    """Add or refresh a single product in the index"""
+    reindex_products([product_id])
+
+
+def remove_products(product_ids):
+    """Drop products from the index"""
+    product_ids = list(product_ids)
+    if product_ids:
+        with connection.cursor() as cursor:
+            get_backend().remove(cursor, product_ids)
+
+
+def rebuild_index():
+    """Drop every indexed document and index the whole catalog again"""
+    backend = get_backend()
+    with transaction.atomic(), connection.cursor() as cursor:
+        backend.clear(cursor)
+        backend.reindex(cursor)
@@ -2,6 +2,7 @@
 Serializers for catalog app API
 """
 from rest_framework import serializers
+from . import renditions
 from .models import Product, Category, Brand, ProductImage
 
 
@@ -22,11 +23,20 @@ class BrandSerializer(serializers.ModelSerializer):
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
-    """Serializer for ProductImage model"""
+    """
+    Serializer for ProductImage model.
+    `srcset` maps each rendition format to a srcset string, most efficient
+    format first, e.g. {'webp': 'https://.../x-160w.webp 160w, ...', 'jpeg': ...};
+    it is empty until the renditions are built.
+    """
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'alt_text', 'is_primary', 'sort_order']
+        fields = ['id', 'image', 'alt_text', 'is_primary', 'is_try_on_garment', 'sort_order', 'srcset']
+
+    def get_srcset(self, obj):
+        return renditions.srcset_map(obj.renditions, self.context.get('request'))
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -36,8 +46,9 @@ class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     
     # Computed fields
-    average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(read_only=True)
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     
     class Meta:
         model = Product
@@ -46,17 +57,65 @@ class ProductSerializer(serializers.ModelSerializer):
             'category', 'brand', 'gender', 'available_sizes', 'available_colors', 
             'stock_quantity', 'is_available', 'is_try_on_enabled', 'try_on_category',
             'is_featured', 'is_active', 'created_at', 'updated_at', 'images', 
+            'average_rating', 'review_count', 'rating_histogram'
+        ]
+
+
+class RequestCachedSerializerMixin:
+    """
+    Serialize each related object once per request.
+    A page of products usually shares a handful of categories and brands, so
+    the representation is memoized in the serializer context by primary key.
+    """
+
+    def to_representation(self, instance):
+        cache = self.context.setdefault('_representation_cache', {})
+        key = (type(self).__name__, instance.pk)
+        if key not in cache:
+            cache[key] = super().to_representation(instance)
+        return cache[key]
+
+
+class CachedCategorySerializer(RequestCachedSerializerMixin, CategorySerializer):
+    """Category serializer that reuses the representation within a request"""
+
+
+class CachedBrandSerializer(RequestCachedSerializerMixin, BrandSerializer):
+    """Brand serializer that reuses the representation within a request"""
+
+
+class ProductListSerializer(ProductSerializer):
+    """
+    Full product representation for list endpoints.
+    Expects a queryset built with `Product.objects.with_listing_relations()`.
+    """
+    category = CachedCategorySerializer(read_only=True)
+    brand = CachedBrandSerializer(read_only=True)
+
+
+class ProductCardSerializer(ProductSerializer):
+    """
+    Slim product representation for product grids and cards.
+    Expects a queryset built with `Product.objects.with_listing_relations()`.
+    """
+    category = None
+    brand = None
+    images = None
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    brand_name = serializers.CharField(source='brand.name', read_only=True)
+    primary_image = serializers.SerializerMethodField()
+
+    class Meta(ProductSerializer.Meta):
+        fields = [
+            'id', 'name', 'slug', 'short_description', 'price', 'sale_price',
+            'category_name', 'brand_name', 'gender', 'is_available',
+            'is_try_on_enabled', 'is_featured', 'primary_image',
             'average_rating', 'review_count'
         ]
-    
-    def get_average_rating(self, obj):
-        """Calculate average rating for the product"""
-        # For now, return a placeholder value
-        # In a real app, this would calculate from actual reviews
-        return 4.2
-    
-    def get_review_count(self, obj):
-        """Get review count for the product"""
-        # For now, return a placeholder value
-        # In a real app, this would count actual reviews
-        return 156
+
+    def get_primary_image(self, obj):
+        """First prefetched image (primary images are ordered first)"""
+        images = obj.images.all()
+        if not images:
+            return None
+        return ProductImageSerializer(images[0], context=self.context).data
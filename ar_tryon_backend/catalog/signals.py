@@ -0,0 +1,172 @@
+"""
+Signal handlers for catalog app.
+They keep denormalized data on Product in sync with related models.
+"""
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Category, Brand, ImageJob, Product, ProductImage, ProductReview
+from .ratings import sync_review_counters
+from . import counters, facets, image_jobs, renditions, response_cache, search, suggest
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_review_contribution(sender, instance, raw, **kwargs):
+    """
+    Make sure we know what an existing review counted for before it changes.
+    Reviews loaded normally already carry this (see ProductReview.from_db).
+    """
+    if raw or instance._state.adding or hasattr(instance, '_counted_rating'):
+        return
+    stored = sender.objects.filter(pk=instance.pk).first()
+    instance._counted_rating = stored.rating_contribution() if stored else None
+
+
+@receiver(post_save, sender=ProductReview)
+def update_rating_counters_on_save(sender, instance, created, raw, **kwargs):
+    """Apply the rating change of a created or edited review to its product"""
+    if raw:
+        return
+    previous = None if created else instance._counted_rating
+    current = instance.rating_contribution()
+    sync_review_counters(previous, current)
+    instance._counted_rating = current
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_rating_counters_on_delete(sender, instance, **kwargs):
+    """Remove a deleted review from its product's counters"""
+    previous = getattr(instance, '_counted_rating', instance.rating_contribution())
+    sync_review_counters(previous, None)
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Brand)
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=ProductReview)
+def remember_counted_contribution(sender, instance, raw, **kwargs):
+    """Note what an existing object counts for in the catalog counters before it changes"""
+    if not raw and not instance._state.adding:
+        instance._counted_counters = counters.stored_contribution(sender, instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=ProductReview)
+def update_catalog_counters_on_save(sender, instance, created, raw, **kwargs):
+    """Move the catalog counters from what the object counted for to what it counts for now"""
+    if raw:
+        # Fixture loads are followed by reconcile_catalog_counters
+        return
+    previous = set() if created else getattr(instance, '_counted_counters', set())
+    current = counters.contribution(sender, instance)
+    counters.apply(previous, current)
+    instance._counted_counters = current
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=ProductReview)
+def update_catalog_counters_on_delete(sender, instance, **kwargs):
+    """Take a deleted object out of the catalog counters"""
+    previous = getattr(instance, '_counted_counters', None)
+    counters.apply(counters.contribution(sender, instance) if previous is None else previous, set())
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, **kwargs):
+    """Keep the product's search document and autocomplete entry current"""
+    search.index_product(instance.pk)
+    suggest.update_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    """Drop a deleted product from the search and autocomplete indexes"""
+    search.remove_products([instance.pk])
+    suggest.remove('product', instance.pk)
+
+
+@receiver(post_save, sender=Brand)
+def reindex_brand_products(sender, instance, created, **kwargs):
+    """Brand names are part of every product document of that brand"""
+    suggest.update_named('brand', instance)
+    if not created:
+        search.reindex_products(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    """Category names are part of every product document in that category"""
+    suggest.update_named('category', instance)
+    if not created:
+        search.reindex_products(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Brand)
+def unsuggest_brand_on_delete(sender, instance, **kwargs):
+    """Drop a deleted brand from autocomplete"""
+    suggest.remove('brand', instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+def unsuggest_category_on_delete(sender, instance, **kwargs):
+    """Drop a deleted category from autocomplete"""
+    suggest.remove('category', instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_facets(sender, **kwargs):
+    """Any catalog change can move facet counts"""
+    facets.invalidate()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_catalog_responses(sender, **kwargs):
+    """Cached catalog API responses may include the changed object"""
+    response_cache.invalidate()
+
+
+@receiver(post_save, sender=ProductImage)
+def queue_product_image_processing(sender, instance, raw, **kwargs):
+    """Queue renditions for a new or replaced product image"""
+    if raw or not instance.image or renditions.is_current(instance.renditions, instance.image):
+        return
+    image_jobs.enqueue(ImageJob.PRODUCT_IMAGE, instance.pk)
+
+
+@receiver(post_save, sender=ProductImage)
+def queue_try_on_garment_processing(sender, instance, raw, **kwargs):
+    """Queue try-on assets for a new, replaced or newly flagged garment image"""
+    from tryon import assets as tryon_assets
+
+    if (raw or not instance.image or not instance.is_try_on_garment
+            or tryon_assets.is_current(instance.try_on_assets, instance.image)):
+        return
+    image_jobs.enqueue(ImageJob.TRYON_GARMENT, instance.pk)
+
+
+@receiver(post_save, sender='users.UserProfile')
+def queue_avatar_processing(sender, instance, raw, **kwargs):
+    """Queue renditions for a new avatar (profiles are saved on every user save)"""
+    if raw or not instance.avatar or renditions.is_current(instance.avatar_renditions, instance.avatar):
+        return
+    image_jobs.enqueue(ImageJob.AVATAR, instance.pk)
@@ -0,0 +1,258 @@
+"""
+In-process prefix index for search-box autocomplete.
+Names of active products, brands and categories are kept in a sorted array of
+keys and looked up with bisect, so a suggestion never touches the database.
+The index is built on first use and kept current by signals (see
+catalog.signals); their changes are applied once the transaction commits, so
+a rolled-back save never shows up in suggestions.
+"""
+
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Category, Brand, Product
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Rebuild from the database after this many seconds, to pick up changes made
+# by other worker processes or by bulk updates that don't send signals
+MAX_AGE = getattr(settings, 'CATALOG_SUGGEST_MAX_AGE', 300)
+
+# Higher weight ranks first among equally good matches
+KIND_WEIGHTS = {'category': 30, 'brand': 20, 'product': 10}
+FEATURED_BONUS = 5
+
+MAX_LIMIT = 20
+# Prefixes matching more keys than this keep a ranked top list that is updated
+# in place, so short prefixes like "s" don't rescan thousands of keys
+HEAVY_PREFIX = 64
+TOP_SIZE = 2 * MAX_LIMIT
+
+
+def normalize(text):
+    """Lowercase words separated by single spaces"""
+    return ' '.join(WORD_RE.findall((text or '').lower()))
+
+
+class SuggestionIndex:
+    """
+    Sorted array of (key, kind, id) tuples. Each suggestion is stored under its
+    full normalized label and under every word-start suffix, so "shi" finds
+    both "Shirts" and "Linen Shirt".
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._entries = {}
+        self._top = {}
+        self.built_at = 0.0
+
+    def _suffix_keys(self, label):
+        words = normalize(label).split(' ')
+        return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+    def _rank(self, entry, key):
+        """Sort key of a suggestion matched through `key`, lower ranks first"""
+        # Matching the start of the label beats matching a later word
+        return (key != entry['full_key'], -entry['weight'], len(entry['label']))
+
+    def _prefix_ranks(self, ref):
+        """Best rank of a suggestion under each prefix of its keys"""
+        entry = self._entries[ref]
+        best = {}
+        for key in entry['keys']:
+            rank = self._rank(entry, key)
+            for end in range(1, len(key) + 1):
+                prefix = key[:end]
+                if prefix not in best or rank < best[prefix]:
+                    best[prefix] = rank
+        return best
+
+    def _make_entry(self, kind, label, slug, weight):
+        return {
+            'type': kind,
+            'label': label,
+            'slug': slug,
+            'weight': KIND_WEIGHTS[kind] + weight,
+            'keys': self._suffix_keys(label),
+            'full_key': normalize(label),
+        }
+
+    def add(self, kind, obj_id, label, slug, weight=0):
+        """Insert or replace a suggestion"""
+        with self._lock:
+            self.remove(kind, obj_id)
+            ref = (kind, obj_id)
+            entry = self._entries[ref] = self._make_entry(kind, label, slug, weight)
+            for key in entry['keys']:
+                insort(self._keys, (key, kind, obj_id))
+            if self._top:
+                for prefix, rank in self._prefix_ranks(ref).items():
+                    top = self._top.get(prefix)
+                    if top is None:
+                        continue
+                    ranked = top['ranked']
+                    if len(ranked) < TOP_SIZE or (rank, ref) < ranked[-1]:
+                        insort(ranked, (rank, ref))
+                        if len(ranked) > TOP_SIZE:
+                            ranked.pop()
+                            top['complete'] = False
+                    else:
+                        # A match left out of the cached list
+                        top['complete'] = False
+
+    def remove(self, kind, obj_id):
+        """Remove a suggestion if present"""
+        with self._lock:
+            ref = (kind, obj_id)
+            if ref not in self._entries:
+                return
+            if self._top:
+                for prefix in self._prefix_ranks(ref):
+                    top = self._top.get(prefix)
+                    if top is None:
+                        continue
+                    top['ranked'] = [item for item in top['ranked'] if item[1] != ref]
+                    if len(top['ranked']) < MAX_LIMIT and not top['complete']:
+                        # Too few left to answer every limit, rescan on next use
+                        del self._top[prefix]
+            entry = self._entries.pop(ref)
+            for key in entry['keys']:
+                position = bisect_left(self._keys, (key, kind, obj_id))
+                if position < len(self._keys) and self._keys[position] == (key, kind, obj_id):
+                    del self._keys[position]
+
+    def _scan(self, prefix):
+        """Best rank of every suggestion with a key starting with `prefix`"""
+        ranks = {}
+        scanned = 0
+        position = bisect_left(self._keys, (prefix,))
+        while position < len(self._keys) and self._keys[position][0].startswith(prefix):
+            key, kind, obj_id = self._keys[position]
+            ref = (kind, obj_id)
+            rank = self._rank(self._entries[ref], key)
+            if ref not in ranks or rank < ranks[ref]:
+                ranks[ref] = rank
+            position += 1
+            scanned += 1
+        return ranks, scanned
+
+    def suggest(self, query, limit=8):
+        """Top `limit` suggestions whose label has a word starting with `query`"""
+        prefix = normalize(query)
+        limit = min(limit, MAX_LIMIT)
+        if not prefix or limit < 1:
+            return []
+        with self._lock:
+            top = self._top.get(prefix)
+            if top is not None:
+                best = top['ranked'][:limit]
+            else:
+                ranks, scanned = self._scan(prefix)
+                ranked = heapq.nsmallest(TOP_SIZE, ((rank, ref) for ref, rank in ranks.items()))
+                if scanned > HEAVY_PREFIX:
+                    self._top[prefix] = {'ranked': ranked, 'complete': len(ranks) <= TOP_SIZE}
+                best = ranked[:limit]
+            return [
+                {field: self._entries[ref][field] for field in ('type', 'label', 'slug')}
+                for _, ref in best
+            ]
+
+    def load(self):
+        """Replace the contents with the active catalog from the database"""
+        entries = {}
+        for category in Category.objects.filter(is_active=True).only('id', 'name', 'slug'):
+            entries[('category', category.pk)] = self._make_entry(
+                'category', category.name, category.slug, 0
+            )
+        for brand in Brand.objects.filter(is_active=True).only('id', 'name', 'slug'):
+            entries[('brand', brand.pk)] = self._make_entry('brand', brand.name, brand.slug, 0)
+        products = Product.objects.filter(is_active=True, is_available=True).values_list(
+            'id', 'name', 'slug', 'is_featured'
+        )
+        for product_id, name, slug, is_featured in products.iterator():
+            entries[('product', product_id)] = self._make_entry(
+                'product', name, slug, FEATURED_BONUS if is_featured else 0
+            )
+        # One sort instead of an insort per key; readers keep the old index meanwhile
+        fresh = SuggestionIndex()
+        fresh._entries = entries
+        fresh._keys = sorted(
+            (key, kind, obj_id) for (kind, obj_id), entry in entries.items() for key in entry['keys']
+        )
+        # Re-rank the prefixes that were hot, so a refresh doesn't make them slow again
+        for prefix in list(self._top):
+            fresh.suggest(prefix, 1)
+        with self._lock:
+            self._keys = fresh._keys
+            self._entries = fresh._entries
+            self._top = fresh._top
+            self.built_at = time.monotonic()
+
+    @property
+    def is_built(self):
+        return self.built_at > 0
+
+    def is_stale(self):
+        return time.monotonic() - self.built_at > MAX_AGE
+
+
+_index = SuggestionIndex()
+_build_lock = threading.Lock()
+
+
+def get_index():
+    """The process-wide index, (re)built from the database when needed"""
+    if not _index.is_built:
+        with _build_lock:
+            if not _index.is_built:
+                _index.load()
+    elif _index.is_stale() and _build_lock.acquire(blocking=False):
+        # One thread reloads; the others keep answering from the old index
+        try:
+            if _index.is_stale():
+                _index.load()
+        finally:
+            _build_lock.release()
+    return _index
+
+
+def suggest(query, limit=8):
+    return get_index().suggest(query, limit)
+
+
+def _apply(method, *args):
+    """Call an index method once the current transaction commits, if the index is built by then"""
+    def apply():
+        if _index.is_built:
+            method(*args)
+    transaction.on_commit(apply)
+
+
+def update_product(product):
+    """Apply a saved product to the index on commit"""
+    if product.is_active and product.is_available:
+        _apply(_index.add, 'product', product.pk, product.name, product.slug,
+               FEATURED_BONUS if product.is_featured else 0)
+    else:
+        _apply(_index.remove, 'product', product.pk)
+
+
+def update_named(kind, obj):
+    """Apply a saved brand or category to the index on commit"""
+    if obj.is_active:
+        _apply(_index.add, kind, obj.pk, obj.name, obj.slug)
+    else:
+        _apply(_index.remove, kind, obj.pk)
+
+
+def remove(kind, obj_id):
+    """Drop a deleted product, brand or category from the index on commit"""
+    _apply(_index.remove, kind, obj_id)
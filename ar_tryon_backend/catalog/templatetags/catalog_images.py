@@ -0,0 +1,41 @@
+"""
+Template tags for responsive product images.
+"""
+
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from catalog import renditions
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(image, manifest, size, sizes=None, **attrs):
+    """
+    <picture> with AVIF/WebP sources and a fallback <img> for an image field
+    and its rendition manifest. `size` names the rendition used as the <img>
+    src; `sizes` defaults to that rendition's width. Other keyword arguments
+    become <img> attributes.
+    Usage: {% picture main_image.image main_image.renditions 'card' class="card-img-top" alt=product.name %}
+    """
+    if not image:
+        return ''
+    src = renditions.rendition_url(manifest, size)
+    if src is None:
+        return format_html('<picture><img src="{}"{}></picture>', image.url, flatatt(attrs))
+
+    sizes = sizes or f'{manifest["widths"].get(size, manifest["width"])}px'
+    fallback = manifest['fallback']
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (renditions.MIME_TYPES[fmt], renditions.srcset(manifest, fmt), sizes)
+            for fmt in renditions.manifest_formats(manifest) if fmt != fallback
+        ),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        sources, src, renditions.srcset(manifest, fallback), sizes, flatatt(attrs),
+    )
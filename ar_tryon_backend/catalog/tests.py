@@ -1,3 +1,487 @@
-from django.test import TestCase
+import json
+import threading
+import uuid
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from . import counters, image_jobs, popularity, response_cache, search, suggest
+from .api_views import ProductListAPIView
+from .views import catalog_home
+from .models import Brand, Category, ImageJob, Product, ProductImage, ProductReview, ViewCountBatch
+
+
+def create_product(name, category, brand, **fields):
+    fields.setdefault('slug', name.lower().replace(' ', '-'))
+    fields.setdefault('description', 'Made for everyday wear.')
+    fields.setdefault('price', Decimal('999.00'))
+    return Product.objects.create(name=name, category=category, brand=brand, **fields)
+
+
+class SuggestionIndexTests(SimpleTestCase):
+
+    def slugs(self, index, query, limit=8):
+        return [suggestion['slug'] for suggestion in index.suggest(query, limit)]
+
+    def test_ranking(self):
+        index = suggest.SuggestionIndex()
+        index.add('product', 1, 'Linen Shirt', 'linen-shirt')
+        index.add('product', 2, 'Shirt Dress', 'shirt-dress')
+        index.add('product', 3, 'Shirt', 'shirt')
+        index.add('product', 4, 'Shirt Jacket', 'shirt-jacket', suggest.FEATURED_BONUS)
+        index.add('brand', 1, 'Shirtworks', 'shirtworks')
+        index.add('category', 1, 'Shirts', 'shirts')
+        # Categories, then brands, then products; labels starting with the
+        # query before later words; featured, then shorter labels first
+        self.assertEqual(
+            self.slugs(index, 'shi'),
+            ['shirts', 'shirtworks', 'shirt-jacket', 'shirt', 'shirt-dress', 'linen-shirt'],
+        )
+        self.assertEqual(self.slugs(index, 'Shirt  DR'), ['shirt-dress'])
+        self.assertEqual(self.slugs(index, 'shi', limit=2), ['shirts', 'shirtworks'])
+        self.assertEqual(self.slugs(index, 'pants'), [])
+
+    def test_replace_and_remove(self):
+        index = suggest.SuggestionIndex()
+        index.add('product', 1, 'Linen Shirt', 'linen-shirt')
+        index.add('product', 1, 'Linen Trousers', 'linen-trousers')
+        self.assertEqual(self.slugs(index, 'shirt'), [])
+        self.assertEqual(self.slugs(index, 'trou'), ['linen-trousers'])
+        index.remove('product', 1)
+        index.remove('product', 1)
+        self.assertEqual(self.slugs(index, 'linen'), [])
+
+    def test_cached_prefix_lists_follow_changes(self):
+        index = suggest.SuggestionIndex()
+        # Two keys per product under "shirt", so the prefix gets a cached top list
+        for i in range(suggest.TOP_SIZE):
+            index.add('product', i, f'Shirt Shirt {i}', f'shirt-{i}', 100)
+        self.assertEqual(len(index.suggest('shirt', suggest.MAX_LIMIT)), suggest.MAX_LIMIT)
+        self.assertTrue(index._top['shirt']['complete'])
+
+        # Ranked below the full cached list, so it is left out of it...
+        index.add('product', 100, 'Shirt Low', 'shirt-low')
+        for i in range(suggest.TOP_SIZE - 5):
+            index.remove('product', i)
+        # ...and still found once removals leave the list short
+        self.assertIn('shirt-low', self.slugs(index, 'shirt', suggest.MAX_LIMIT))
+
+    def test_cached_prefix_lists_take_better_matches(self):
+        index = suggest.SuggestionIndex()
+        for i in range(suggest.TOP_SIZE):
+            index.add('product', i, f'Shirt Shirt {i}', f'shirt-{i}', 100)
+        index.suggest('shirt')
+        index.add('product', 100, 'Shirt Top', 'shirt-top', 200)
+        self.assertEqual(self.slugs(index, 'shirt', 1), ['shirt-top'])
+
+
+class SuggestSignalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Shirts', slug='shirts')
+        cls.brand = Brand.objects.create(name='Acme', slug='acme')
+
+    def setUp(self):
+        suggest._index.load()
+        self.addCleanup(setattr, suggest, '_index', suggest.SuggestionIndex())
+
+    def slugs(self, query):
+        return [suggestion['slug'] for suggestion in suggest.suggest(query)]
+
+    def test_saves_and_deletes_apply_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = create_product('Oxford Shirt', self.category, self.brand)
+            self.assertEqual(self.slugs('oxford'), [])
+        self.assertEqual(self.slugs('oxford'), ['oxford-shirt'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.is_available = False
+            product.save()
+        self.assertEqual(self.slugs('oxford'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.name = 'Oxfordian'
+            self.brand.save()
+        self.assertEqual(self.slugs('oxford'), ['acme'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.delete()
+        self.assertEqual(self.slugs('oxford'), [])
+
+    def test_rolled_back_saves_leave_the_index_alone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                create_product('Oxford Shirt', self.category, self.brand)
+                self.category.delete()
+                raise RuntimeError
+        self.assertEqual(self.slugs('oxford'), [])
+        self.assertEqual(self.slugs('shirts'), ['shirts'])
+
+
+class ViewCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        brand = Brand.objects.create(name='Acme', slug='acme')
+        cls.shirt = create_product('Oxford Shirt', category, brand)
+        cls.dress = create_product('Wrap Dress', category, brand)
+
+    def views(self):
+        return dict(Product.objects.filter(pk__in=[self.shirt.pk, self.dress.pk]).values_list('pk', 'view_count'))
+
+    def buffer(self, *product_ids):
+        buffer = popularity.ViewBuffer()
+        # No background flusher; the tests flush themselves
+        buffer._flusher = mock.Mock()
+        for product_id in product_ids:
+            buffer.add(product_id)
+        return buffer
+
+    def test_a_batch_is_applied_once(self):
+        batch_id = uuid.uuid4()
+        views = Counter({self.shirt.pk: 3, self.dress.pk: 1})
+        self.assertTrue(popularity.apply_views(views, batch_id))
+        self.assertFalse(popularity.apply_views(views, batch_id))
+        self.assertEqual(self.views(), {self.shirt.pk: 3, self.dress.pk: 1})
+        self.assertEqual(ViewCountBatch.objects.get(batch_id=batch_id).views, 4)
+        product = Product.objects.get(pk=self.shirt.pk)
+        self.assertEqual(product.recent_views, 3)
+        self.assertEqual(product.popularity_score, 3 * popularity.VIEW_WEIGHT)
+
+    def test_failed_flush_is_retried(self):
+        buffer = self.buffer(self.shirt.pk, self.shirt.pk, self.dress.pk)
+        with self.assertLogs('catalog.popularity', 'ERROR'):
+            with mock.patch.object(popularity, 'apply_views', side_effect=DatabaseError):
+                self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending, 3)
+        buffer.add(self.dress.pk)
+        self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(buffer.pending, 0)
+        self.assertEqual(self.views(), {self.shirt.pk: 2, self.dress.pk: 2})
+
+    def test_retry_after_an_ambiguous_failure_counts_once(self):
+        buffer = self.buffer(self.shirt.pk, self.dress.pk)
+        apply_views = popularity.apply_views
+
+        def applied_but_failed(views, batch_id):
+            # The batch committed, but the connection dropped before we heard back
+            apply_views(views, batch_id)
+            raise DatabaseError
+
+        with self.assertLogs('catalog.popularity', 'ERROR'):
+            with mock.patch.object(popularity, 'apply_views', side_effect=applied_but_failed):
+                buffer.flush()
+        self.assertEqual(buffer.pending, 2)
+        buffer.flush()
+        self.assertEqual(buffer.pending, 0)
+        self.assertEqual(self.views(), {self.shirt.pk: 1, self.dress.pk: 1})
+        self.assertEqual(ViewCountBatch.objects.count(), 1)
+
+    def test_flushes_when_enough_views_are_pending(self):
+        with mock.patch.object(popularity, 'VIEW_FLUSH_EVERY', 3):
+            buffer = self.buffer(self.shirt.pk, self.shirt.pk)
+            self.assertEqual(self.views(), {self.shirt.pk: 0, self.dress.pk: 0})
+            buffer.add(self.dress.pk)
+        self.assertEqual(buffer.pending, 0)
+        self.assertEqual(self.views(), {self.shirt.pk: 2, self.dress.pk: 1})
+
+
+    @mock.patch.object(popularity, 'VIEW_FLUSH_EVERY', 10000)
+    def test_concurrent_views_are_each_counted_once(self):
+        # Nothing is flushed until all the views are in, so only this thread writes
+        buffer = self.buffer()
+
+        def view(product_ids):
+            for product_id in product_ids:
+                buffer.add(product_id)
+
+        threads = [threading.Thread(target=view, args=([self.shirt.pk, self.dress.pk, self.shirt.pk] * 100,))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(buffer.flush(), 2400)
+        self.assertEqual(self.views(), {self.shirt.pk: 1600, self.dress.pk: 800})
+
+
+class ImageJobQueueTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def job(self, object_id, **fields):
+        return ImageJob.objects.create(kind=ImageJob.PRODUCT_IMAGE, object_id=object_id, **fields)
+
+    def test_enqueue_skips_objects_already_waiting(self):
+        self.assertIsNotNone(image_jobs.enqueue(ImageJob.PRODUCT_IMAGE, 1))
+        self.assertIsNone(image_jobs.enqueue(ImageJob.PRODUCT_IMAGE, 1))
+        self.assertIsNotNone(image_jobs.enqueue(ImageJob.AVATAR, 1))
+
+    def test_claims_hand_each_due_job_to_one_worker(self):
+        jobs = [self.job(i) for i in range(3)]
+        self.job(99, run_after=self.now + timedelta(minutes=5))
+
+        first = image_jobs.claim('worker-a', limit=2)
+        second = image_jobs.claim('worker-b', limit=5)
+        self.assertEqual([job.pk for job in first], [jobs[0].pk, jobs[1].pk])
+        self.assertEqual([job.pk for job in second], [jobs[2].pk])
+        self.assertEqual(image_jobs.claim('worker-c'), [])
+        self.assertEqual(len({job.locked_by for job in first}), 1)
+        self.assertTrue(first[0].locked_by.startswith('worker-a:'))
+        self.assertTrue(second[0].locked_by.startswith('worker-b:'))
+        self.assertEqual({job.attempts for job in first + second}, {1})
+
+    def test_stale_jobs_are_requeued_and_the_lost_worker_cannot_finish_them(self):
+        self.job(1)
+        lost, = image_jobs.claim('worker-a')
+        ImageJob.objects.filter(pk=lost.pk).update(locked_at=self.now - image_jobs.LOCK_TIMEOUT - timedelta(seconds=1))
+
+        taken, = image_jobs.claim('worker-b')
+        self.assertEqual(taken.pk, lost.pk)
+        self.assertEqual(taken.attempts, 2)
+        with mock.patch.object(image_jobs, 'process'):
+            image_jobs.run_job(lost)
+        job = ImageJob.objects.get(pk=lost.pk)
+        self.assertEqual((job.status, job.locked_by), ('processing', taken.locked_by))
+
+        with mock.patch.object(image_jobs, 'process'):
+            self.assertEqual(image_jobs.run_job(taken), 'done')
+        self.assertEqual(ImageJob.objects.get(pk=lost.pk).status, 'done')
+
+    @mock.patch.object(image_jobs, 'MAX_ATTEMPTS', 3)
+    @mock.patch.object(image_jobs, 'process', side_effect=OSError('disk full'))
+    def test_failed_jobs_are_retried_with_backoff(self, process):
+        job = self.job(1)
+        delays = []
+        with self.assertLogs('catalog.image_jobs', 'ERROR'):
+            for expected in ['pending', 'pending', 'failed']:
+                claimed, = image_jobs.claim('worker')
+                started = timezone.now()
+                self.assertEqual(image_jobs.run_job(claimed), expected)
+                job.refresh_from_db()
+                delays.append(round((job.run_after - started).total_seconds()))
+                # Make the retry due now
+                ImageJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(delays[:2], [image_jobs.RETRY_DELAY, 2 * image_jobs.RETRY_DELAY])
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertIn('disk full', job.last_error)
+        self.assertEqual(image_jobs.claim('worker'), [])
+
+    def test_unreadable_images_are_not_retried(self):
+        self.job(1)
+        claimed, = image_jobs.claim('worker')
+        with mock.patch.object(image_jobs, 'process', side_effect=image_jobs.UnreadableImage('not an image')):
+            self.assertEqual(image_jobs.run_job(claimed), 'failed')
+        self.assertEqual(ImageJob.objects.get(pk=claimed.pk).attempts, 1)
+
+    def test_eager_mode_runs_jobs_once_the_transaction_commits(self):
+        with mock.patch.object(image_jobs, 'EAGER', True), mock.patch.object(image_jobs, 'process') as process:
+            with self.captureOnCommitCallbacks(execute=True):
+                job = image_jobs.enqueue(ImageJob.PRODUCT_IMAGE, 1)
+                process.assert_not_called()
+        process.assert_called_once()
+        self.assertEqual(ImageJob.objects.get(pk=job.pk).status, 'done')
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shirts = Category.objects.create(name='Shirts', slug='shirts')
+        cls.dresses = Category.objects.create(name='Dresses', slug='dresses')
+        cls.acme = Brand.objects.create(name='Acme', slug='acme')
+        cls.linen_shirt = create_product('Linen Shirt', cls.shirts, cls.acme)
+        cls.oxford = create_product('Oxford', cls.shirts, cls.acme, short_description='A crisp cotton shirt')
+        cls.dress = create_product(
+            'Wrap Dress', cls.dresses, cls.acme, description='Pairs well with a denim shirt jacket.'
+        )
+
+    def search(self, query):
+        results = search.order_by_relevance(search.search_products(Product.objects.all(), query))
+        return [product.slug for product in results]
+
+    def test_ranks_name_over_short_description_over_description(self):
+        self.assertEqual(self.search('shirt'), ['linen-shirt', 'oxford', 'wrap-dress'])
+
+    def test_every_word_must_match_as_a_prefix(self):
+        self.assertEqual(self.search('cott shi'), ['oxford'])
+        self.assertEqual(self.search('linen dress'), [])
+        self.assertEqual(self.search('  '), ['linen-shirt', 'oxford', 'wrap-dress'])
+
+    def test_saved_and_deleted_products_are_indexed(self):
+        product = create_product('Denim Jacket', self.shirts, self.acme)
+        self.assertEqual(self.search('jack'), ['denim-jacket', 'wrap-dress'])
+        product.name = 'Denim Gilet'
+        product.save()
+        self.assertEqual(self.search('gilet'), ['denim-jacket'])
+        self.assertEqual(self.search('jack'), ['wrap-dress'])
+        product.delete()
+        self.assertEqual(self.search('gilet'), [])
+
+    def test_renamed_brands_and_categories_are_reindexed(self):
+        self.acme.name = 'Northwind'
+        self.acme.save()
+        self.dresses.name = 'Gowns'
+        self.dresses.save()
+        self.assertEqual(self.search('northw'), ['linen-shirt', 'oxford', 'wrap-dress'])
+        self.assertEqual(self.search('gown'), ['wrap-dress'])
+        self.assertEqual(self.search('acme'), [])
+
+    def test_rebuild_index(self):
+        Product.objects.filter(pk=self.oxford.pk).update(name='Oxford Button Down')
+        self.assertEqual(self.search('button'), [])
+        search.rebuild_index()
+        self.assertEqual(self.search('button'), ['oxford'])
+
+
+class CatalogCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shirts = Category.objects.create(name='Shirts', slug='shirts')
+        cls.acme = Brand.objects.create(name='Acme', slug='acme')
+        cls.user = User.objects.create_user('reviewer')
+
+    def assertCountersMatchRecount(self):
+        stored = counters.get_counters()
+        recounted = {}
+        for model in counters.COUNTED_MODELS:
+            recounted.update(counters.count(model))
+        self.assertEqual({name: getattr(stored, name) for name in counters.COUNTERS}, recounted)
+        return stored
+
+    def test_signals_keep_the_counters_current(self):
+        counters.reconcile()
+        hidden = Category.objects.create(name='Hidden', slug='hidden', is_active=False)
+        products = [
+            create_product(f'Shirt {i}', self.shirts, self.acme, is_featured=i % 2 == 0, is_try_on_enabled=i < 2)
+            for i in range(5)
+        ]
+        ProductImage.objects.create(product=products[0], image='products/shirt-0.jpg')
+        review = ProductReview.objects.create(
+            product=products[0], user=self.user, rating=4, title='Good', content='Fits well', is_approved=False
+        )
+        stored = self.assertCountersMatchRecount()
+        self.assertEqual(
+            (stored.products, stored.featured_products, stored.try_on_products, stored.pending_reviews),
+            (5, 3, 2, 1),
+        )
+
+        products[0].is_available = False
+        products[0].save()
+        products[1].is_active = False
+        products[1].save()
+        products[2].delete()
+        review.is_approved = True
+        review.save()
+        hidden.is_active = True
+        hidden.save()
+        stored = self.assertCountersMatchRecount()
+        self.assertEqual(
+            (stored.products, stored.active_products, stored.available_products, stored.categories),
+            (4, 3, 3, 2),
+        )
+        self.assertEqual((stored.featured_products, stored.featured_available_products), (2, 1))
+
+    def test_refresh_after_a_bulk_update(self):
+        for i in range(3):
+            create_product(f'Shirt {i}', self.shirts, self.acme)
+        counters.get_counters()
+        Product.objects.update(is_featured=True)
+        self.assertEqual(counters.get_counters().featured_products, 0)
+        counters.refresh(Product)
+        self.assertEqual(self.assertCountersMatchRecount().featured_products, 3)
+
+    def test_reconcile_fixes_drift(self):
+        create_product('Shirt', self.shirts, self.acme)
+        counters.get_counters()
+        counters.CatalogCounters.objects.update(products=42, brands=-1)
+        self.assertEqual(counters.reconcile().products, 1)
+        self.assertCountersMatchRecount()
+
+    def test_home_page_counts_the_featured_products_it_shows(self):
+        for i in range(10):
+            create_product(f'Featured {i}', self.shirts, self.acme, is_featured=True)
+        create_product('Sold Out', self.shirts, self.acme, is_featured=True, is_available=False)
+        request = RequestFactory().get('/catalog/', HTTP_ACCEPT='application/json')
+        stats = json.loads(catalog_home(request).content)['stats']
+        self.assertEqual(stats['featured_products'], 8)
+        self.assertEqual(stats['total_products'], 10)
+
+        Product.objects.filter(slug__startswith='featured-').exclude(slug='featured-0').delete()
+        stats = json.loads(catalog_home(request).content)['stats']
+        self.assertEqual(stats['featured_products'], 1)
+
+
+class ProductListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        shirts = Category.objects.create(name='Shirts', slug='shirts')
+        dresses = Category.objects.create(name='Dresses', slug='dresses')
+        acme = Brand.objects.create(name='Acme', slug='acme')
+        cls.products = []
+        for i in range(30):
+            product = create_product(f'Item {i:02}', shirts if i % 2 else dresses, acme)
+            for n in range(2):
+                ProductImage.objects.create(
+                    product=product, image=f'products/item-{i}-{n}.jpg', is_primary=n == 0, sort_order=n
+                )
+            cls.products.append(product)
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+
+    def fetch(self, params, **headers):
+        response = ProductListAPIView.as_view()(APIRequestFactory().get('/api/catalog/products/', params, **headers))
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        with response_cache.bypassed():
+            for mode in ['full', 'card']:
+                query_counts = []
+                for page_size in [5, 30]:
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.fetch({'page_size': page_size, 'view': mode})
+                    self.assertEqual(len(json.loads(response.content)['results']), page_size)
+                    query_counts.append(len(queries))
+                self.assertEqual(query_counts[0], query_counts[1], mode)
+
+    def test_repeated_requests_are_served_from_the_cache(self):
+        first = self.fetch({'page_size': 10})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.fetch({'page_size': 10})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+        with self.assertNumQueries(0):
+            not_modified = self.fetch({'page_size': 10}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_catalog_changes_invalidate_the_cache(self):
+        etag = self.fetch({'page_size': 10})['ETag']
+        product = self.products[0]
+        product.name = 'Item 00 renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        response = self.fetch({'page_size': 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['X-Cache']), (200, 'MISS'))
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Item 00 renamed', [item['name'] for item in json.loads(response.content)['results']])
@@ -6,8 +6,16 @@ This app handles product catalog and browsing functionality.
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Count
 from .models import Category, Brand, Product, ProductReview
+from .counters import get_counters
+from .facets import parse_filters, apply_filters, get_facets
+from .pagination import KEYSET_ORDERINGS, wants_cursor, keyset_page_for_request
+from .popularity import record_view
+from .search import order_by_relevance
+
+# Featured products shown on the catalog home page
+HOME_FEATURED_PRODUCTS = 8
 
 def catalog_home(request):
     """
@@ -17,7 +25,7 @@ def catalog_home(request):
     featured_products = Product.objects.filter(
         is_featured=True, 
         is_available=True
-    ).select_related('brand', 'category')[:8]
+    ).with_listing_relations()[:HOME_FEATURED_PRODUCTS]
     
     # Get active categories with product counts
     categories = Category.objects.filter(
@@ -26,12 +34,14 @@ def catalog_home(request):
         product_count=Count('products', filter=Q(products__is_available=True))
     ).order_by('sort_order', 'name')
     
-    # Get statistics for JSON response
+    # Get statistics for JSON response, from the maintained counters
+    counts = get_counters()
     stats = {
-        'total_products': Product.objects.filter(is_available=True).count(),
-        'total_categories': categories.count(),
-        'total_brands': Brand.objects.filter(is_active=True).count(),
-        'featured_products': featured_products.count(),
+        'total_products': counts.available_products,
+        'total_categories': counts.categories,
+        'total_brands': counts.brands,
+        # As many as the page shows
+        'featured_products': min(counts.featured_available_products, HOME_FEATURED_PRODUCTS),
     }
     
     # If this is an API request, return JSON
@@ -55,81 +65,66 @@ def product_list(request):
     """
     Product listing page with filtering and pagination.
     """
-    # Get base queryset
-    products = Product.objects.filter(is_available=True).select_related('brand', 'category')
-    
-    # Apply filters
-    category_slug = request.GET.get('category')
-    brand_slug = request.GET.get('brand')
+    # Get base queryset and apply filters
+    base = Product.objects.filter(is_available=True)
+    filters = parse_filters(request.GET)
+    products = apply_filters(base.with_listing_relations(), filters)
     search_query = request.GET.get('search')
-    gender = request.GET.get('gender')
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    
-    if category_slug:
-        products = products.filter(category__slug=category_slug)
-    
-    if brand_slug:
-        products = products.filter(brand__slug=brand_slug)
-    
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(short_description__icontains=search_query)
-        )
-    
-    if gender:
-        products = products.filter(gender=gender)
-    
-    if min_price:
-        try:
-            min_price = float(min_price)
-            products = products.filter(price__gte=min_price)
-        except ValueError:
-            pass
-    
-    if max_price:
-        try:
-            max_price = float(max_price)
-            products = products.filter(price__lte=max_price)
-        except ValueError:
-            pass
     
     # Sorting
-    sort_by = request.GET.get('sort', 'name')
-    if sort_by == 'price_low':
+    sort_by = request.GET.get('sort', 'relevance' if search_query else 'name')
+    if sort_by == 'relevance':
+        products = order_by_relevance(products)
+    elif sort_by == 'price_low':
         products = products.order_by('price')
     elif sort_by == 'price_high':
         products = products.order_by('-price')
     elif sort_by == 'newest':
         products = products.order_by('-created_at')
     elif sort_by == 'popular':
-        products = products.annotate(review_count=Count('reviews')).order_by('-review_count')
+        products = products.order_by('-popularity_score', '-id')
     else:  # default to name
         products = products.order_by('name')
     
-    # Pagination
-    paginator = Paginator(products, 12)  # 12 products per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination (keyset with ?pagination=cursor, when the sort has a composite key)
+    ordering = KEYSET_ORDERINGS.get(sort_by)
+    if ordering and wants_cursor(request.GET):
+        page_obj = keyset_page_for_request(request, products, ordering, 12)
+    else:
+        paginator = Paginator(products, 12)  # 12 products per page
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
     
-    # Get filter options for sidebar
-    categories = Category.objects.filter(is_active=True).order_by('name')
-    brands = Brand.objects.filter(is_active=True).order_by('name')
+    # Get filter options for sidebar, with product counts for the current filters
+    facets = get_facets('html', base, filters)
+    category_counts = {entry['slug']: entry['count'] for entry in facets['categories']}
+    brand_counts = {entry['slug']: entry['count'] for entry in facets['brands']}
+    gender_counts = {entry['value']: entry['count'] for entry in facets['genders']}
+    categories = list(Category.objects.filter(is_active=True).order_by('name'))
+    for category in categories:
+        category.facet_count = category_counts.get(category.slug, 0)
+    brands = list(Brand.objects.filter(is_active=True).order_by('name'))
+    for brand in brands:
+        brand.facet_count = brand_counts.get(brand.slug, 0)
+    genders = [
+        {'value': value, 'label': label, 'count': gender_counts.get(value, 0)}
+        for value, label in Product.GENDER_CHOICES
+    ]
     
     context = {
         'page_obj': page_obj,
         'products': page_obj.object_list,
         'categories': categories,
         'brands': brands,
+        'genders': genders,
+        'facets': facets,
         'current_filters': {
-            'category': category_slug,
-            'brand': brand_slug,
+            'category': filters.category,
+            'brand': filters.brand,
             'search': search_query,
-            'gender': gender,
-            'min_price': min_price,
-            'max_price': max_price,
+            'gender': filters.gender,
+            'min_price': filters.min_price,
+            'max_price': filters.max_price,
             'sort': sort_by,
         }
     }
@@ -147,23 +142,26 @@ def product_detail(request, slug):
         is_available=True
     )
     
+    record_view(product.pk)
+    
     # Get product reviews
     reviews = ProductReview.objects.filter(
         product=product,
         is_approved=True
     ).select_related('user').order_by('-created_at')
     
-    # Calculate review statistics
-    review_stats = reviews.aggregate(
-        average_rating=Avg('rating'),
-        total_reviews=Count('id')
-    )
+    # Review statistics come from the counters maintained on the product
+    review_stats = {
+        'average_rating': product.average_rating,
+        'total_reviews': product.rating_count,
+        'histogram': product.rating_histogram,
+    }
     
     # Get related products (same category, different product)
     related_products = Product.objects.filter(
         category=product.category,
         is_available=True
-    ).exclude(id=product.id).select_related('brand')[:4]
+    ).exclude(id=product.id).with_listing_relations()[:4]
     
     context = {
         'product': product,
@@ -212,12 +210,15 @@ def brand_detail(request, slug):
     products = Product.objects.filter(
         brand=brand,
         is_available=True
-    ).select_related('category').order_by('name')
+    ).with_listing_relations().order_by('name')
     
     # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if wants_cursor(request.GET):
+        page_obj = keyset_page_for_request(request, products, KEYSET_ORDERINGS['name'], 12)
+    else:
+        paginator = Paginator(products, 12)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
     
     context = {
         'brand': brand,
@@ -237,12 +238,15 @@ def category_detail(request, slug):
     products = Product.objects.filter(
         category=category,
         is_available=True
-    ).select_related('brand').order_by('name')
+    ).with_listing_relations().order_by('name')
     
     # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if wants_cursor(request.GET):
+        page_obj = keyset_page_for_request(request, products, KEYSET_ORDERINGS['name'], 12)
+    else:
+        paginator = Paginator(products, 12)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
     
     context = {
         'category': category,
@@ -0,0 +1,93 @@
+"""
+Django management command to benchmark the dashboard overview.
+It compares the metric queries the overview used to run, one COUNT(*) per
+figure, with the two aggregate queries of dashboard.metrics, and shows the
+query count and latency of the whole page with the metrics computed and cached.
+"""
+
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Avg
+from django.test import RequestFactory
+
+from catalog.benchmarking import rolled_back, build_catalog_fixture, count_queries, time_calls, percentile
+from catalog.models import Product, ProductReview
+from dashboard import metrics
+from dashboard.views import dashboard_overview
+from users.models import User
+
+
+def separate_counts():
+    """The overview and analytics metrics as they were computed before, for comparison"""
+    return {
+        'total_products': Product.objects.count(),
+        'active_products': Product.objects.filter(is_available=True).count(),
+        'products_with_images': Product.objects.filter(images__isnull=False).distinct().count(),
+        'products_with_tryon': Product.objects.filter(is_try_on_enabled=True).count(),
+        'in_stock': Product.objects.filter(stock_quantity__gt=10).count(),
+        'low_stock': Product.objects.filter(stock_quantity__lte=10, stock_quantity__gt=0).count(),
+        'out_of_stock': Product.objects.filter(stock_quantity=0).count(),
+        'total_reviews': ProductReview.objects.count(),
+        'pending_reviews': ProductReview.objects.filter(is_approved=False).count(),
+        'avg_rating': round(ProductReview.objects.filter(is_approved=True).aggregate(
+            avg_rating=Avg('rating')
+        )['avg_rating'] or 0, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the dashboard metric queries and overview page on a large catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=100000,
+            help='Number of products in the throwaway fixture (default: 100000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=10,
+            help='Timed runs per configuration (default: 10)',
+        )
+
+    def report(self, label, func, repeat):
+        with count_queries() as queries:
+            func()
+        timings = time_calls(func, repeat)
+        self.stdout.write(
+            f'  {label:<22} queries={len(queries):<3} '
+            f'p50={percentile(timings, 50):.1f}ms p95={percentile(timings, 95):.1f}ms'
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        factory = RequestFactory()
+
+        def overview(refresh=False):
+            request = factory.get('/dashboard/', {'refresh': '1'} if refresh else {})
+            request.user = staff
+            request.session = {}
+            request._messages = FallbackStorage(request)
+            response = dashboard_overview(request)
+            if response.status_code != 200:
+                raise CommandError(f'Dashboard overview returned {response.status_code}')
+            return response
+
+        with rolled_back():
+            self.stdout.write(f'Building fixture with {options["products"]} products...')
+            build_catalog_fixture(options['products'], images_per_product=1)
+            # The fixture enables try-on everywhere; turn it off for some
+            Product.objects.filter(stock_quantity__lt=20).update(is_try_on_enabled=False)
+            staff = User.objects.create(
+                username='bench-dashboard-staff', email='bench-dashboard-staff@example.com',
+                is_staff=True, is_superuser=True,
+            )
+
+            self.report('separate counts', separate_counts, repeat)
+            self.report('aggregate metrics', metrics.compute_metrics, repeat)
+            metrics.get_metrics(refresh=True)
+            self.report('cached metrics', metrics.get_metrics, repeat)
+            self.report('overview (recompute)', lambda: overview(refresh=True), repeat)
+            self.report('overview (cached)', overview, repeat)
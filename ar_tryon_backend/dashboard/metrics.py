@@ -0,0 +1,70 @@
+"""
+Dashboard metrics.
+The product-side counts are computed with one aggregate() over products using
+conditional Count(filter=...), and the review-side figures with one over
+reviews, instead of a COUNT(*) query per figure. The result is cached for a
+short time, so reloading the dashboard costs no metric queries at all; the
+Refresh button on the overview recomputes it.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from catalog.models import Product, ProductImage, ProductReview
+
+CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_METRICS_CACHE_TIMEOUT', 60)
+CACHE_KEY = 'dashboard:metrics'
+
+# Stock at or below this (and above zero) counts as low
+LOW_STOCK_LEVEL = 10
+
+
+def product_metrics():
+    """Every product count on the dashboard, in one aggregate query"""
+    return Product.objects.annotate(
+        has_images=Exists(ProductImage.objects.filter(product=OuterRef('pk')))
+    ).aggregate(
+        total_products=Count('pk'),
+        active_products=Count('pk', filter=Q(is_available=True)),
+        products_with_images=Count('pk', filter=Q(has_images=True)),
+        products_with_tryon=Count('pk', filter=Q(is_try_on_enabled=True)),
+        in_stock=Count('pk', filter=Q(stock_quantity__gt=LOW_STOCK_LEVEL)),
+        low_stock=Count('pk', filter=Q(stock_quantity__gt=0, stock_quantity__lte=LOW_STOCK_LEVEL)),
+        out_of_stock=Count('pk', filter=Q(stock_quantity=0)),
+    )
+
+
+def review_metrics():
+    """Review counts and the average approved rating, in one aggregate query"""
+    metrics = ProductReview.objects.aggregate(
+        total_reviews=Count('pk'),
+        pending_reviews=Count('pk', filter=Q(is_approved=False)),
+        avg_rating=Avg('rating', filter=Q(is_approved=True)),
+    )
+    metrics['avg_rating'] = round(metrics['avg_rating'] or 0, 1)
+    return metrics
+
+
+def compute_metrics():
+    metrics = {**product_metrics(), **review_metrics()}
+    metrics['computed_at'] = timezone.now()
+    return metrics
+
+
+def get_metrics(refresh=False):
+    """
+    The dashboard metrics, from the cache unless they have expired or
+    `refresh` is set.
+    """
+    metrics = None if refresh else cache.get(CACHE_KEY)
+    if metrics is None:
+        metrics = compute_metrics()
+        cache.set(CACHE_KEY, metrics, CACHE_TIMEOUT)
+    return metrics
+
+
+def invalidate():
+    """Drop the cached metrics so the next dashboard load recomputes them"""
+    cache.delete(CACHE_KEY)
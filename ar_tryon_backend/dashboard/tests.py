@@ -1,3 +1,69 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Avg
 from django.test import TestCase
 
-# Create your tests here.
+from catalog.models import Brand, Category, Product, ProductImage, ProductReview
+from . import metrics
+
+
+def separate_counts():
+    """The metrics the way the overview used to compute them, one COUNT(*) per figure"""
+    return {
+        'total_products': Product.objects.count(),
+        'active_products': Product.objects.filter(is_available=True).count(),
+        'products_with_images': Product.objects.filter(images__isnull=False).distinct().count(),
+        'products_with_tryon': Product.objects.filter(is_try_on_enabled=True).count(),
+        'in_stock': Product.objects.filter(stock_quantity__gt=10).count(),
+        'low_stock': Product.objects.filter(stock_quantity__lte=10, stock_quantity__gt=0).count(),
+        'out_of_stock': Product.objects.filter(stock_quantity=0).count(),
+        'total_reviews': ProductReview.objects.count(),
+        'pending_reviews': ProductReview.objects.filter(is_approved=False).count(),
+        'avg_rating': round(ProductReview.objects.filter(is_approved=True).aggregate(
+            avg_rating=Avg('rating')
+        )['avg_rating'] or 0, 1),
+    }
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        brand = Brand.objects.create(name='Acme', slug='acme')
+        users = [User.objects.create_user(f'reviewer-{i}') for i in range(3)]
+        for i, stock in enumerate([0, 0, 4, 10, 11, 50, 200]):
+            product = Product.objects.create(
+                name=f'Shirt {i}', slug=f'shirt-{i}', description='A shirt', price=Decimal('499.00'),
+                category=category, brand=brand, stock_quantity=stock,
+                is_available=i != 3, is_try_on_enabled=i % 2 == 0,
+            )
+            # Several images per product must still count the product once
+            for n in range(i % 3):
+                ProductImage.objects.create(product=product, image=f'products/shirt-{i}-{n}.jpg')
+            for user, rating in zip(users[:i % 4], [5, 4, 2]):
+                ProductReview.objects.create(
+                    product=product, user=user, rating=rating, title='Review', content='Review',
+                    is_approved=(i + rating) % 3 != 0,
+                )
+
+    def setUp(self):
+        cache.delete(metrics.CACHE_KEY)
+
+    def test_metrics_equal_the_separate_counts(self):
+        with self.assertNumQueries(2):
+            computed = metrics.compute_metrics()
+        computed.pop('computed_at')
+        self.assertEqual(computed, separate_counts())
+
+    def test_metrics_are_cached_until_refreshed(self):
+        metrics.get_metrics()
+        Product.objects.filter(stock_quantity=0).update(stock_quantity=5)
+        with self.assertNumQueries(0):
+            self.assertEqual(metrics.get_metrics()['out_of_stock'], 2)
+        self.assertEqual(metrics.get_metrics(refresh=True)['out_of_stock'], 0)
+        metrics.invalidate()
+        with self.assertNumQueries(2):
+            metrics.get_metrics()
@@ -6,13 +6,17 @@ Provides additional functionality beyond Django's default admin.
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.db.models import Count, Avg, Sum, Q
+from django.db.models import Count, Sum, Q, Exists, OuterRef
 from django.http import JsonResponse
 from django.utils import timezone
 from datetime import timedelta
 import json
 
-from catalog.models import Product, Category, Brand, ProductImage, ProductReview
+from catalog.models import Product, Category, Brand, ProductImage
+from catalog import counters, facets, response_cache
+from . import metrics as dashboard_metrics
+from catalog.pagination import KEYSET_ORDERINGS, wants_cursor, keyset_page_for_request
+from catalog.search import search_products, order_by_relevance
 from users.models import User
 
 
@@ -20,12 +24,10 @@ from users.models import User
 def dashboard_overview(request):
     """
     Main dashboard overview page with statistics and charts.
+    The statistics come from dashboard.metrics (two aggregate queries, cached
+    briefly); ?refresh=1 recomputes them.
     """
-    # Calculate key statistics
-    total_products = Product.objects.count()
-    active_products = Product.objects.filter(is_available=True).count()
-    products_with_images = Product.objects.filter(images__isnull=False).distinct().count()
-    products_with_tryon = Product.objects.filter(is_try_on_enabled=True).count()
+    metrics = dashboard_metrics.get_metrics(refresh=bool(request.GET.get('refresh')))
     
     # Category statistics
     categories = Category.objects.annotate(
@@ -44,27 +46,14 @@ def dashboard_overview(request):
     recent_products = Product.objects.filter(created_at__gte=week_ago).order_by('-created_at')
     
     # Products needing attention
-    products_without_images = Product.objects.filter(images__isnull=True)
+    products_without_images = Product.objects.filter(
+        ~Exists(ProductImage.objects.filter(product=OuterRef('pk')))
+    )
     low_stock_products = Product.objects.filter(stock_quantity__lt=10, stock_quantity__gt=0)
     out_of_stock_products = Product.objects.filter(stock_quantity=0)
     
-    # Review statistics
-    total_reviews = ProductReview.objects.count()
-    pending_reviews = ProductReview.objects.filter(is_approved=False).count()
-    avg_rating = ProductReview.objects.filter(is_approved=True).aggregate(
-        avg_rating=Avg('rating')
-    )['avg_rating'] or 0
-    
     context = {
-        'stats': {
-            'total_products': total_products,
-            'active_products': active_products,
-            'products_with_images': products_with_images,
-            'products_with_tryon': products_with_tryon,
-            'total_reviews': total_reviews,
-            'pending_reviews': pending_reviews,
-            'avg_rating': round(avg_rating, 1),
-        },
+        'stats': metrics,
         'categories': categories[:10],  # Top 10 categories
         'brands': brands[:10],  # Top 10 brands
         'recent_products': recent_products[:5],
@@ -102,17 +91,16 @@ def product_management(request):
     elif status_filter == 'low_stock':
         products = products.filter(stock_quantity__lt=10, stock_quantity__gt=0)
     if search:
-        products = products.filter(
-            Q(name__icontains=search) | 
-            Q(description__icontains=search) |
-            Q(brand__name__icontains=search)
-        )
+        products = order_by_relevance(search_products(products, search))
     
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(products, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination (keyset with ?pagination=cursor, unless ranked by search relevance)
+    if not search and wants_cursor(request.GET):
+        page_obj = keyset_page_for_request(request, products, KEYSET_ORDERINGS['newest'], 20)
+    else:
+        from django.core.paginator import Paginator
+        paginator = Paginator(products, 20)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
     
     context = {
         'page_obj': page_obj,
@@ -165,6 +153,11 @@ def bulk_product_actions(request):
             messages.success(request, f'{count} products unmarked as featured.')
         else:
             messages.error(request, 'Invalid action.')
+        # update() bypasses the signals that keep cached catalog data current
+        counters.refresh(Product)
+        facets.invalidate()
+        response_cache.invalidate()
+        dashboard_metrics.invalidate()
     
     return redirect('dashboard:product_management')
 
@@ -208,10 +201,11 @@ def analytics_api(request):
     ).order_by('month')
     
     # Stock status distribution
+    metrics = dashboard_metrics.get_metrics()
     stock_data = [
-        {'status': 'In Stock', 'count': Product.objects.filter(stock_quantity__gt=10).count()},
-        {'status': 'Low Stock', 'count': Product.objects.filter(stock_quantity__lte=10, stock_quantity__gt=0).count()},
-        {'status': 'Out of Stock', 'count': Product.objects.filter(stock_quantity=0).count()},
+        {'status': 'In Stock', 'count': metrics['in_stock']},
+        {'status': 'Low Stock', 'count': metrics['low_stock']},
+        {'status': 'Out of Stock', 'count': metrics['out_of_stock']},
     ]
     
     return JsonResponse({
@@ -10,6 +10,7 @@ app_name = 'orders'
 urlpatterns = [
     # Cart endpoints
     path('cart/', api_views.get_cart, name='get_cart'),
+    path('cart/summary/', api_views.cart_summary, name='cart_summary'),
     path('cart/add/', api_views.add_to_cart, name='add_to_cart'),
     path('cart/item/<int:item_id>/update/', api_views.update_cart_item, name='update_cart_item'),
     path('cart/item/<int:item_id>/remove/', api_views.remove_from_cart, name='remove_from_cart'),
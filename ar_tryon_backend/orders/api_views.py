@@ -6,82 +6,100 @@ from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
-from django.db import transaction
-from decimal import Decimal
+from django.utils.cache import get_conditional_response, patch_cache_control
 
-from .models import Cart, CartItem, Order, OrderItem, ShippingAddress
+from .cart import add_item, clear_items, get_user_cart_summary
+from .checkout import CartChanged, cancel_and_restock, place_order
+from .idempotency import idempotent
+from .models import Cart, CartItem, Order, OrderItem, ShippingAddress, cart_etag
 from .serializers import (
     CartSerializer, CartItemSerializer, AddToCartSerializer,
     UpdateCartItemSerializer, ShippingAddressSerializer,
-    OrderSerializer, CreateOrderSerializer
+    OrderSerializer, OrderSummarySerializer, CreateOrderSerializer
 )
-from catalog.models import Product
+from .stock import OutOfStock
+from catalog.pagination import KeysetPageNumberPagination
 
 
 # ============ CART VIEWS ============
 
+def serialized_cart(cart_id):
+    """
+    The full cart representation, loaded with its items, products and images
+    in a fixed number of queries and with totals taken from those items.
+    """
+    return CartSerializer(Cart.objects.with_items().get(pk=cart_id)).data
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_cart(request):
     """
     Get or create user's shopping cart.
+    The response carries an ETag from the cart version; a request whose
+    If-None-Match still matches gets a 304 without the cart being loaded.
+    """
+    cart, created = Cart.objects.only('id', 'version').get_or_create(user=request.user)
+    etag = cart_etag(cart.pk, cart.version)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        patch_cache_control(not_modified, private=True, no_cache=True)
+        return not_modified
+    
+    cart = Cart.objects.with_items().get(pk=cart.pk)
+    response = Response(CartSerializer(cart).data)
+    response['ETag'] = cart.etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cart_summary(request):
+    """
+    Item count, total and version of the user's cart, for the cart badge.
+    Costs one lookup of the cart row when the summary is cached; clients
+    refetch the full cart only when the version has changed.
     """
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    serializer = CartSerializer(cart)
-    return Response(serializer.data)
+    cart, summary = get_user_cart_summary(request.user)
+    return Response({
+        'total_items': summary['total_items'],
+        'total_price': summary['total_price'],
+        'version': cart['version'] if cart else 0,
+    })
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def add_to_cart(request):
     """
     Add item to shopping cart or update quantity if already exists.
+    The line is written with one upsert (see orders.cart.add_item) and the
+    response only describes the changed line and the new cart version.
     """
     serializer = AddToCartSerializer(data=request.data)
     if serializer.is_valid():
-        product_id = serializer.validated_data['product_id']
-        quantity = serializer.validated_data['quantity']
-        selected_size = serializer.validated_data.get('selected_size', '')
-        selected_color = serializer.validated_data.get('selected_color', '')
-        
-        # Get or create cart
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        
-        # Get product
-        product = get_object_or_404(Product, id=product_id)
-        
-        # Check if item already exists with same options
-        try:
-            cart_item = CartItem.objects.get(
-                cart=cart,
-                product=product,
-                selected_size=selected_size,
-                selected_color=selected_color
-            )
-            # Update quantity
-            cart_item.quantity += quantity
-            if cart_item.quantity > 99:
-                cart_item.quantity = 99
-            cart_item.save()
-            message = "Cart item quantity updated"
-        except CartItem.DoesNotExist:
-            # Create new cart item
-            cart_item = CartItem.objects.create(
-                cart=cart,
-                product=product,
-                quantity=quantity,
-                selected_size=selected_size,
-                selected_color=selected_color,
-                unit_price=product.sale_price or product.price
-            )
-            message = "Item added to cart"
+        cart, created = Cart.objects.only('id').get_or_create(user=request.user)
+        item, version = add_item(
+            cart.pk,
+            serializer.product,
+            serializer.validated_data['quantity'],
+            serializer.validated_data.get('selected_size', ''),
+            serializer.validated_data.get('selected_color', ''),
+        )
+        message = "Item added to cart" if item.pop('created') else "Cart item quantity updated"
+        # Prices as strings, like CartItemSerializer
+        item['unit_price'] = str(item['unit_price'])
+        item['total_price'] = str(item['total_price'])
         
-        # Return updated cart
-        cart_serializer = CartSerializer(cart)
         return Response({
             'message': message,
-            'cart': cart_serializer.data
+            'item': item,
+            'version': version
         }, status=status.HTTP_200_OK)
     
     # 🔍 DEBUG: Print serializer errors
@@ -109,10 +127,9 @@ def update_cart_item(request, item_id):
         cart_item.save()
         
         # Return updated cart
-        cart_serializer = CartSerializer(cart_item.cart)
         return Response({
             'message': 'Cart item updated',
-            'cart': cart_serializer.data
+            'cart': serialized_cart(cart_item.cart_id)
         })
     
     # 🔍 DEBUG: Print serializer errors
@@ -134,14 +151,13 @@ def remove_from_cart(request, item_id):
         cart__user=request.user
     )
     
-    cart = cart_item.cart
+    cart_id = cart_item.cart_id
     cart_item.delete()
     
     # Return updated cart
-    cart_serializer = CartSerializer(cart)
     return Response({
         'message': 'Item removed from cart',
-        'cart': cart_serializer.data
+        'cart': serialized_cart(cart_id)
     })
 
 
@@ -152,13 +168,12 @@ def clear_cart(request):
     Clear all items from cart.
     """
     try:
-        cart = Cart.objects.get(user=request.user)
-        cart.items.all().delete()
+        cart = Cart.objects.only('id').get(user=request.user)
+        clear_items(cart.pk)
         
-        cart_serializer = CartSerializer(cart)
         return Response({
             'message': 'Cart cleared',
-            'cart': cart_serializer.data
+            'cart': serialized_cart(cart.pk)
         })
     except Cart.DoesNotExist:
         return Response({
@@ -224,6 +239,7 @@ def set_default_address(request, address_id):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_order(request):
     """
     Create order from cart items.
@@ -232,7 +248,7 @@ def create_order(request):
     if serializer.is_valid():
         # Get user's cart
         try:
-            cart = Cart.objects.get(user=request.user)
+            cart = Cart.objects.with_items().get(user=request.user)
             if cart.is_empty:
                 return Response({
                     'error': 'Cart is empty'
@@ -258,57 +274,26 @@ def create_order(request):
                 user=request.user
             )
         
-        # Create order in transaction
-        with transaction.atomic():
-            # Calculate totals
-            subtotal = cart.total_price
-            tax_amount = subtotal * Decimal('0.18')  # 18% GST
-            shipping_amount = Decimal('50.00') if subtotal < Decimal('500.00') else Decimal('0.00')  # Free shipping above ₹500
-            total_amount = subtotal + tax_amount + shipping_amount
-            
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                subtotal=subtotal,
-                tax_amount=tax_amount,
-                shipping_amount=shipping_amount,
-                total_amount=total_amount,
-                
-                # Shipping info
-                shipping_address=shipping_address.address_line_1,
-                shipping_city=shipping_address.city,
-                shipping_state=shipping_address.state,
-                shipping_postal_code=shipping_address.postal_code,
-                shipping_country=shipping_address.country,
-                
-                # Billing info
-                billing_address=billing_address.address_line_1,
-                billing_city=billing_address.city,
-                billing_state=billing_address.state,
-                billing_postal_code=billing_address.postal_code,
-                billing_country=billing_address.country,
-                
-                # Contact info
+        try:
+            order = place_order(
+                request.user, cart, shipping_address, billing_address,
                 phone_number=serializer.validated_data['phone_number'],
                 email=serializer.validated_data['email'],
-                notes=serializer.validated_data.get('notes', '')
+                notes=serializer.validated_data.get('notes', ''),
             )
-            
-            # Create order items from cart items
-            for cart_item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    product_name=cart_item.product.name,
-                    quantity=cart_item.quantity,
-                    selected_size=cart_item.selected_size,
-                    selected_color=cart_item.selected_color,
-                    unit_price=cart_item.unit_price,
-                    total_price=cart_item.get_total_price()
-                )
-            
-            # Clear cart
-            cart.items.all().delete()
+        except OutOfStock as exc:
+            names = {item.product_id: item.product.name for item in cart.items.all()}
+            return Response({
+                'error': 'Some items are out of stock',
+                'out_of_stock': [
+                    {'product_id': product_id, 'product_name': names[product_id], 'requested': units}
+                    for product_id, units in sorted(exc.shortages.items())
+                ]
+            }, status=status.HTTP_409_CONFLICT)
+        except CartChanged:
+            return Response({
+                'error': 'Your cart changed during checkout, please review it and try again'
+            }, status=status.HTTP_409_CONFLICT)
         
         # Return created order
         order_serializer = OrderSerializer(order)
@@ -326,13 +311,19 @@ def create_order(request):
 
 class OrderListView(generics.ListAPIView):
     """
-    List user's orders.
+    List user's orders, newest first, in the compact summary form; the
+    lines are in the order detail.
+    Pass `pagination=cursor` for keyset pagination.
     """
-    serializer_class = OrderSerializer
+    serializer_class = OrderSummarySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPageNumberPagination
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).with_summary()
+    
+    def get_keyset_ordering(self):
+        return ('-created_at', '-id')
 
 
 class OrderDetailView(generics.RetrieveAPIView):
@@ -343,13 +334,19 @@ class OrderDetailView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        items = OrderItem.objects.select_related(
+            'product__category', 'product__brand'
+        ).prefetch_related('product__images')
+        return Order.objects.filter(user=self.request.user).select_related('user').prefetch_related(
+            Prefetch('items', queryset=items)
+        )
     
     lookup_field = 'order_number'
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def cancel_order(request, order_number):
     """
     Cancel an order (only if pending or confirmed).
@@ -360,10 +357,7 @@ def cancel_order(request, order_number):
         user=request.user
     )
     
-    if order.status in ['pending', 'confirmed']:
-        order.status = 'cancelled'
-        order.save()
-        
+    if cancel_and_restock(order):
         return Response({
             'message': 'Order cancelled successfully'
         })
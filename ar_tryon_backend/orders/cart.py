@@ -0,0 +1,189 @@
+"""
+Cart writes and the cached cart summary.
+add_item() adds to a cart line with a single upsert. The summary (item count
+and total, for the header cart badge) is cached under the cart's version,
+which every cart item change bumps (see orders.signals), so entries never
+need to be invalidated and a cached summary costs one indexed lookup of the
+cart row.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+CACHE_TIMEOUT = getattr(settings, 'ORDERS_CART_SUMMARY_CACHE_TIMEOUT', 3600)
+CACHE_PREFIX = 'orders:cart:summary'
+
+# Most of one product variant a cart line can hold
+MAX_QUANTITY = 99
+# Backends with INSERT ... ON CONFLICT and UPDATE ... RETURNING
+UPSERT_VENDORS = ('sqlite', 'postgresql')
+
+
+def get_cart_summary(cart_id, version):
+    """{'total_items', 'total_price', 'line_count', 'is_empty'} for a cart at `version`"""
+    key = f'{CACHE_PREFIX}:{cart_id}:{version}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = CartItem.objects.filter(cart_id=cart_id).totals()
+        summary['is_empty'] = summary['line_count'] == 0
+        cache.set(key, summary, CACHE_TIMEOUT)
+    return summary
+
+
+def get_user_cart_summary(user):
+    """Summary and version of a user's cart; an empty summary if they have none"""
+    cart = Cart.objects.filter(user=user).values('id', 'version').first()
+    if cart is None:
+        return None, {'total_items': 0, 'total_price': Decimal('0.00'), 'line_count': 0, 'is_empty': True}
+    return cart, get_cart_summary(cart['id'], cart['version'])
+
+
+def bump_version(cart_id):
+    """Mark a cart as changed and return its new version"""
+    if connection.vendor in UPSERT_VENDORS:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {connection.ops.quote_name(Cart._meta.db_table)} '
+                'SET version = version + 1 WHERE id = %s RETURNING version',
+                [cart_id],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+    Cart.objects.filter(pk=cart_id).update(version=F('version') + 1)
+    return Cart.objects.filter(pk=cart_id).values_list('version', flat=True).first()
+
+
+def claim(cart_id, version):
+    """
+    Bump a cart's version only if it is still `version`, the version its
+    lines were read at. Returns False if the cart changed since, or another
+    checkout claimed it first.
+    """
+    return bool(Cart.objects.filter(pk=cart_id, version=version).update(version=F('version') + 1))
+
+
+def _column(name):
+    return connection.ops.quote_name(CartItem._meta.get_field(name).column)
+
+
+def _prep(name, value):
+    return CartItem._meta.get_field(name).get_db_prep_save(value, connection)
+
+
+def _upsert_item(cart_id, product, quantity, selected_size, selected_color):
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    columns = ['cart', 'product', 'quantity', 'selected_size', 'selected_color', 'unit_price', 'created_at', 'updated_at']
+    key = ', '.join(_column(name) for name in ['cart', 'product', 'selected_size', 'selected_color'])
+    topped_up = f'{table}.{_column("quantity")} + excluded.{_column("quantity")}'
+    # Whether the line was inserted rather than topped up. On PostgreSQL a row
+    # version written by an INSERT has no xmax. SQLite has no such column, so
+    # the stored quantity is compared with the one added: a topped-up line
+    # holds more, as it had at least one unit, unless it was already capped
+    # and MAX_QUANTITY was added, when "new" only changes the message.
+    if connection.vendor == 'postgresql':
+        inserted, params = '(xmax = 0)', []
+    else:
+        inserted, params = f'{_column("quantity")} = %s', [quantity]
+    now = timezone.now()
+    values = [
+        cart_id, product.pk, quantity, selected_size, selected_color,
+        _prep('unit_price', product.sale_price or product.price),
+        _prep('created_at', now), _prep('updated_at', now),
+    ]
+    sql = (
+        f'INSERT INTO {table} ({", ".join(_column(name) for name in columns)}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))}) '
+        f'ON CONFLICT ({key}) DO UPDATE SET '
+        f'{_column("quantity")} = CASE WHEN {topped_up} > {MAX_QUANTITY} THEN {MAX_QUANTITY} ELSE {topped_up} END, '
+        f'{_column("updated_at")} = excluded.{_column("updated_at")} '
+        f'RETURNING id, {_column("quantity")}, {_column("unit_price")}, {inserted}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, values + params)
+        item_id, quantity, unit_price, created = cursor.fetchone()
+    return item_id, quantity, Decimal(str(unit_price)).quantize(Decimal('0.01')), bool(created)
+
+
+def _get_or_create_item(cart_id, product, quantity, selected_size, selected_color):
+    item, created = CartItem.objects.get_or_create(
+        cart_id=cart_id, product=product, selected_size=selected_size, selected_color=selected_color,
+        defaults={'quantity': quantity, 'unit_price': product.sale_price or product.price},
+    )
+    if not created:
+        CartItem.objects.filter(pk=item.pk).update(
+            quantity=Least(F('quantity') + quantity, Value(MAX_QUANTITY)), updated_at=timezone.now()
+        )
+        item.refresh_from_db(fields=['quantity'])
+    return item.pk, item.quantity, item.unit_price, created
+
+
+def add_item(cart_id, product, quantity, selected_size='', selected_color=''):
+    """
+    Add `quantity` of a product variant to a cart, or top up its existing
+    line (capped at MAX_QUANTITY), and bump the cart version.
+    On SQLite and PostgreSQL this is one INSERT ... ON CONFLICT DO UPDATE
+    plus the version UPDATE, so concurrent adds of the same variant neither
+    collide on the unique key nor lose quantity. A new line takes the
+    product's current price; an existing one keeps its price.
+    Returns the line as a dict, with `created` telling whether it is new,
+    and the new cart version.
+    """
+    upsert = _upsert_item if connection.vendor in UPSERT_VENDORS else _get_or_create_item
+    with transaction.atomic():
+        item_id, quantity, unit_price, created = upsert(
+            cart_id, product, quantity, selected_size, selected_color
+        )
+        version = bump_version(cart_id)
+    line = {
+        'id': item_id,
+        'product_id': product.pk,
+        'quantity': quantity,
+        'selected_size': selected_size,
+        'selected_color': selected_color,
+        'unit_price': unit_price,
+        'total_price': unit_price * quantity,
+        'created': created,
+    }
+    return line, version
+
+
+def clear_items(cart_id):
+    """
+    Delete every line of a cart with one DELETE and bump the version once.
+    (Deleting through the ORM would load the lines and bump the version per
+    line from the post_delete handler.) Returns the number of lines deleted.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(CartItem._meta.db_table)} WHERE {_column("cart")} = %s',
+                [cart_id],
+            )
+            deleted = cursor.rowcount
+        if deleted:
+            bump_version(cart_id)
+    return deleted
+
+
+def delete_lines(cart_id, item_ids):
+    """
+    Delete the given lines of a cart with one DELETE, leaving any line added
+    since they were read. The version is not bumped; callers claim() the cart.
+    """
+    if not item_ids:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(CartItem._meta.db_table)} '
+            f'WHERE {_column("cart")} = %s AND id IN ({", ".join(["%s"] * len(item_ids))})',
+            [cart_id, *item_ids],
+        )
+        return cursor.rowcount
@@ -0,0 +1,134 @@
+"""
+Checkout: turning a cart into an order.
+The cart is read once, with its lines, products, categories, brands and
+images (Cart.objects.with_items()). The checkout then claims the cart with a
+conditional UPDATE of its version: if a line changed since it was read, or
+another checkout of the same cart got there first, nothing is ordered and
+CartChanged is raised. The totals are computed from the lines in one pass,
+the order lines are written with a single bulk_create and the ordered lines
+are deleted with a single DELETE, so apart from the stock reservation (one
+conditional UPDATE per product, see orders.stock) the number of queries
+does not grow with the number of lines. The order is returned with its lines
+attached, ready to serialize without further queries.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cart import claim, delete_lines
+from .models import Order, OrderItem
+from .stock import line_quantities, release, reserve
+
+TAX_RATE = Decimal(str(getattr(settings, 'ORDERS_TAX_RATE', '0.18')))  # 18% GST
+SHIPPING_FEE = Decimal(str(getattr(settings, 'ORDERS_SHIPPING_FEE', '50.00')))
+# Orders of at least this much ship free
+FREE_SHIPPING_FROM = Decimal(str(getattr(settings, 'ORDERS_FREE_SHIPPING_FROM', '500.00')))
+
+# Orders that can still be cancelled by the customer
+CANCELLABLE_STATUSES = ['pending', 'confirmed']
+
+CENT = Decimal('0.01')
+
+
+class CartChanged(Exception):
+    """The cart changed, or is being checked out, since its lines were read"""
+
+
+def order_totals(lines):
+    """Subtotal, tax, shipping and total for cart lines, in one pass over them"""
+    subtotal = sum((line.unit_price * line.quantity for line in lines), Decimal('0.00'))
+    tax_amount = (subtotal * TAX_RATE).quantize(CENT)
+    shipping_amount = SHIPPING_FEE if subtotal < FREE_SHIPPING_FROM else Decimal('0.00')
+    return {
+        'subtotal': subtotal,
+        'tax_amount': tax_amount,
+        'shipping_amount': shipping_amount,
+        'total_amount': subtotal + tax_amount + shipping_amount,
+    }
+
+
+def order_item(order, line):
+    """
+    Unsaved OrderItem for a cart line. bulk_create skips OrderItem.save(),
+    so the product snapshot and line total are filled in here.
+    """
+    product = line.product
+    return OrderItem(
+        order=order,
+        product=product,
+        product_name=product.name,
+        # Products have no separate SKU; the slug is their catalog identifier
+        product_sku=product.slug,
+        quantity=line.quantity,
+        selected_size=line.selected_size,
+        selected_color=line.selected_color,
+        unit_price=line.unit_price,
+        total_price=line.unit_price * line.quantity,
+    )
+
+
+def _attach_items(order, items):
+    """Make `order.items.all()` return the created lines without a query"""
+    queryset = order.items.all()
+    queryset._result_cache = items
+    queryset._prefetch_done = True
+    order._prefetched_objects_cache = {'items': queryset}
+
+
+def place_order(user, cart, shipping_address, billing_address, **contact):
+    """
+    Create an order for `user` from their cart, loaded with
+    `Cart.objects.with_items()`, and empty the cart. `contact` holds
+    phone_number, email and notes.
+    Raises stock.OutOfStock or CartChanged, with nothing written, if any
+    product is short or the cart is no longer as it was loaded.
+    """
+    lines = list(cart.items.all())
+    with transaction.atomic():
+        if not claim(cart.pk, cart.version):
+            raise CartChanged()
+        reserve(line_quantities(lines))
+        order = Order.objects.create(
+            user=user,
+            **order_totals(lines),
+
+            # Shipping info
+            shipping_address=shipping_address.address_line_1,
+            shipping_city=shipping_address.city,
+            shipping_state=shipping_address.state,
+            shipping_postal_code=shipping_address.postal_code,
+            shipping_country=shipping_address.country,
+
+            # Billing info
+            billing_address=billing_address.address_line_1,
+            billing_city=billing_address.city,
+            billing_state=billing_address.state,
+            billing_postal_code=billing_address.postal_code,
+            billing_country=billing_address.country,
+
+            **contact
+        )
+        items = OrderItem.objects.bulk_create([order_item(order, line) for line in lines])
+        delete_lines(cart.pk, [line.pk for line in lines])
+    _attach_items(order, items)
+    return order
+
+
+def cancel_and_restock(order):
+    """
+    Cancel an order that is still pending or confirmed and put its stock back.
+    The status change is a conditional UPDATE, so an order cancelled twice
+    at the same time releases its stock once. Returns whether it was cancelled.
+    """
+    with transaction.atomic():
+        cancelled = Order.objects.filter(pk=order.pk, status__in=CANCELLABLE_STATUSES).update(
+            status='cancelled', updated_at=timezone.now()
+        )
+        if cancelled:
+            release(line_quantities(order.items.only('product_id', 'quantity')))
+    if cancelled:
+        order.status = 'cancelled'
+    return bool(cancelled)
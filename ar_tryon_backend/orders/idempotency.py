@@ -0,0 +1,131 @@
+"""
+Idempotency keys for order and cart mutations.
+A client that may retry a request (mobile clients do on timeouts) sends an
+Idempotency-Key header. The first request with a key runs the view and
+stores its response; a retry with the same key gets that response back,
+marked with an Idempotent-Replayed header, without the view running again.
+A retry arriving while the first request is still running waits for it to
+finish instead of racing it.
+
+The claim is the INSERT of the key row: the table's unique key lets exactly
+one request win. Server errors (5xx) and conflicts (409, such as products
+out of stock) are not stored, so the key can be retried once the cause is
+fixed, and a key left without a response by a request that died is
+taken over after IN_FLIGHT_TIMEOUT. Keys are scoped per user and expire after IDEMPOTENCY_TTL; run
+`manage.py prune_idempotency_keys` periodically to delete expired rows.
+"""
+
+import functools
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+TTL = timedelta(seconds=getattr(settings, 'ORDERS_IDEMPOTENCY_TTL', 24 * 3600))
+# How long a retry waits for the request holding its key, and how often it looks
+WAIT_TIMEOUT = getattr(settings, 'ORDERS_IDEMPOTENCY_WAIT_TIMEOUT', 10)
+POLL_INTERVAL = 0.05
+# A key still without a response after this long belongs to a request that died
+IN_FLIGHT_TIMEOUT = timedelta(seconds=getattr(settings, 'ORDERS_IDEMPOTENCY_IN_FLIGHT_TIMEOUT', 60))
+MAX_KEY_LENGTH = 255
+
+
+def request_hash(request):
+    """Fingerprint of the request a key was first used for"""
+    digest = hashlib.sha256()
+    for part in (request.method, request.path, request.body):
+        digest.update(part if isinstance(part, bytes) else part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """Insert the key row; None if another request already holds the key"""
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, key=key, request_hash=fingerprint)
+    except IntegrityError:
+        return None
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _error(message, code):
+    return Response({'error': message}, status=code)
+
+
+def idempotent(view):
+    """
+    Make a function API view replay its response for a repeated
+    Idempotency-Key. Requests without the header run as usual.
+    Goes below @api_view so it sees the authenticated DRF request.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return _error(f'{HEADER} is longer than {MAX_KEY_LENGTH} characters', status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_hash(request)
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while True:
+            record = _claim(request.user, key, fingerprint)
+            if record is not None:
+                break
+            existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if existing is None:
+                # The request holding the key failed and released it; try again
+                continue
+            age = timezone.now() - existing.created_at
+            if age > TTL or (existing.response_status is None and age > IN_FLIGHT_TIMEOUT):
+                IdempotencyKey.objects.filter(pk=existing.pk, created_at=existing.created_at).delete()
+                continue
+            if existing.request_hash != fingerprint:
+                return _error(
+                    f'{HEADER} was already used for a different request',
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if existing.response_status is not None:
+                return _replay(existing)
+            if time.monotonic() >= deadline:
+                return _error(
+                    f'A request with this {HEADER} is still being processed',
+                    status.HTTP_409_CONFLICT,
+                )
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            record.delete()
+            raise
+        if response.status_code >= 500 or response.status_code == status.HTTP_409_CONFLICT:
+            # Not stored: a conflict (e.g. out of stock) depends on state a retry may find changed
+            record.delete()
+        else:
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                response_status=response.status_code, response_body=response.data
+            )
+        return response
+
+    return wrapper
+
+
+def prune_keys(now=None):
+    """Delete keys older than TTL; returns how many"""
+    now = now or timezone.now()
+    return IdempotencyKey.objects.filter(created_at__lt=now - TTL).delete()[0]
@@ -0,0 +1,123 @@
+"""
+Django management command to benchmark checkout (cart to order).
+It fills a cart with many lines, then compares the queries and latency of
+the old per-line checkout with the create_order API, for one line and for
+all of them.
+"""
+
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.test import force_authenticate
+
+from catalog.benchmarking import (
+    rolled_back, build_catalog_fixture, api_request_factory, count_queries, percentile
+)
+from catalog.models import Product
+from orders.api_views import create_order
+from orders.models import Cart, CartItem, Order, OrderItem, ShippingAddress
+from orders.serializers import OrderSerializer
+
+
+def per_line_checkout(user, address):
+    """Checkout as it was done before orders.checkout: one INSERT per line"""
+    cart = Cart.objects.get(user=user)
+    with transaction.atomic():
+        subtotal = cart.total_price
+        tax_amount = subtotal * Decimal('0.18')
+        shipping_amount = Decimal('50.00') if subtotal < Decimal('500.00') else Decimal('0.00')
+        order = Order.objects.create(
+            user=user, subtotal=subtotal, tax_amount=tax_amount, shipping_amount=shipping_amount,
+            total_amount=subtotal + tax_amount + shipping_amount,
+            shipping_address=address.address_line_1, shipping_city=address.city,
+            shipping_state=address.state, shipping_postal_code=address.postal_code,
+            shipping_country=address.country,
+            billing_address=address.address_line_1, billing_city=address.city,
+            billing_state=address.state, billing_postal_code=address.postal_code,
+            billing_country=address.country,
+            phone_number=address.phone_number, email=user.email,
+        )
+        for cart_item in cart.items.all():
+            OrderItem.objects.create(
+                order=order,
+                product=cart_item.product,
+                product_name=cart_item.product.name,
+                quantity=cart_item.quantity,
+                selected_size=cart_item.selected_size,
+                selected_color=cart_item.selected_color,
+                unit_price=cart_item.unit_price,
+                total_price=cart_item.get_total_price(),
+            )
+        cart.items.all().delete()
+    return OrderSerializer(order).data
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the query count and latency of checkout for a cart with many lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lines',
+            type=int,
+            default=50,
+            help='Cart lines to check out (default: 50)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=10,
+            help='Timed checkouts per configuration (default: 10)',
+        )
+
+    def handle(self, *args, **options):
+        factory = api_request_factory()
+        with rolled_back():
+            build_catalog_fixture(options['lines'])
+            Product.objects.filter(slug__startswith='bench-product-').update(stock_quantity=1000)
+            products = list(Product.objects.filter(slug__startswith='bench-product-'))
+            user = User.objects.create_user('bench-checkout-user', email='bench@example.com')
+            address = ShippingAddress.objects.create(
+                user=user, name='Bench', address_line_1='1 Bench Street', city='Pune',
+                state='Maharashtra', postal_code='411001', phone_number='9999999999',
+            )
+            cart = Cart.objects.create(user=user)
+
+            def fill_cart(count):
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product=product, quantity=2, selected_size='M',
+                             unit_price=product.sale_price or product.price)
+                    for product in products[:count]
+                ])
+
+            def checkout():
+                request = factory.post('/api/orders/orders/create/', {
+                    'shipping_address_id': address.pk,
+                    'phone_number': address.phone_number,
+                    'email': user.email,
+                }, format='json')
+                force_authenticate(request, user=user)
+                response = create_order(request)
+                if response.status_code != 201:
+                    raise CommandError(f'create_order returned {response.status_code}: {response.data}')
+
+            def report(label, func, count):
+                queries, timings = None, []
+                for _ in range(options['repeat']):
+                    fill_cart(count)
+                    with count_queries() as captured:
+                        started = time.perf_counter()
+                        func()
+                        timings.append((time.perf_counter() - started) * 1000)
+                    queries = queries or len(captured)
+                timings.sort()
+                self.stdout.write(
+                    f'  {label:<19} lines={count:<4} queries={queries:<4} '
+                    f'p50={percentile(timings, 50):.1f}ms p95={percentile(timings, 95):.1f}ms'
+                )
+
+            report('per-line checkout', lambda: per_line_checkout(user, address), options['lines'])
+            for count in [1, options['lines']]:
+                report('create_order API', checkout, count)
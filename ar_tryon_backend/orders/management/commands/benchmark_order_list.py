@@ -0,0 +1,117 @@
+"""
+Django management command to benchmark the order list API.
+It reports the queries, payload size and latency of a page of orders for a
+small and a large customer, and compares it with serializing the same page in
+the full nested form used by the order detail. The fixed query count is
+checked by orders.tests.
+"""
+
+import json
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import force_authenticate
+
+from catalog.benchmarking import (
+    rolled_back, build_catalog_fixture, api_request_factory, count_queries,
+    time_calls, percentile
+)
+from catalog.models import Product
+from orders.api_views import OrderListView
+from orders.models import Order, OrderItem
+from orders.serializers import OrderSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark query count and payload size of the order list API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=100,
+            help='Orders of the largest customer (default: 100)',
+        )
+        parser.add_argument(
+            '--lines',
+            type=int,
+            default=5,
+            help='Maximum lines per order (default: 5)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Timed requests per configuration (default: 20)',
+        )
+
+    def create_orders(self, user, count, products, rng):
+        orders = Order.objects.bulk_create([
+            Order(
+                user=user, order_number=f'BENCH{user.pk:04d}{i:06d}', subtotal=0, total_amount=0,
+                shipping_address='1 Bench Street', shipping_city='Pune', shipping_state='Maharashtra',
+                shipping_postal_code='411001', billing_address='1 Bench Street', billing_city='Pune',
+                billing_state='Maharashtra', billing_postal_code='411001',
+                phone_number='9999999999', email='bench@example.com',
+            )
+            for i in range(count)
+        ])
+        if not orders[0].pk:
+            orders = list(Order.objects.filter(user=user))
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, product=product, product_name=product.name, quantity=rng.randint(1, 3),
+                unit_price=product.price, total_price=product.price,
+            )
+            for order in orders
+            for product in rng.sample(products, rng.randint(1, self.lines))
+        ])
+
+    def handle(self, *args, **options):
+        view = OrderListView.as_view()
+        factory = api_request_factory()
+        rng = random.Random(42)
+        self.lines = options['lines']
+
+        def fetch(user, params):
+            request = factory.get('/api/orders/orders/', params)
+            force_authenticate(request, user=user)
+            response = view(request)
+            response.render()
+            if response.status_code != 200:
+                raise CommandError(f'Order list returned {response.status_code}')
+            return response
+
+        with rolled_back():
+            build_catalog_fixture(max(options['lines'], 50))
+            products = list(Product.objects.filter(slug__startswith='bench-product-'))
+            customers = []
+            for count in [5, options['orders']]:
+                user = User.objects.create_user(f'bench-orders-{count}')
+                self.create_orders(user, count, products, rng)
+                customers.append((count, user))
+
+            for count, user in customers:
+                for params in [{}, {'pagination': 'cursor'}]:
+                    with count_queries() as queries:
+                        response = fetch(user, params)
+                    mode = params.get('pagination', 'page')
+                    timings = time_calls(lambda: fetch(user, params), options['repeat'])
+                    self.stdout.write(
+                        f'  summary  orders={count:<4} {mode:<6} queries={len(queries):<3} '
+                        f'bytes={len(response.content):<7} p50={percentile(timings, 50):.1f}ms '
+                        f'p95={percentile(timings, 95):.1f}ms'
+                    )
+
+            # The same page serialized in the nested form, as the list did before
+            count, user = customers[-1]
+            page = len(json.loads(fetch(user, {}).content)['results'])
+            with count_queries() as queries:
+                data = OrderSerializer(Order.objects.filter(user=user)[:page], many=True).data
+            self.stdout.write(
+                f'  nested   orders={count:<4} page   queries={len(queries):<3} '
+                f'bytes={len(json.dumps(data, default=str)):<7}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Order list benchmark complete.'))
@@ -0,0 +1,16 @@
+"""
+Django management command to delete expired idempotency keys.
+Schedule it (e.g. hourly with cron) to keep the key table small.
+"""
+
+from django.core.management.base import BaseCommand
+
+from orders.idempotency import prune_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than ORDERS_IDEMPOTENCY_TTL'
+
+    def handle(self, *args, **options):
+        deleted = prune_keys()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys.'))
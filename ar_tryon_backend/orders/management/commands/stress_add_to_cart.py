@@ -0,0 +1,66 @@
+"""
+Django management command to measure concurrent add-to-cart requests.
+Client threads add the same product variant to one cart at the same time,
+the worst case for contention on the cart line, and it reports the
+throughput and the resulting line.
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.test import force_authenticate
+
+from catalog.benchmarking import api_request_factory, committed_fixture, run_clients
+from orders.api_views import add_to_cart
+from orders.models import Cart, CartItem
+
+BENCH_USERNAME = 'bench-cart-user'
+
+
+class Command(BaseCommand):
+    help = 'Add the same product to one cart from concurrent clients and measure the throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=8,
+            help='Concurrent client threads (default: 8)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=12,
+            help='Add-to-cart requests per client, one unit each (default: 12)',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=BENCH_USERNAME)
+        with committed_fixture(1, users=users, images_per_product=0) as products:
+            self.run_clients(products.get(), User.objects.create_user(BENCH_USERNAME), options)
+
+    def run_clients(self, product, user, options):
+        factory = api_request_factory()
+
+        def client():
+            for _ in range(options['requests']):
+                request = factory.post(
+                    '/api/orders/cart/add/',
+                    {'product_id': product.pk, 'quantity': 1, 'selected_size': 'M'},
+                    format='json',
+                )
+                force_authenticate(request, user=user)
+                response = add_to_cart(request)
+                if response.status_code != 200:
+                    raise RuntimeError(f'HTTP {response.status_code}: {response.data}')
+
+        elapsed, errors = run_clients([client] * options['clients'])
+
+        requests = options['clients'] * options['requests']
+        lines = list(CartItem.objects.filter(cart__user=user).values_list('product_id', 'selected_size', 'quantity'))
+        version = Cart.objects.get(user=user).version
+        self.stdout.write(
+            f'{requests} adds from {options["clients"]} clients in {elapsed:.2f}s '
+            f'({requests / elapsed:.0f} req/s); cart lines: {lines}, version {version}'
+        )
+        for exc in errors:
+            self.stdout.write(self.style.ERROR(f'Client error: {exc!r}'))
@@ -0,0 +1,129 @@
+"""
+Django management command to measure checkout under stock contention.
+Concurrent clients fill their carts with the same few products and check
+out at the same time, cancelling some of their orders again; it reports
+the throughput and how many checkouts were placed or ran out of stock.
+"""
+
+import random
+import threading
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from rest_framework.test import force_authenticate
+
+from catalog.benchmarking import api_request_factory, committed_fixture, run_clients
+from orders.api_views import cancel_order, clear_cart, create_order
+from orders.cart import add_item
+from orders.models import Cart, OrderItem, ShippingAddress
+
+BENCH_USER_PREFIX = 'bench-checkout-'
+
+
+class Command(BaseCommand):
+    help = 'Check out the same products from concurrent clients and measure the throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=16,
+            help='Concurrent client threads (default: 16)',
+        )
+        parser.add_argument(
+            '--checkouts',
+            type=int,
+            default=10,
+            help='Checkouts per client (default: 10)',
+        )
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=5,
+            help='Number of contended products (default: 5)',
+        )
+        parser.add_argument(
+            '--stock',
+            type=int,
+            default=50,
+            help='Starting stock of each product (default: 50)',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username__startswith=BENCH_USER_PREFIX)
+        with committed_fixture(options['products'], users=users, images_per_product=0) as products:
+            products.update(stock_quantity=options['stock'])
+            self.run_clients(list(products), options)
+
+    def run_clients(self, products, options):
+        factory = api_request_factory()
+        outcomes = Counter()
+        lock = threading.Lock()
+
+        def call(view, request, user, **kwargs):
+            force_authenticate(request, user=user)
+            return view(request, **kwargs)
+
+        def client(seed, user, address, cart):
+            rng = random.Random(seed)
+            seen = Counter()
+            try:
+                for _ in range(options['checkouts']):
+                    for product in rng.sample(products, rng.randint(1, len(products))):
+                        add_item(cart.pk, product, rng.randint(1, 3), selected_size=rng.choice('SML'))
+                    response = call(create_order, factory.post('/api/orders/orders/create/', {
+                        'shipping_address_id': address.pk,
+                        'phone_number': address.phone_number,
+                        'email': user.email,
+                    }, format='json'), user)
+                    if response.status_code == 201:
+                        seen['placed'] += 1
+                        if rng.random() < 0.3:
+                            number = response.data['order']['order_number']
+                            response = call(
+                                cancel_order, factory.post(f'/api/orders/orders/{number}/cancel/'),
+                                user, order_number=number,
+                            )
+                            if response.status_code != 200:
+                                raise RuntimeError(f'Cancel returned HTTP {response.status_code}')
+                            seen['cancelled'] += 1
+                    elif response.status_code == 409:
+                        # Out of stock: the cart is left as it was, start over
+                        seen['out of stock'] += 1
+                        call(clear_cart, factory.delete('/api/orders/cart/clear/'), user)
+                    else:
+                        raise RuntimeError(f'Checkout returned HTTP {response.status_code}: {response.data}')
+            finally:
+                with lock:
+                    outcomes.update(seen)
+
+        calls = []
+        for i in range(options['clients']):
+            user = User.objects.create_user(f'{BENCH_USER_PREFIX}{i}', email=f'bench{i}@example.com')
+            address = ShippingAddress.objects.create(
+                user=user, name='Bench', address_line_1='1 Bench Street', city='Pune',
+                state='Maharashtra', postal_code='411001', phone_number='9999999999',
+            )
+            cart = Cart.objects.create(user=user)
+            calls.append(lambda args=(i, user, address, cart): client(*args))
+        elapsed, errors = run_clients(calls)
+
+        checkouts = options['clients'] * options['checkouts']
+        self.stdout.write(
+            f'{checkouts} checkouts from {options["clients"]} clients in {elapsed:.1f}s '
+            f'({checkouts / elapsed:.0f} checkouts/s): {outcomes["placed"]} placed '
+            f'({outcomes["cancelled"]} cancelled again), {outcomes["out of stock"]} out of stock'
+        )
+        for exc in errors:
+            self.stdout.write(self.style.ERROR(f'Client error: {exc!r}'))
+
+        sold = dict(
+            OrderItem.objects.filter(product__in=products)
+            .exclude(order__status='cancelled')
+            .values_list('product_id')
+            .annotate(units=Sum('quantity'))
+        )
+        for product in products:
+            self.stdout.write(f'  {product.slug}: sold {sold.get(product.pk, 0)} of {options["stock"]}')
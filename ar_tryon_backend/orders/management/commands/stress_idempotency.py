@@ -0,0 +1,83 @@
+"""
+Django management command to measure retried checkouts with idempotency keys.
+Concurrent clients send the same checkout with the same Idempotency-Key, as
+a mobile client retrying on timeouts would; it reports how long each round
+took and how many responses were replays.
+"""
+
+import uuid
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.test import force_authenticate
+
+from catalog.benchmarking import api_request_factory, committed_fixture, percentile, run_clients
+from orders.api_views import add_to_cart, create_order
+from orders.models import Order, ShippingAddress
+
+BENCH_USERNAME = 'bench-idempotency-user'
+
+
+class Command(BaseCommand):
+    help = 'Send one checkout from concurrent clients with the same Idempotency-Key and measure the rounds'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=8,
+            help='Concurrent client threads (default: 8)',
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=5,
+            help='Checkouts, each sent by every client with one key (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=BENCH_USERNAME)
+        with committed_fixture(3, users=users, images_per_product=0) as products:
+            products.update(stock_quantity=1000)
+            user = User.objects.create_user(BENCH_USERNAME, email='bench@example.com')
+            self.run_clients(list(products), user, options)
+
+    def run_clients(self, products, user, options):
+        factory = api_request_factory()
+        address = ShippingAddress.objects.create(
+            user=user, name='Bench', address_line_1='1 Bench Street', city='Pune',
+            state='Maharashtra', postal_code='411001', phone_number='9999999999',
+        )
+        checkout = {'shipping_address_id': address.pk, 'phone_number': address.phone_number, 'email': user.email}
+
+        def post(view, path, data, key):
+            request = factory.post(path, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+            force_authenticate(request, user=user)
+            return view(request)
+
+        statuses = Counter()
+        timings = []
+        for _ in range(options['rounds']):
+            for product in products:
+                post(add_to_cart, '/api/orders/cart/add/', {'product_id': product.pk, 'quantity': 1}, str(uuid.uuid4()))
+
+            key = str(uuid.uuid4())
+            responses = []
+
+            def client():
+                responses.append(post(create_order, '/api/orders/orders/create/', checkout, key))
+
+            elapsed, errors = run_clients([client] * options['clients'])
+            timings.append(elapsed * 1000)
+            for exc in errors:
+                self.stdout.write(self.style.ERROR(f'Client error: {exc!r}'))
+            for response in responses:
+                statuses['replayed' if response.get('Idempotent-Replayed') else response.status_code] += 1
+
+        timings.sort()
+        self.stdout.write(
+            f'{options["rounds"]} checkouts sent {options["clients"]} times each: '
+            f'p50={percentile(timings, 50):.1f}ms p95={percentile(timings, 95):.1f}ms per round, '
+            f'{Order.objects.filter(user=user).count()} orders created, responses: {dict(statuses)}'
+        )
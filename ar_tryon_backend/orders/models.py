@@ -4,10 +4,31 @@ This app handles cart items, orders, and order management.
 """
 
 from django.db import models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
-from catalog.models import Product
+from catalog.models import Product, ProductImage
+
+
+def cart_etag(cart_id, version):
+    """ETag of a cart's representation; it changes with every cart item change"""
+    return f'"cart-{cart_id}-{version}"'
+
+
+class CartQuerySet(models.QuerySet):
+    def with_items(self):
+        """
+        Prefetch the cart items with everything the cart serializer shows:
+        product, category and brand are joined, product images are fetched
+        in one batch.
+        """
+        items = CartItem.objects.select_related(
+            'product__category', 'product__brand'
+        ).prefetch_related('product__images')
+        return self.prefetch_related(models.Prefetch('items', queryset=items))
 
 
 class Cart(models.Model):
@@ -16,9 +37,14 @@ class Cart(models.Model):
     Each user has one cart that persists items until checkout.
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    # Bumped whenever an item is added, changed or removed (see orders.signals);
+    # clients revalidate the cart with it as the ETag
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CartQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Shopping Cart"
         verbose_name_plural = "Shopping Carts"
@@ -26,23 +52,57 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.username}"
     
+    @property
+    def etag(self):
+        return cart_etag(self.pk, self.version)
+    
+    def get_totals(self):
+        """
+        Item count, line count and total price of the cart, computed once per
+        instance: from the prefetched items if the cart was loaded with
+        `Cart.objects.with_items()`, otherwise with one aggregate query.
+        """
+        if getattr(self, '_totals', None) is None:
+            prefetched = getattr(self, '_prefetched_objects_cache', {}).get('items')
+            if prefetched is not None:
+                self._totals = {
+                    'total_items': sum(item.quantity for item in prefetched),
+                    'total_price': sum((item.get_total_price() for item in prefetched), Decimal('0.00')),
+                    'line_count': len(prefetched),
+                }
+            else:
+                self._totals = self.items.totals()
+        return self._totals
+    
     @property
     def total_items(self):
         """Total number of items in cart"""
-        return sum(item.quantity for item in self.items.all())
+        return self.get_totals()['total_items']
     
     @property
     def total_price(self):
         """Total price of all items in cart"""
-        total = Decimal('0.00')
-        for item in self.items.all():
-            total += item.get_total_price()
-        return total
+        return self.get_totals()['total_price']
     
     @property
     def is_empty(self):
         """Check if cart is empty"""
-        return self.items.count() == 0
+        return self.get_totals()['line_count'] == 0
+
+
+class CartItemQuerySet(models.QuerySet):
+    def totals(self):
+        """Item count, line count and total price of these items in one query"""
+        line_price = ExpressionWrapper(
+            F('unit_price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+        totals = self.order_by().aggregate(
+            total_items=Coalesce(Sum('quantity'), 0),
+            total_price=Coalesce(Sum(line_price), Value(Decimal('0.00')), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            line_count=Count('pk'),
+        )
+        totals['total_price'] = Decimal(totals['total_price']).quantize(Decimal('0.01'))
+        return totals
 
 
 class CartItem(models.Model):
@@ -67,6 +127,8 @@ class CartItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CartItemQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['cart', 'product', 'selected_size', 'selected_color']
         ordering = ['-created_at']
@@ -86,6 +148,31 @@ class CartItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_summary(self):
+        """
+        Annotate what the order list shows about each order's lines: the
+        number of units and lines, the first line's product and that
+        product's main image (its file name and rendition manifest). All of
+        it comes from correlated subqueries, so a page of orders is a single
+        query and no order lines or products are loaded.
+        """
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by()
+        first_item = items.order_by('id')
+        images = ProductImage.objects.filter(product=OuterRef('first_product_id')).order_by(
+            '-is_primary', 'sort_order', 'created_at'
+        )
+        return self.annotate(
+            item_count=Coalesce(Subquery(items.values('order').annotate(units=Sum('quantity')).values('units')), 0),
+            line_count=Coalesce(Subquery(items.values('order').annotate(lines=Count('pk')).values('lines')), 0),
+            first_product_id=Subquery(first_item.values('product_id')[:1]),
+            first_product_name=Subquery(first_item.values('product_name')[:1]),
+        ).annotate(
+            thumbnail_image=Subquery(images.values('image')[:1]),
+            thumbnail_renditions=Subquery(images.values('renditions')[:1]),
+        )
+
+
 class Order(models.Model):
     """
     Customer orders created from cart checkout.
@@ -150,10 +237,12 @@ class Order(models.Model):
     shipped_at = models.DateTimeField(blank=True, null=True)
     delivered_at = models.DateTimeField(blank=True, null=True)
     
+    objects = OrderQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['user', '-created_at', '-id']),
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['order_number']),
         ]
@@ -239,3 +328,25 @@ class ShippingAddress(models.Model):
                 user=self.user, is_default=True
             ).exclude(pk=self.pk).update(is_default=False)
         super().save(*args, **kwargs)
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied Idempotency-Key and the response of the request that
+    first used it, so a retried request gets the same response without being
+    executed again (see orders.idempotency). Keys expire after a day.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    # SHA-256 of method, path and body; reusing a key for another request is an error
+    request_hash = models.CharField(max_length=64)
+    # Both empty while the first request is still running
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        unique_together = ['user', 'key']
+    
+    def __str__(self):
+        return f"Idempotency key {self.key} ({self.user_id})"
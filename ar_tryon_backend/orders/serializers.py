@@ -6,6 +6,8 @@ These handle serialization of cart and order data for the API.
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Cart, CartItem, Order, OrderItem, ShippingAddress
+from django.core.files.storage import default_storage
+from catalog import renditions
 from catalog.models import Product
 from catalog.serializers import ProductSerializer
 
@@ -90,9 +92,9 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = [
             'id', 'user', 'items', 'total_items', 
-            'total_price', 'is_empty', 'created_at', 'updated_at'
+            'total_price', 'is_empty', 'version', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'version', 'created_at', 'updated_at']
     
     def get_total_items(self, obj):
         """Get total number of items in cart"""
@@ -108,7 +110,11 @@ class CartSerializer(serializers.ModelSerializer):
 
 
 class AddToCartSerializer(serializers.Serializer):
-    """Serializer for adding items to cart"""
+    """
+    Serializer for adding items to cart.
+    The validated product is kept on `serializer.product` so the view
+    doesn't load it again.
+    """
     product_id = serializers.IntegerField()
     quantity = serializers.IntegerField(min_value=1, max_value=99, default=1)
     selected_size = serializers.CharField(max_length=10, required=False, allow_blank=True)
@@ -116,13 +122,13 @@ class AddToCartSerializer(serializers.Serializer):
     
     def validate_product_id(self, value):
         """Validate that product exists and is available"""
-        try:
-            product = Product.objects.get(id=value)
-            if not product.is_available:
-                raise serializers.ValidationError("This product is not available.")
-            return value
-        except Product.DoesNotExist:
+        product = Product.objects.only('id', 'price', 'sale_price', 'is_available').filter(id=value).first()
+        if product is None:
             raise serializers.ValidationError("Product does not exist.")
+        if not product.is_available:
+            raise serializers.ValidationError("This product is not available.")
+        self.product = product
+        return value
 
 
 class UpdateCartItemSerializer(serializers.Serializer):
@@ -191,6 +197,43 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
 
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """
+    Compact order representation for the order list.
+    Expects a queryset built with `Order.objects.with_summary()`; the lines
+    themselves are only in the detail representation (OrderSerializer).
+    `thumbnail` is the first line's product image, or None.
+    """
+    item_count = serializers.IntegerField(read_only=True)
+    line_count = serializers.IntegerField(read_only=True)
+    first_product_name = serializers.CharField(read_only=True)
+    thumbnail = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_number', 'status', 'payment_status',
+            'subtotal', 'tax_amount', 'shipping_amount', 'discount_amount', 'total_amount',
+            'item_count', 'line_count', 'first_product_name', 'thumbnail', 'created_at'
+        ]
+    
+    def get_thumbnail(self, obj):
+        if not obj.thumbnail_image:
+            return None
+        request = self.context.get('request')
+        manifest = obj.thumbnail_renditions
+        url = renditions.rendition_url(manifest, 'thumb', request=request)
+        if url is None:
+            url = default_storage.url(obj.thumbnail_image)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+        return {
+            'url': url,
+            'srcset': renditions.srcset_map(manifest, request),
+            'color': (manifest or {}).get('color'),
+        }
+
+
 class CreateOrderSerializer(serializers.Serializer):
     """Serializer for creating orders from cart"""
     shipping_address_id = serializers.IntegerField()
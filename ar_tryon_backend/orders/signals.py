@@ -0,0 +1,18 @@
+"""
+Signal handlers for orders app.
+They bump the cart version whenever the cart items change, which moves the
+cart ETag and the cached cart summary on.
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cart import bump_version
+from .models import CartItem
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def bump_cart_version_on_change(sender, instance, **kwargs):
+    """A cart item was added, changed or removed"""
+    bump_version(instance.cart_id)
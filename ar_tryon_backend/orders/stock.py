@@ -0,0 +1,61 @@
+"""
+Stock reservation for checkout.
+Stock is taken with one conditional UPDATE per product,
+
+    UPDATE product SET stock_quantity = stock_quantity - n
+    WHERE id = ... AND stock_quantity >= n
+
+so the database checks and decrements in the same statement and concurrent
+checkouts can never take more than is left. No rows are locked up front:
+each UPDATE only holds its own product row until the checkout commits.
+Products are always updated in id order, so two checkouts sharing products
+wait for each other instead of deadlocking. Callers run reserve() inside
+the order's transaction; OutOfStock rolls the whole order back.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+
+from catalog.models import Product
+
+
+class OutOfStock(Exception):
+    """Some products don't have enough stock; `shortages` maps their ids to the quantity asked for"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(f'Not enough stock for products {sorted(shortages)}')
+
+
+def line_quantities(lines):
+    """{product_id: units} for cart or order lines; a product can be on several lines"""
+    quantities = Counter()
+    for line in lines:
+        quantities[line.product_id] += line.quantity
+    return quantities
+
+
+def reserve(quantities):
+    """
+    Take {product_id: units} out of stock, all or nothing.
+    Raises OutOfStock listing every product that is short.
+    """
+    shortages = {}
+    with transaction.atomic():
+        for product_id, units in sorted(quantities.items()):
+            taken = Product.objects.filter(pk=product_id, stock_quantity__gte=units).update(
+                stock_quantity=F('stock_quantity') - units
+            )
+            if not taken:
+                shortages[product_id] = units
+        if shortages:
+            raise OutOfStock(shortages)
+
+
+def release(quantities):
+    """Put {product_id: units} back into stock"""
+    with transaction.atomic():
+        for product_id, units in sorted(quantities.items()):
+            Product.objects.filter(pk=product_id).update(stock_quantity=F('stock_quantity') + units)
@@ -0,0 +1,412 @@
+import threading
+from collections import Counter
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from catalog.models import Brand, Category, Product
+from .api_views import OrderListView, add_to_cart, create_order, get_cart
+from .cart import add_item
+from .checkout import CartChanged, cancel_and_restock, place_order
+from .idempotency import idempotent, request_hash
+from .models import Cart, CartItem, IdempotencyKey, Order, OrderItem, ShippingAddress
+from .stock import OutOfStock
+
+
+def create_products(count, stock=10):
+    category = Category.objects.create(name='Shirts', slug='shirts')
+    brand = Brand.objects.create(name='Acme', slug='acme')
+    return [
+        Product.objects.create(
+            name=f'Shirt {i}', slug=f'shirt-{i}', description='A shirt', category=category,
+            brand=brand, price=Decimal('499.00'), stock_quantity=stock,
+        )
+        for i in range(count)
+    ]
+
+
+def create_customer(username):
+    """A user with a shipping address, and the checkout request body for it"""
+    user = User.objects.create_user(username, email=f'{username}@example.com')
+    address = ShippingAddress.objects.create(
+        user=user, name=username, address_line_1='1 Test Street', city='Pune',
+        state='Maharashtra', postal_code='411001', phone_number='9999999999',
+    )
+    return user, {'shipping_address_id': address.pk, 'phone_number': '9999999999', 'email': user.email}
+
+
+def run_concurrently(*calls):
+    """Start every call at once, each in its own thread, and return their results in order"""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def run(i, call):
+        try:
+            barrier.wait()
+            results[i] = call()
+        except Exception as exc:
+            results[i] = exc
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(i, call)) for i, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class OrderListQueryCountTests(TestCase):
+    """The order list costs a fixed number of queries however many orders and lines a customer has"""
+
+    # Page mode counts the orders, then fetches the page with its summary annotations
+    PAGE_QUERIES = 2
+    CURSOR_QUERIES = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(4)
+        cls.few = cls.create_customer('few-orders', 2)
+        cls.many = cls.create_customer('many-orders', 45)
+
+    @classmethod
+    def create_customer(cls, username, order_count):
+        user = User.objects.create_user(username)
+        for i in range(order_count):
+            order = Order.objects.create(
+                user=user, subtotal=0, total_amount=0,
+                shipping_address='1 Test Street', shipping_city='Pune', shipping_state='Maharashtra',
+                shipping_postal_code='411001', billing_address='1 Test Street', billing_city='Pune',
+                billing_state='Maharashtra', billing_postal_code='411001',
+                phone_number='9999999999', email=f'{username}@example.com',
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, product=product, product_name=product.name, quantity=1,
+                    unit_price=product.price, total_price=product.price,
+                )
+                for product in cls.products[:1 + i % len(cls.products)]
+            ])
+        return user
+
+    def fetch(self, user, params, queries):
+        request = APIRequestFactory().get('/api/orders/orders/', params)
+        force_authenticate(request, user=user)
+        with self.assertNumQueries(queries):
+            response = OrderListView.as_view()(request)
+            response.render()
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_page_mode(self):
+        few = self.fetch(self.few, {}, self.PAGE_QUERIES)
+        many = self.fetch(self.many, {}, self.PAGE_QUERIES)
+        self.assertEqual(few['count'], 2)
+        self.assertEqual(many['count'], 45)
+        self.assertEqual(len(many['results']), 20)
+
+    def test_cursor_mode(self):
+        few = self.fetch(self.few, {'pagination': 'cursor'}, self.CURSOR_QUERIES)
+        many = self.fetch(self.many, {'pagination': 'cursor'}, self.CURSOR_QUERIES)
+        self.assertEqual(len(few['results']), 2)
+        self.assertEqual(len(many['results']), 20)
+        self.assertIsNotNone(many['next'])
+
+
+class CheckoutQueryCountTests(TestCase):
+    """Checkout costs a fixed number of queries plus one stock UPDATE per product"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(12, stock=100)
+
+    def checkout(self, username, line_count):
+        user, body = create_customer(username)
+        cart = Cart.objects.create(user=user)
+        for product in self.products[:line_count]:
+            add_item(cart.pk, product, 2, selected_size='M')
+        with CaptureQueriesContext(connection) as queries:
+            response = post(create_order, user, '/api/orders/orders/create/', body)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['order']['items']), line_count)
+        self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_the_number_of_lines(self):
+        one = self.checkout('one-line', 1)
+        many = self.checkout('many-lines', 12)
+        self.assertEqual(many - 12, one - 1)
+
+    def test_order_total_matches_the_cart(self):
+        user, body = create_customer('totals')
+        cart = Cart.objects.create(user=user)
+        for product in self.products[:3]:
+            add_item(cart.pk, product, 2)
+        order = post(create_order, user, '/api/orders/orders/create/', body).data['order']
+        # 6 x 499.00, plus 18% tax and free shipping over 500
+        self.assertEqual(Decimal(order['subtotal']), Decimal('2994.00'))
+        self.assertEqual(Decimal(order['total_amount']), Decimal('2994.00') * Decimal('1.18'))
+
+
+class CartETagTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product, = create_products(1)
+        cls.user = User.objects.create_user('shopper')
+
+    def fetch(self, **headers):
+        request = APIRequestFactory().get('/api/orders/cart/', **headers)
+        force_authenticate(request, user=self.user)
+        response = get_cart(request)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_unchanged_cart_is_not_modified(self):
+        etag = self.fetch()['ETag']
+        with self.assertNumQueries(1):
+            response = self.fetch(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_changed_cart_is_sent_again(self):
+        etag = self.fetch()['ETag']
+        add_item(Cart.objects.get(user=self.user).pk, self.product, 1)
+        response = self.fetch(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['total_items'], 1)
+
+
+def post(view, user, path, data, key=None):
+    headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+    request = APIRequestFactory().post(path, data, format='json', **headers)
+    force_authenticate(request, user=user)
+    return view(request)
+
+
+def counting_view(status_code):
+    """An API view answering `status_code` that records the bodies it was called with"""
+    @api_view(['POST'])
+    @idempotent
+    def view(request):
+        view.calls.append(request.data)
+        return Response({'call': len(view.calls)}, status=status_code)
+    view.calls = []
+    return view
+
+
+class IdempotencyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('retrying-client', email='client@example.com')
+
+    def test_replays_the_stored_response(self):
+        view = counting_view(201)
+        first = post(view, self.user, '/api/orders/', {'n': 1}, key='k1')
+        retry = post(view, self.user, '/api/orders/', {'n': 1}, key='k1')
+        self.assertEqual(len(view.calls), 1)
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+
+    def test_other_keys_and_requests_without_a_key_run(self):
+        view = counting_view(200)
+        post(view, self.user, '/api/orders/', {'n': 1}, key='k1')
+        post(view, self.user, '/api/orders/', {'n': 1}, key='k2')
+        post(view, self.user, '/api/orders/', {'n': 1})
+        post(view, self.user, '/api/orders/', {'n': 1})
+        self.assertEqual(len(view.calls), 4)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        view = counting_view(201)
+        post(view, self.user, '/api/orders/', {'n': 1}, key='k1')
+        response = post(view, self.user, '/api/orders/', {'n': 2}, key='k1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(view.calls), 1)
+
+    def in_flight(self, key, data):
+        """Record `key` as held by a request for `data` that has not answered yet"""
+        request = APIRequestFactory().post('/api/orders/', data, format='json')
+        return IdempotencyKey.objects.create(user=self.user, key=key, request_hash=request_hash(request))
+
+    def test_retry_waits_for_the_request_in_flight(self):
+        record = self.in_flight('k1', {'n': 1})
+
+        def first_request_answers(seconds):
+            IdempotencyKey.objects.filter(pk=record.pk).update(response_status=201, response_body={'call': 1})
+
+        view = counting_view(201)
+        with mock.patch('orders.idempotency.time.sleep', side_effect=first_request_answers) as sleep:
+            response = post(view, self.user, '/api/orders/', {'n': 1}, key='k1')
+        sleep.assert_called_once()
+        self.assertEqual((response.status_code, response.data), (201, {'call': 1}))
+        self.assertEqual(view.calls, [])
+
+    def test_retry_gives_up_on_a_request_still_in_flight(self):
+        self.in_flight('k1', {'n': 1})
+        view = counting_view(201)
+        with mock.patch('orders.idempotency.WAIT_TIMEOUT', 0):
+            response = post(view, self.user, '/api/orders/', {'n': 1}, key='k1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(view.calls, [])
+
+    def test_server_errors_release_the_key(self):
+        failing = counting_view(503)
+        self.assertEqual(post(failing, self.user, '/api/orders/', {'n': 1}, key='k1').status_code, 503)
+        self.assertFalse(IdempotencyKey.objects.filter(user=self.user, key='k1').exists())
+        working = counting_view(201)
+        response = post(working, self.user, '/api/orders/', {'n': 1}, key='k1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(working.calls), 1)
+
+    def test_out_of_stock_is_not_replayed_once_the_cart_is_fixed(self):
+        product, = create_products(1, stock=2)
+        user, checkout = create_customer('checking-out')
+        post(add_to_cart, user, '/api/orders/cart/add/', {'product_id': product.pk, 'quantity': 3})
+
+        response = post(create_order, user, '/api/orders/orders/create/', checkout, key='order-1')
+        self.assertEqual(response.status_code, 409)
+        CartItem.objects.filter(cart__user=user).update(quantity=2)
+        response = post(create_order, user, '/api/orders/orders/create/', checkout, key='order-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Order.objects.filter(user=user).count(), 1)
+
+
+class CheckoutTests(TransactionTestCase):
+    """Checkouts running at the same time, each in its own thread and database connection"""
+
+    def setUp(self):
+        self.products = create_products(2, stock=5)
+
+    def stock(self):
+        return [Product.objects.get(pk=product.pk).stock_quantity for product in self.products]
+
+    def checkout(self, user, body):
+        return lambda: post(create_order, user, '/api/orders/orders/create/', body).status_code
+
+    def test_concurrent_checkouts_never_oversell(self):
+        customers = [create_customer(f'customer-{i}') for i in range(8)]
+        for user, _ in customers:
+            cart = Cart.objects.create(user=user)
+            add_item(cart.pk, self.products[0], 1)
+            # The same product on a second line counts against the same stock
+            add_item(cart.pk, self.products[0], 1, selected_size='L')
+            add_item(cart.pk, self.products[1], 1)
+
+        statuses = Counter(run_concurrently(*(self.checkout(user, body) for user, body in customers)))
+        # Each order takes 2 of the 5 units of the first product
+        self.assertEqual(statuses, {201: 2, 409: 6})
+        self.assertEqual(self.stock(), [1, 3])
+        sold = Counter()
+        for item in OrderItem.objects.all():
+            sold[item.product_id] += item.quantity
+        self.assertEqual(sold, {self.products[0].pk: 4, self.products[1].pk: 2})
+
+    def test_a_cart_checked_out_twice_at_once_is_ordered_once(self):
+        user, body = create_customer('double-clicker')
+        cart = Cart.objects.create(user=user)
+        add_item(cart.pk, self.products[0], 2)
+
+        statuses = Counter(run_concurrently(*(self.checkout(user, body) for _ in range(4))))
+        # The others found the cart claimed (409) or, if they read it later, already empty (400)
+        self.assertEqual(statuses[201], 1)
+        self.assertEqual(statuses[400] + statuses[409], 3)
+        self.assertEqual(Order.objects.filter(user=user).count(), 1)
+        self.assertEqual(self.stock(), [3, 5])
+        self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+
+    def test_out_of_stock_writes_nothing(self):
+        user, _ = create_customer('too-many')
+        cart = Cart.objects.create(user=user)
+        add_item(cart.pk, self.products[0], 2)
+        add_item(cart.pk, self.products[1], 6)
+        cart = Cart.objects.with_items().get(pk=cart.pk)
+        address = ShippingAddress.objects.get(user=user)
+
+        with self.assertRaises(OutOfStock) as raised:
+            place_order(user, cart, address, address, phone_number='9999999999', email=user.email)
+        self.assertEqual(raised.exception.shortages, {self.products[1].pk: 6})
+        self.assertEqual(self.stock(), [5, 5])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 2)
+        self.assertEqual(Cart.objects.get(pk=cart.pk).version, cart.version)
+
+    def test_lines_changed_after_the_cart_was_read_are_not_lost(self):
+        user, _ = create_customer('still-shopping')
+        cart = Cart.objects.create(user=user)
+        add_item(cart.pk, self.products[0], 1)
+        cart = Cart.objects.with_items().get(pk=cart.pk)
+        address = ShippingAddress.objects.get(user=user)
+        add_item(cart.pk, self.products[1], 1)
+
+        with self.assertRaises(CartChanged):
+            place_order(user, cart, address, address, phone_number='9999999999', email=user.email)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 2)
+
+        cart = Cart.objects.with_items().get(pk=cart.pk)
+        order = place_order(user, cart, address, address, phone_number='9999999999', email=user.email)
+        self.assertEqual(order.items.count(), 2)
+        self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+
+    def test_cancelling_restocks_once(self):
+        user, body = create_customer('changed-mind')
+        cart = Cart.objects.create(user=user)
+        add_item(cart.pk, self.products[0], 3)
+        self.assertEqual(post(create_order, user, '/api/orders/orders/create/', body).status_code, 201)
+        self.assertEqual(self.stock(), [2, 5])
+
+        order = Order.objects.get(user=user)
+        cancelled = run_concurrently(*(lambda: cancel_and_restock(Order.objects.get(pk=order.pk)) for _ in range(3)))
+        self.assertEqual(sorted(cancelled), [False, False, True])
+        self.assertEqual(self.stock(), [5, 5])
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'cancelled')
+
+
+class AddToCartTests(TransactionTestCase):
+    """Adds of the same product variant to one cart at the same time"""
+
+    def setUp(self):
+        self.product, = create_products(1)
+        self.user, _ = create_customer('quick-clicker')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def add(self, quantity):
+        data = {'product_id': self.product.pk, 'quantity': quantity, 'selected_size': 'M'}
+        return lambda: post(add_to_cart, self.user, '/api/orders/cart/add/', data)
+
+    def test_concurrent_adds_top_up_one_line(self):
+        responses = run_concurrently(*(self.add(2) for _ in range(8)))
+        self.assertEqual([getattr(response, 'status_code', response) for response in responses], [200] * 8)
+        messages = Counter(response.data['message'] for response in responses)
+        self.assertEqual(messages, {'Item added to cart': 1, 'Cart item quantity updated': 7})
+        line = CartItem.objects.get(cart=self.cart)
+        self.assertEqual(line.quantity, 16)
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).version, 8)
+
+    def test_concurrent_adds_stop_at_the_cap(self):
+        responses = run_concurrently(*(self.add(30) for _ in range(5)))
+        self.assertEqual([getattr(response, 'status_code', response) for response in responses], [200] * 5)
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 99)
+        self.assertEqual(max(response.data['item']['quantity'] for response in responses), 99)
+
+    def test_new_and_topped_up_lines(self):
+        line, _ = add_item(self.cart.pk, self.product, 3)
+        self.assertTrue(line['created'])
+        line, _ = add_item(self.cart.pk, self.product, 3)
+        self.assertFalse(line['created'])
+        self.assertEqual(line['quantity'], 6)
+        line, _ = add_item(self.cart.pk, self.product, 3, selected_size='L')
+        self.assertTrue(line['created'])
@@ -0,0 +1,262 @@
+"""
+API views for the try-on app using Django REST Framework
+"""
+
+import base64
+import json
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from rest_framework import status
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from catalog.models import Product
+from . import assets, cache, engine, jobs
+from .models import TryOnJob
+
+# Products per batch try-on
+MAX_BATCH = getattr(settings, 'TRYON_MAX_BATCH', 12)
+
+
+def _int_param(data, name, default=None):
+    try:
+        return int(data.get(name, default))
+    except (TypeError, ValueError):
+        return None
+
+
+def _try_on_input(request):
+    """
+    The photo, product and garment image of a try-on request, or an error
+    Response: (photo, product, product_image, None) or (None, None, None, response).
+    """
+    photo = request.FILES.get('user_image')
+    product_id = _int_param(request.data, 'product_id')
+    image_index = _int_param(request.data, 'product_image_index', 0)
+    if photo is None or product_id is None or image_index is None:
+        return None, None, None, Response({
+            'error': 'user_image, product_id and a numeric product_image_index are required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if photo.size > engine.MAX_UPLOAD_BYTES:
+        return None, None, None, Response(
+            {'error': 'The photo is too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+    product = get_object_or_404(Product, pk=product_id, is_active=True)
+    if not product.is_try_on_enabled:
+        return None, None, None, Response(
+            {'error': 'This product does not support try-on'}, status=status.HTTP_400_BAD_REQUEST
+        )
+    product_image = assets.garment_image(product, image_index)
+    if product_image is None:
+        return None, None, None, Response(
+            {'error': 'This product has no image to try on'}, status=status.HTTP_400_BAD_REQUEST
+        )
+    return photo, product, product_image, None
+
+
+def _job_data(request, job):
+    data = {
+        'job_id': str(job.pk),
+        'status': job.status,
+        'status_url': request.build_absolute_uri(reverse('tryon:tryon_results', args=[job.pk])),
+        'product_id': job.product_id,
+    }
+    if job.status == 'pending':
+        data['position'] = jobs.position(job)
+    elif job.status == 'failed':
+        data['error'] = job.error
+    elif job.status == 'done':
+        data.update({
+            'result_image': request.build_absolute_uri(reverse('tryon:result_image', args=[job.pk])),
+            'width': job.width,
+            'height': job.height,
+            'confidence': job.confidence,
+            'timings': job.timings,
+        })
+    return data
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@parser_classes([MultiPartParser, FormParser])
+def process_tryon(request):
+    """
+    Put a product on the person in an uploaded photo, synchronously.
+    Takes `user_image` (file), `product_id` and optionally
+    `product_image_index`, the product image to use as the garment when the
+    product has no flagged garment image. The garment side is precomputed
+    (see tryon.assets), so a request only decodes, analyzes and composites
+    the photo. The app submits jobs instead (see submit_tryon).
+    Returns the result as a JPEG data URL with the detection confidence and
+    the time spent per stage.
+    """
+    photo, product, product_image, error = _try_on_input(request)
+    if error is not None:
+        return error
+    try:
+        garment = assets.garment_for(product_image, product.try_on_category)
+    except (OSError, ValueError):
+        return Response({'error': 'This product image cannot be used for try-on'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        result = engine.try_on(photo.read(), garment, product.pk)
+    except engine.TryOnError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    encoded = base64.b64encode(result['image']).decode('ascii')
+    return Response({
+        'result_image': f'data:{result["content_type"]};base64,{encoded}',
+        'width': result['width'],
+        'height': result['height'],
+        'confidence': result['confidence'],
+        'product_id': product.pk,
+        'try_on_category': product.try_on_category,
+        'timings': result['timings'],
+        'cached': result['cached'],
+    })
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@parser_classes([MultiPartParser, FormParser])
+def submit_tryon(request):
+    """
+    Queue a try-on and return its job right away (202), with the URL to poll.
+    Takes the same fields as process_tryon. Answers 429 with Retry-After when
+    the queue is full.
+    """
+    photo, product, product_image, error = _try_on_input(request)
+    if error is not None:
+        return error
+    try:
+        job = jobs.submit(photo.read(), product, product_image)
+    except jobs.QueueFull:
+        return Response(
+            {'error': 'Too many try-ons are in progress, please try again in a moment'},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(jobs.RETRY_AFTER)},
+        )
+    return Response(_job_data(request, job), status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def tryon_results(request, job_id):
+    """
+    Status of a try-on job: pending (with its position in the queue),
+    processing, failed (with the error) or done (with the result image URL,
+    confidence and timings). With `?wait=<seconds>` the request is held until
+    the job finishes or the time is up, capped at TRYON_MAX_WAIT (2s).
+    """
+    job = get_object_or_404(TryOnJob, pk=job_id)
+    try:
+        timeout = float(request.query_params.get('wait', 0))
+    except ValueError:
+        timeout = 0
+    if timeout > 0:
+        jobs.wait(job, timeout)
+    return Response(_job_data(request, job))
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def result_image(request, job_id):
+    """The JPEG of a finished try-on"""
+    job = get_object_or_404(TryOnJob, pk=job_id, status='done')
+    try:
+        return FileResponse(default_storage.open(job.result_path, 'rb'), content_type='image/jpeg')
+    except FileNotFoundError:
+        raise Http404('The try-on result has expired')
+
+
+def _batch_line(request, product, photo):
+    """One NDJSON line of a batch try-on: the result for `product`, or why there is none"""
+    if product is None:
+        return {'error': 'Product not found'}
+    if not product.is_try_on_enabled:
+        return {'error': 'This product does not support try-on'}
+    product_image = assets.garment_image(product)
+    if product_image is None:
+        return {'error': 'This product has no image to try on'}
+    try:
+        garment = assets.garment_for(product_image, product.try_on_category)
+    except (OSError, ValueError):
+        return {'error': 'This product image cannot be used for try-on'}
+    result = engine.dress(photo, garment, product.pk)
+    if result['key']:
+        url = request.build_absolute_uri(reverse('tryon:cached_result', args=[result['key']]))
+    else:
+        url = f'data:{result["content_type"]};base64,{base64.b64encode(result["image"]).decode("ascii")}'
+    return {
+        'result_image': url,
+        'width': result['width'],
+        'height': result['height'],
+        'confidence': result['confidence'],
+        'try_on_category': product.try_on_category,
+        'timings': result['timings'],
+        'cached': result['cached'],
+    }
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@parser_classes([MultiPartParser, FormParser])
+def batch_tryon(request):
+    """
+    Try several products on the person in one photo, e.g. for previews on a
+    product grid. Takes `user_image` (file) and `product_ids` (comma-separated
+    or repeated, up to MAX_BATCH); each product is tried on with its garment
+    image, as a preview of TRYON_PREVIEW_SIDE pixels.
+    The photo is decoded and analyzed once, and the response streams one JSON
+    line per product, in the order given, as each finishes:
+        {"product_id": 12, "result_image": "https://.../cached/<key>/", ...}
+        {"product_id": 13, "error": "This product does not support try-on"}
+    """
+    photo_file = request.FILES.get('user_image')
+    try:
+        product_ids = list(dict.fromkeys(
+            int(value) for field in request.data.getlist('product_ids') for value in field.split(',') if value.strip()
+        ))
+    except ValueError:
+        product_ids = None
+    if photo_file is None or not product_ids:
+        return Response({'error': 'user_image and numeric product_ids are required'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if len(product_ids) > MAX_BATCH:
+        return Response({'error': f'At most {MAX_BATCH} products can be tried on at once'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if photo_file.size > engine.MAX_UPLOAD_BYTES:
+        return Response({'error': 'The photo is too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    try:
+        photo = engine.load_photo(photo_file.read(), engine.PREVIEW_SIDE)
+    except engine.TryOnError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    products = Product.objects.filter(pk__in=product_ids, is_active=True).prefetch_related('images').in_bulk()
+
+    def lines():
+        for product_id in product_ids:
+            line = {'product_id': product_id, **_batch_line(request, products.get(product_id), photo)}
+            yield json.dumps(line) + '\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def cached_result(request, key):
+    """A try-on image from the result cache, as linked by batch_tryon"""
+    result = cache.get_result(key) if re.fullmatch('[0-9a-f]{32}', key) else None
+    if result is None:
+        raise Http404('The try-on result has expired')
+    response = HttpResponse(result['image'], content_type=result['content_type'])
+    patch_cache_control(response, private=True, max_age=cache.TTL)
+    return response
@@ -0,0 +1,147 @@
+"""
+Precomputed try-on assets of garment images.
+The product image flagged as a product's try-on garment is prepared once, in
+the background when it is uploaded (see catalog.image_jobs) or in bulk with
+`manage.py build_tryon_assets`: its cutout pyramid and alpha mask are written
+as .npy files and its anchors for every try-on category are kept in a manifest
+on the image. A try-on request then memory-maps the pyramid instead of
+decoding and keying the product photo.
+
+    {'source': 'products/shirt.jpg', 'hash': '9c1e...', 'version': 1,
+     'path': '9c/9c1e...', 'levels': [[768, 610], [384, 305], ...],
+     'anchors': {'tops': {'top': 0, 'shoulder': 41, ...}, 'bottoms': {...}, ...}}
+
+Files are named by a hash of the source content, so identical uploads share
+them. They live under TRYON_ASSET_ROOT, which has to be a local directory for
+memory-mapping; a host without the files (or an image without a manifest)
+falls back to preparing the garment in-process, once per worker.
+"""
+
+import hashlib
+import io
+import logging
+import os
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from . import garments
+
+ASSET_ROOT = getattr(settings, 'TRYON_ASSET_ROOT', os.path.join(settings.MEDIA_ROOT, 'tryon-assets'))
+CACHE_SIZE = getattr(settings, 'TRYON_GARMENT_CACHE_SIZE', 64)
+
+# Bump when the preparation changes so new assets get new names
+ASSET_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def is_current(manifest, field_file):
+    """Whether `manifest` was built (or failed) from the file in `field_file` by this version"""
+    return (
+        bool(manifest)
+        and manifest.get('source') == field_file.name
+        and manifest.get('version', ASSET_VERSION) == ASSET_VERSION
+    )
+
+
+def is_ready(manifest):
+    """Whether `manifest` has assets to load"""
+    return bool((manifest or {}).get('levels'))
+
+
+def _save(path, array):
+    # Written aside and renamed, so readers never map a half-written file
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(temporary, path)
+
+
+def generate(name, storage=None):
+    """
+    Prepare the garment in a stored image, write its files and return the
+    manifest. Raises OSError if the image can't be read and ValueError if no
+    garment can be found in it.
+    """
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as f:
+        data = f.read()
+    img = Image.open(io.BytesIO(data))
+    img.load()
+
+    digest = hashlib.sha256(data + f':v{ASSET_VERSION}:{garments.GARMENT_SIDE}'.encode()).hexdigest()[:32]
+    rgba = garments.cutout(img)
+    levels = garments.pyramid(garments.premultiply(rgba))
+
+    relative = f'{digest[:2]}/{digest}'
+    directory = os.path.join(ASSET_ROOT, relative)
+    os.makedirs(directory, exist_ok=True)
+    for n, level in enumerate(levels):
+        _save(os.path.join(directory, f'level{n}.npy'), level)
+    _save(os.path.join(directory, 'alpha.npy'), rgba[..., 3])
+
+    return {
+        'source': name,
+        'hash': digest,
+        'version': ASSET_VERSION,
+        'path': relative,
+        'levels': [list(level.shape[:2]) for level in levels],
+        'anchors': {category: garments.anchors(rgba[..., 3], category) for category in garments.CATEGORIES},
+    }
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _mapped_levels(relative, count):
+    directory = os.path.join(ASSET_ROOT, relative)
+    return tuple(np.load(os.path.join(directory, f'level{n}.npy'), mmap_mode='r') for n in range(count))
+
+
+def load(manifest, category):
+    """The prepared garment of a manifest, with its pyramid memory-mapped"""
+    return {
+        'category': category,
+        'version': manifest['hash'],
+        'levels': list(_mapped_levels(manifest['path'], len(manifest['levels']))),
+        'anchors': manifest['anchors'][category],
+    }
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _prepared(name, category):
+    with default_storage.open(name, 'rb') as f:
+        img = Image.open(io.BytesIO(f.read()))
+        img.load()
+    return {**garments.prepare_garment(img, category), 'version': f'{name}:v{ASSET_VERSION}'}
+
+
+def garment_image(product, index=0):
+    """
+    The image a product is tried on with: its flagged garment image, or else
+    the one at `index` in display order (as the API lists them). None if
+    there is no such image.
+    """
+    images = list(product.images.all())
+    for image in images:
+        if image.is_try_on_garment:
+            return image
+    return images[index] if 0 <= index < len(images) else None
+
+
+def garment_for(product_image, category):
+    """
+    The prepared garment of a ProductImage for a try-on category, from its
+    assets when they are built, with a `version` that changes with its
+    content (see tryon.cache). Raises OSError or ValueError if the image
+    can't be read or holds no garment.
+    """
+    manifest = product_image.try_on_assets
+    if is_current(manifest, product_image.image) and is_ready(manifest):
+        try:
+            return load(manifest, category)
+        except OSError:
+            logger.warning('Try-on assets %s are missing on this host', manifest['path'])
+    return _prepared(product_image.image.name, category)
@@ -0,0 +1,91 @@
+"""
+Synthetic inputs for the try-on benchmark commands.
+The person is drawn front-on against a soft gradient with some sensor noise,
+and garments are flat shapes on a white background like a catalog shot, so
+the engine has something realistic to key and fit without any fixture files.
+"""
+
+import io
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+SKIN = (224, 172, 140)
+HAIR = (60, 42, 30)
+
+GARMENT_COLORS = {
+    'tops': (40, 90, 160),
+    'bottoms': (50, 60, 90),
+    'dresses': (170, 40, 70),
+    'outerwear': (110, 80, 50),
+    'accessories': (30, 30, 30),
+}
+
+
+def synthetic_person(width, height, seed=0):
+    """RGB image of a person standing in the middle of the frame"""
+    rng = random.Random(seed)
+    gradient = np.linspace(205, 175, width, dtype=np.float32)[None, :, None]
+    noise = np.random.default_rng(seed).normal(0, 3, (height, width, 3)).astype(np.float32)
+    img = Image.fromarray(np.clip(gradient + noise, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(img)
+
+    unit = height / 9  # head length; the figure is cut off at the shins
+    cx = width * rng.uniform(0.45, 0.55)
+    top = 0.3 * unit
+    draw.ellipse([cx - 0.38 * unit, top, cx + 0.38 * unit, top + unit], fill=SKIN)
+    draw.chord([cx - 0.4 * unit, top - 0.05 * unit, cx + 0.4 * unit, top + 0.6 * unit], 180, 360, fill=HAIR)
+    draw.rectangle([cx - 0.16 * unit, top + 0.9 * unit, cx + 0.16 * unit, top + 1.45 * unit], fill=SKIN)
+    shirt = (200, 200, 190)
+    shoulders, waist, hips = top + 1.4 * unit, top + 3 * unit, top + 4 * unit
+    draw.polygon([
+        (cx - 0.95 * unit, shoulders), (cx + 0.95 * unit, shoulders),
+        (cx + 0.8 * unit, hips), (cx - 0.8 * unit, hips),
+    ], fill=shirt)
+    for side in (-1, 1):
+        draw.polygon([
+            (cx + side * 0.9 * unit, shoulders), (cx + side * 1.2 * unit, shoulders + 0.3 * unit),
+            (cx + side * 1.25 * unit, waist + 0.6 * unit), (cx + side * 0.98 * unit, waist + 0.6 * unit),
+        ], fill=SKIN)
+        inner, outer = sorted([cx + side * 0.1 * unit, cx + side * 0.72 * unit])
+        draw.rectangle([inner, hips, outer, height], fill=(70, 70, 80))
+    return img
+
+
+def synthetic_garment(category, width=600, seed=0):
+    """RGB catalog shot of a flat garment on white"""
+    rng = random.Random(seed)
+    height = int(width * (1.5 if category in ('dresses', 'bottoms') else 1.1))
+    img = Image.new('RGB', (width, height), (250, 250, 250))
+    draw = ImageDraw.Draw(img)
+    color = tuple(min(255, c + rng.randrange(-15, 16)) for c in GARMENT_COLORS[category])
+    w, h = width, height
+
+    if category in ('tops', 'outerwear'):
+        draw.polygon([
+            (0.3 * w, 0.06 * h), (0.7 * w, 0.06 * h), (0.95 * w, 0.25 * h), (0.85 * w, 0.35 * h),
+            (0.75 * w, 0.3 * h), (0.75 * w, 0.94 * h), (0.25 * w, 0.94 * h), (0.25 * w, 0.3 * h),
+            (0.15 * w, 0.35 * h), (0.05 * w, 0.25 * h),
+        ], fill=color)
+        draw.ellipse([0.42 * w, 0.02 * h, 0.58 * w, 0.12 * h], fill=(250, 250, 250))
+    elif category == 'dresses':
+        draw.polygon([
+            (0.35 * w, 0.04 * h), (0.65 * w, 0.04 * h), (0.7 * w, 0.35 * h),
+            (0.88 * w, 0.95 * h), (0.12 * w, 0.95 * h), (0.3 * w, 0.35 * h),
+        ], fill=color)
+    elif category == 'bottoms':
+        draw.polygon([
+            (0.28 * w, 0.04 * h), (0.72 * w, 0.04 * h), (0.78 * w, 0.96 * h), (0.54 * w, 0.96 * h),
+            (0.5 * w, 0.3 * h), (0.46 * w, 0.96 * h), (0.22 * w, 0.96 * h),
+        ], fill=color)
+    else:
+        draw.ellipse([0.15 * w, 0.2 * h, 0.85 * w, 0.6 * h], fill=color)
+        draw.rectangle([0.05 * w, 0.5 * h, 0.95 * w, 0.6 * h], fill=color)
+    return img
+
+
+def jpeg_bytes(img, quality=90):
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
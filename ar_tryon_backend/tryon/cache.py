@@ -0,0 +1,176 @@
+"""
+Local disk cache of try-on results and person analyses.
+Users try garments on the same selfie over and over, switching between
+products and coming back, so tryon.engine keeps two kinds of entries under
+TRYON_CACHE_ROOT:
+
+    person/<photo>.json                 landmarks of the person in a photo
+    results/<key>.jpg, <key>.json       a finished try-on and its metadata
+
+<photo> is an exact content hash of the normalized photo's pixels (decoded,
+upright and downscaled, as the engine sees it). Uploading the same file again,
+or one that differs only in metadata, hits; a lossy re-encode changes the
+pixels and misses. A result key adds the product, the garment asset
+version (the content hash of its prepared garment and category) and the
+output size. Switching garments on a photo skips the person analysis;
+coming back to a garment skips the render too.
+
+Reading an entry touches it; entries unused for TRYON_CACHE_TTL seconds
+expire, and prune() removes the least recently used ones while the directory
+is over TRYON_CACHE_MAX_BYTES. The try-on workers run it with their purge of
+expired jobs; a process writing entries itself (the synchronous try-on and
+batch endpoints) starts it in a background thread at most every
+TRYON_CACHE_PRUNE_INTERVAL seconds, so the request that wrote never waits
+for it. Every process on a host shares the directory; writes are atomic
+renames, so readers never see a partial entry.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+CACHE_ROOT = getattr(settings, 'TRYON_CACHE_ROOT', os.path.join(settings.MEDIA_ROOT, 'tryon-cache'))
+ENABLED = getattr(settings, 'TRYON_CACHE_ENABLED', True)
+MAX_BYTES = getattr(settings, 'TRYON_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+TTL = getattr(settings, 'TRYON_CACHE_TTL', 24 * 3600)
+# Least seconds between background prunes started by writes
+PRUNE_INTERVAL = getattr(settings, 'TRYON_CACHE_PRUNE_INTERVAL', 300)
+
+logger = logging.getLogger(__name__)
+
+_prune_lock = threading.Lock()
+_pruned_at = None
+
+
+def photo_hash(pixels):
+    """Content hash of a normalized photo, as a uint8 array"""
+    # SHA-256 is hardware-accelerated on current CPUs, faster than BLAKE2 here
+    digest = hashlib.sha256(f'{pixels.shape}:'.encode())
+    digest.update(memoryview(np.ascontiguousarray(pixels)).cast('B'))
+    return digest.hexdigest()[:32]
+
+
+def result_key(photo, product_id, garment, size):
+    """Key of the try-on of `garment` (which must have a version) on a photo, at `size`"""
+    key = f'{photo}:{product_id}:{garment["version"]}:{garment["category"]}:{size[0]}x{size[1]}'
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def _path(kind, key, extension):
+    return os.path.join(CACHE_ROOT, kind, key[:2], f'{key}.{extension}')
+
+
+def _read(path, mode='r'):
+    """Contents of a live entry file (touched as used), or None"""
+    try:
+        if time.time() - os.stat(path).st_mtime > TTL:
+            return None
+        with open(path, mode) as f:
+            data = f.read()
+        os.utime(path)
+        return data
+    except OSError:
+        return None
+
+
+def _write(path, data, mode='w'):
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, mode) as f:
+            f.write(data)
+        os.replace(temporary, path)
+    except OSError:
+        # A full or read-only disk only costs the cache
+        logger.warning('Could not write try-on cache entry %s', path, exc_info=True)
+
+
+def _prune_in_background():
+    try:
+        prune()
+    except Exception:
+        logger.exception('Could not prune the try-on cache')
+    finally:
+        _prune_lock.release()
+
+
+def _schedule_prune():
+    """Prune in a background thread unless one is running or ran within PRUNE_INTERVAL"""
+    global _pruned_at
+    if _pruned_at is not None and time.monotonic() - _pruned_at < PRUNE_INTERVAL:
+        return
+    if not _prune_lock.acquire(blocking=False):
+        return
+    _pruned_at = time.monotonic()
+    threading.Thread(target=_prune_in_background, name='tryon-cache-prune', daemon=True).start()
+
+
+def get_person(photo):
+    """Cached landmarks of the person in a photo, or None"""
+    data = _read(_path('person', photo, 'json'))
+    return json.loads(data) if data else None
+
+
+def put_person(photo, body):
+    _write(_path('person', photo, 'json'), json.dumps(body))
+    _schedule_prune()
+
+
+def get_result(key):
+    """
+    Cached try-on result: {'image', 'content_type', 'width', 'height',
+    'confidence'}, or None.
+    """
+    meta = _read(_path('results', key, 'json'))
+    if not meta:
+        return None
+    image = _read(_path('results', key, 'jpg'), 'rb')
+    if image is None:
+        return None
+    return {'image': image, **json.loads(meta)}
+
+
+def put_result(key, result):
+    # The image first, so a reader that finds the metadata finds the image
+    _write(_path('results', key, 'jpg'), result['image'], 'wb')
+    meta = {name: result[name] for name in ('content_type', 'width', 'height', 'confidence')}
+    _write(_path('results', key, 'json'), json.dumps(meta))
+    _schedule_prune()
+
+
+def prune(now=None):
+    """
+    Remove expired entries, then the least recently used until the cache is
+    within MAX_BYTES. Returns (files removed, bytes left).
+    """
+    now = now or time.time()
+    entries = []
+    for directory, _, names in os.walk(CACHE_ROOT):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        if total <= MAX_BYTES and now - mtime <= TTL:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed, total
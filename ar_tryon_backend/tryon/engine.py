@@ -0,0 +1,281 @@
+"""
+CPU try-on engine.
+A request decodes the user's photo, finds the body (see tryon.person), warps
+a prepared garment (see tryon.garments and tryon.assets) onto it and
+alpha-composites the result, all with NumPy and Pillow.
+
+The warp maps the garment's anchor rows to body landmarks, piecewise linearly
+(e.g. for a top: collar to neck, shoulder seam to shoulders, hem to hips), and
+scales its width so the fitting width matches the body. Both mappings are
+separable, so the garment is resampled with two bilinear passes over the
+target rectangle only, from the pyramid level closest above the target size,
+and only that rectangle of the photo is touched by the composite.
+
+A photo is decoded and analyzed once however many garments are tried on it:
+each garment is composited onto the shared photo, encoded, and its rectangle
+restored before the next one (see load_photo() and dress()).
+"""
+
+import io
+import time
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from . import cache, person
+
+MAX_PHOTO_SIDE = getattr(settings, 'TRYON_MAX_PHOTO_SIDE', 1920)
+# Longest side of batch try-on previews (see api_views.batch_tryon)
+PREVIEW_SIDE = getattr(settings, 'TRYON_PREVIEW_SIDE', 640)
+MAX_UPLOAD_BYTES = getattr(settings, 'TRYON_MAX_UPLOAD_BYTES', 10 * 1024 * 1024)
+JPEG_QUALITY = getattr(settings, 'TRYON_JPEG_QUALITY', 85)
+
+# Extra width over the body, per category, so garments don't look painted on
+EASE = {'tops': 1.08, 'outerwear': 1.18, 'dresses': 1.08, 'bottoms': 1.05, 'accessories': 1.1}
+# How far below the hips outerwear reaches, in head lengths
+OUTERWEAR_DROP = 0.6
+# Width of the chest relative to the shoulders measured with the arms
+CHEST_SHARE = 0.75
+
+
+class TryOnError(Exception):
+    """A try-on that can't be done with the given input"""
+
+
+def decode_photo(data, max_side=MAX_PHOTO_SIDE):
+    """
+    The user's photo as an upright RGB PIL image no larger than `max_side`.
+    JPEGs are decoded at reduced scale when they are much larger than that.
+    """
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise TryOnError('The photo is too large')
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft('RGB', (max_side, max_side))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise TryOnError('Could not read the photo')
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.BILINEAR)
+    return img
+
+
+def placement(garment, body, width, height):
+    """
+    How the garment lands on a width x height photo:
+    (source rows, target rows, scale, target center x, garment center x).
+    Source row source[i] of the garment goes to target row target[i].
+    """
+    a = garment['anchors']
+    category = garment['category']
+    head = body['head'] * height
+
+    def row(name):
+        return body[name] * height
+
+    if category in ('tops', 'outerwear', 'dresses'):
+        scale = body['shoulder_width'] * width * EASE[category] / a['width']
+        hem = {
+            'tops': row('hip'),
+            'outerwear': row('hip') + OUTERWEAR_DROP * head,
+            'dresses': row('knee'),
+        }[category]
+        if a['shoulder'] - a['top'] > 0.02 * (a['hem'] - a['top']):
+            source = [a['top'], a['shoulder']]
+            target = [row('neck'), row('shoulder')]
+        else:
+            # No collar or sleeves above the shoulder line, e.g. a strapless
+            # dress: it starts at the shoulders and spans the chest, not the arms
+            scale *= CHEST_SHARE
+            source = [a['top']]
+            target = [row('shoulder')]
+        if a.get('waist') is not None:
+            source.append(a['waist'])
+            target.append(row('waist'))
+        source.append(a['hem'])
+        target.append(hem)
+    elif category == 'bottoms':
+        scale = body['hip_width'] * width * EASE[category] / a['width']
+        source = [a['top'], a['hem']]
+        target = [row('waist'), row('ankle')]
+    else:
+        scale = body['head_width'] * width * EASE[category] / a['width']
+        source = [a['top'], a['hem']]
+        target = [row('top'), row('top') + (a['hem'] - a['top']) * scale]
+    # np.interp needs increasing target rows
+    target = np.maximum.accumulate(np.asarray(target, dtype=np.float64) + np.arange(len(target)) * 1e-3)
+    return np.asarray(source, dtype=np.float64), target, scale, body['center_x'] * width, a['center_x']
+
+
+def warp(garment, body, width, height):
+    """
+    The garment resampled into photo coordinates, as a float32 premultiplied
+    RGBA patch and the photo position (x, y) of its top left corner; None if
+    it falls outside the photo.
+    """
+    levels = garment['levels']
+    gh, gw, _ = levels[0].shape
+    source, target, scale, center_x, garment_center_x = placement(garment, body, width, height)
+
+    y0, y1 = max(0, int(np.floor(target[0]))), min(height, int(np.ceil(target[-1])))
+    x0 = max(0, int(np.floor(center_x - garment_center_x * scale)))
+    x1 = min(width, int(np.ceil(center_x + (gw - garment_center_x) * scale)))
+    if y1 <= y0 or x1 <= x0:
+        return None
+
+    # Source coordinates of the target pixel centres
+    sy = np.interp(np.arange(y0, y1) + 0.5, target, source) - 0.5
+    sx = garment_center_x + (np.arange(x0, x1) + 0.5 - center_x) / scale - 0.5
+    outside = (sx < -0.5) | (sx > gw - 0.5)
+
+    # Sample the smallest level that is still at least the target size
+    n = min(len(levels) - 1, max(0, int(np.floor(np.log2(1 / scale))))) if scale < 1 else 0
+    pixels = levels[n]
+    if n:
+        sy = (sy + 0.5) * pixels.shape[0] / gh - 0.5
+        sx = (sx + 0.5) * pixels.shape[1] / gw - 0.5
+        gh, gw, _ = pixels.shape
+    sy = np.clip(sy, 0, gh - 1)
+    sx = np.clip(sx, 0, gw - 1)
+    top, left = np.floor(sy).astype(np.intp), np.floor(sx).astype(np.intp)
+    bottom, right = np.minimum(top + 1, gh - 1), np.minimum(left + 1, gw - 1)
+    fy = (sy - top).astype(np.float32)[:, None, None]
+    fx = (sx - left).astype(np.float32)[None, :, None]
+
+    rows = pixels[top].astype(np.float32)
+    rows += (pixels[bottom].astype(np.float32) - rows) * fy
+    patch = rows[:, left]
+    patch += (rows[:, right] - patch) * fx
+    patch[:, outside] = 0
+    return patch, x0, y0
+
+
+def composite(photo, patch, x, y):
+    """Alpha-composite a premultiplied float32 patch onto a uint8 RGB array in place"""
+    h, w, _ = patch.shape
+    region = photo[y:y + h, x:x + w]
+    alpha = patch[..., 3:] * (1 / 255)
+    blended = patch[..., :3] + region.astype(np.float32) * (1 - alpha)
+    np.clip(blended + 0.5, 0, 255, out=blended)
+    region[...] = blended.astype(np.uint8)
+
+
+def render(photo, body, garment):
+    """
+    Put the garment on a uint8 RGB photo array, in place. Returns what is
+    needed to take it off again with restore(): the pixels it covered and
+    their position, or None if it fell outside the photo.
+    """
+    height, width, _ = photo.shape
+    warped = warp(garment, body, width, height)
+    if warped is None:
+        return None
+    patch, x, y = warped
+    covered = photo[y:y + patch.shape[0], x:x + patch.shape[1]].copy()
+    composite(photo, patch, x, y)
+    return covered, x, y
+
+
+def restore(photo, rendered):
+    """Undo a render()"""
+    if rendered is not None:
+        covered, x, y = rendered
+        photo[y:y + covered.shape[0], x:x + covered.shape[1]] = covered
+
+
+def encode_jpeg(img):
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=False)
+    return buffer.getvalue()
+
+
+def _timer(timings):
+    started = time.perf_counter()
+
+    def lap(stage):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = round((now - started) * 1000, 1)
+        started = now
+    return lap
+
+
+def load_photo(data, max_side=MAX_PHOTO_SIDE, use_cache=True):
+    """
+    Decode a photo for one or more try-ons (see dress()):
+    {'pixels' (uint8 RGB array), 'hash' (None without cache), 'body' (None
+    until analyzed), 'timings'}.
+    Raises TryOnError if the photo can't be read.
+    """
+    timings = {}
+    lap = _timer(timings)
+    pixels = np.array(decode_photo(data, max_side))
+    lap('decode')
+    photo_hash = None
+    if use_cache and cache.ENABLED:
+        photo_hash = cache.photo_hash(pixels)
+        lap('hash')
+    return {'pixels': pixels, 'hash': photo_hash, 'body': None, 'timings': timings}
+
+
+def dress(photo, garment, product_id=None):
+    """
+    Put a prepared garment on the person in a loaded photo.
+    Returns {'image' (JPEG bytes), 'content_type', 'width', 'height',
+    'confidence', 'timings' (milliseconds per stage), 'cached', 'key'}.
+    The person is analyzed on the first call for a photo (or found in the
+    cache by the photo hash), and the garment is taken off the photo again
+    after encoding, so any number of garments can be tried on one photo.
+    With a photo hash and a garment version the result is cached under
+    `key` (None otherwise); `cached` tells whether it came from the cache.
+    """
+    timings = {}
+    lap = _timer(timings)
+    pixels = photo['pixels']
+    height, width, _ = pixels.shape
+    key = None
+    if photo['hash'] and garment.get('version'):
+        key = cache.result_key(photo['hash'], product_id, garment, (width, height))
+        hit = cache.get_result(key)
+        if hit is not None:
+            lap('cache')
+            return {**hit, 'timings': timings, 'cached': True, 'key': key}
+
+    if photo['body'] is None:
+        body = cache.get_person(photo['hash']) if photo['hash'] else None
+        if body is None:
+            body = person.analyze_person(Image.fromarray(pixels))
+            if photo['hash']:
+                cache.put_person(photo['hash'], body)
+        photo['body'] = body
+        lap('analyze')
+    rendered = render(pixels, photo['body'], garment)
+    lap('render')
+    try:
+        result = {
+            'image': encode_jpeg(Image.fromarray(pixels)),
+            'content_type': 'image/jpeg',
+            'width': width,
+            'height': height,
+            'confidence': photo['body']['confidence'],
+        }
+    finally:
+        restore(pixels, rendered)
+    lap('encode')
+    if key:
+        cache.put_result(key, result)
+    return {**result, 'timings': timings, 'cached': False, 'key': key}
+
+
+def try_on(data, garment, product_id=None, use_cache=True):
+    """
+    Put a prepared garment on the person in an encoded photo (see dress()).
+    Unless `use_cache` is false the person analysis is cached per photo, and
+    the result too when the garment has a version (see tryon.cache).
+    Raises TryOnError if the photo can't be read.
+    """
+    photo = load_photo(data, use_cache=use_cache)
+    result = dress(photo, garment, product_id)
+    result['timings'] = {**photo['timings'], **result['timings']}
+    return result
@@ -0,0 +1,133 @@
+"""
+Garment preparation for try-on.
+A product photo is turned once into what every try-on of it needs: the garment
+cut out of its background as premultiplied RGBA, halved repeatedly into a
+pyramid so small fits sample a level close to their size, and anchor rows that
+tell the engine which part of the garment goes where on the body. Prepared
+garments are stored and loaded by tryon.assets.
+
+Anchors are in pixels of the cutout:
+
+    {'top': 0, 'shoulder': 41, 'waist': 380, 'hem': 702, 'center_x': 310.5, 'width': 498}
+
+`waist` is None for garments without a fitted waist. `width` is the
+garment's width at the row it is fitted by: the shoulders for tops, outerwear
+and dresses, the waistband for bottoms, the widest row for accessories.
+"""
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageFilter, ImageOps
+
+from .masks import clean, fill_holes, key_out, row_extents
+
+# Longest side of a prepared garment
+GARMENT_SIDE = getattr(settings, 'TRYON_GARMENT_SIDE', 768)
+# Pyramid levels stop before either side would drop below this
+MIN_LEVEL_SIDE = 64
+
+CATEGORIES = ('tops', 'bottoms', 'dresses', 'outerwear', 'accessories')
+# Categories fitted at the shoulders
+UPPER_BODY = ('tops', 'outerwear', 'dresses')
+# The shoulder seam is the first row this wide relative to the widest row of
+# the upper third (which for most tops runs across the sleeves)
+SHOULDER_SHARE = 0.75
+# A top or dress has a fitted waist if its narrowest row is this much narrower
+# than the median width of its body
+WAIST_SHARE = 0.9
+
+
+def cutout(img):
+    """
+    RGBA array (uint8, straight alpha) of the garment in a PIL image, cropped
+    to the garment. Images with transparency keep their own alpha; others
+    are keyed against the colour of their border, as product shots on a
+    plain background are.
+    """
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((GARMENT_SIDE, GARMENT_SIDE), Image.LANCZOS)
+    rgba = img.convert('RGBA')
+    alpha = np.asarray(rgba.getchannel('A'))
+    if alpha.min() == 255:
+        rgb = np.asarray(rgba.convert('RGB'), dtype=np.float32)
+        border = np.concatenate([rgb[0], rgb[-1], rgb[:, 0], rgb[:, -1]])
+        background = np.median(border, axis=0)
+        noise = float(np.median(np.abs(border - background).max(axis=1)))
+        mask = fill_holes(clean(key_out(rgb, background, noise)))
+        # Soften the keyed edge by a pixel so it doesn't look cut with scissors
+        alpha = np.asarray(
+            Image.fromarray(mask.astype(np.uint8) * 255).filter(ImageFilter.GaussianBlur(0.8))
+        )
+    bbox = Image.fromarray(alpha).point(lambda a: 255 if a > 16 else 0).getbbox()
+    if bbox is None:
+        raise ValueError('No garment found in the image')
+    pixels = np.array(rgba)
+    pixels[..., 3] = alpha
+    left, upper, right, lower = bbox
+    return pixels[upper:lower, left:right]
+
+
+def premultiply(rgba):
+    """uint8 RGBA with the colour multiplied by alpha, for correct interpolation"""
+    pixels = rgba.astype(np.uint16)
+    pixels[..., :3] = (pixels[..., :3] * pixels[..., 3:4] + 127) // 255
+    return pixels.astype(np.uint8)
+
+
+def pyramid(pixels):
+    """[pixels, half size, quarter size, ...] by 2x2 box averaging of premultiplied RGBA"""
+    levels = [pixels]
+    while min(levels[-1].shape[:2]) >= 2 * MIN_LEVEL_SIDE:
+        level = levels[-1]
+        h, w = level.shape[0] // 2 * 2, level.shape[1] // 2 * 2
+        quads = level[:h, :w].astype(np.uint16)
+        summed = quads[0::2, 0::2] + quads[1::2, 0::2] + quads[0::2, 1::2] + quads[1::2, 1::2]
+        levels.append(((summed + 2) // 4).astype(np.uint8))
+    return levels
+
+
+def anchors(alpha, category):
+    """Anchor rows and fitting width of a garment from its alpha channel"""
+    counts, left, right = row_extents(alpha > 127)
+    rows = np.flatnonzero(counts)
+    top, hem = int(rows[0]), int(rows[-1])
+    widths = np.where(counts > 0, right - left + 1, 0)
+    center_x = float(np.median((left[rows] + right[rows] + 1) / 2))
+
+    shoulder = top
+    waist = None
+    if category in UPPER_BODY:
+        upper = widths[top:top + max(1, (hem - top) // 3)]
+        shoulder = top + int(np.flatnonzero(upper >= SHOULDER_SHARE * upper.max())[0])
+        width = int(widths[shoulder])
+        # A fitted waist: the narrowest row of the body, if it is clearly narrower
+        start, stop = shoulder + (hem - shoulder) // 4, hem - (hem - shoulder) // 10
+        if stop > start:
+            body = widths[start:stop]
+            if body.min() < WAIST_SHARE * np.median(body):
+                waist = start + int(np.argmin(body))
+    elif category == 'bottoms':
+        waist = top
+        width = int(widths[min(top + 2, hem)])
+    else:
+        width = int(widths.max())
+    return {
+        'top': top, 'shoulder': shoulder, 'waist': waist, 'hem': hem,
+        'center_x': center_x, 'width': max(width, 1),
+    }
+
+
+def prepare_garment(img, category):
+    """
+    Prepared garment for a PIL image:
+    {'category', 'levels' (pyramid of premultiplied uint8 RGBA arrays), 'anchors'}
+    Anchors are in pixels of the first level.
+    """
+    if category not in CATEGORIES:
+        raise ValueError(f'Unknown try-on category {category!r}')
+    rgba = cutout(img)
+    return {
+        'category': category,
+        'levels': pyramid(premultiply(rgba)),
+        'anchors': anchors(rgba[..., 3], category),
+    }
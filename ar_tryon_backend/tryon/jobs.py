@@ -0,0 +1,228 @@
+"""
+Database-backed queue for try-on requests.
+Submitting a try-on stores the photo and records a TryOnJob; the decode,
+analysis, warp and encode run in `manage.py run_tryon_worker` processes, so a
+web worker is only held for the upload. Workers claim jobs with a conditional
+UPDATE as catalog.image_jobs does, and a job whose worker died is run again
+after LOCK_TIMEOUT, up to MAX_ATTEMPTS times.
+
+The queue is bounded: once MAX_QUEUED jobs are waiting, submit raises
+QueueFull and the API answers 429, so a burst is turned away quickly instead
+of piling up behind the workers. Clients poll for the result, which is kept
+for RESULT_TTL seconds; a poll may wait up to MAX_WAIT seconds for a job that
+is about to finish, but no longer, so polling never holds a web worker for
+the whole queue time.
+
+With TRYON_JOBS_EAGER = True jobs run in-process right after the transaction
+that queued them commits, for tests and local development without a worker.
+"""
+
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import assets, cache, engine
+from .models import TryOnJob
+
+EAGER = getattr(settings, 'TRYON_JOBS_EAGER', False)
+# Pending jobs beyond which new submissions are refused
+MAX_QUEUED = getattr(settings, 'TRYON_MAX_QUEUED_JOBS', 32)
+# Seconds a refused client is told to wait
+RETRY_AFTER = getattr(settings, 'TRYON_RETRY_AFTER', 2)
+MAX_ATTEMPTS = getattr(settings, 'TRYON_JOB_MAX_ATTEMPTS', 2)
+# A job still processing after this long is assumed lost with its worker
+LOCK_TIMEOUT = timedelta(seconds=getattr(settings, 'TRYON_JOB_LOCK_TIMEOUT', 60))
+# Seconds results (and jobs nobody ran) are kept
+RESULT_TTL = getattr(settings, 'TRYON_RESULT_TTL', 3600)
+# Longest a poll may wait for a job to finish, and how often it checks
+MAX_WAIT = getattr(settings, 'TRYON_MAX_WAIT', 2)
+WAIT_INTERVAL = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Too many try-ons are waiting; the client should retry later"""
+
+
+def submit(data, product, product_image):
+    """
+    Store the photo and queue a try-on of `product_image` on it.
+    Raises QueueFull if MAX_QUEUED jobs are already waiting.
+    """
+    pending = TryOnJob.objects.filter(status='pending')
+    if pending.count() >= MAX_QUEUED:
+        raise QueueFull()
+    job = TryOnJob(product=product, product_image=product_image, input_hash=hashlib.sha256(data).hexdigest())
+    job.input_path = default_storage.save(f'tryon/inputs/{job.id.hex}', ContentFile(data))
+    job.save()
+    # Concurrent submissions can all pass the check above. Counting again
+    # after the insert, whichever of them counts last sees all the others, so
+    # the jobs kept never exceed MAX_QUEUED (a burst may refuse a few more).
+    if pending.count() > MAX_QUEUED:
+        TryOnJob.objects.filter(pk=job.pk).delete()
+        default_storage.delete(job.input_path)
+        raise QueueFull()
+    if EAGER:
+        transaction.on_commit(run_pending)
+    return job
+
+
+def position(job):
+    """How many pending jobs are ahead of `job`"""
+    return TryOnJob.objects.filter(status='pending', created_at__lt=job.created_at).count()
+
+
+def wait(job, timeout):
+    """Refresh `job` until it is done or failed, for up to `timeout` seconds (capped at MAX_WAIT)"""
+    deadline = time.monotonic() + min(max(timeout, 0), MAX_WAIT)
+    while job.status in ('pending', 'processing') and time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        job.refresh_from_db()
+    return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def requeue_stale(now=None):
+    """Put jobs whose worker stopped responding back in the queue, or fail them after MAX_ATTEMPTS"""
+    now = now or timezone.now()
+    stale = TryOnJob.objects.filter(status='processing', locked_at__lt=now - LOCK_TIMEOUT)
+    stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status='failed', error='The try-on could not be processed', locked_by='', locked_at=None, finished_at=now
+    )
+    return stale.update(status='pending', locked_by='', locked_at=None)
+
+
+def claim(worker, limit=1):
+    """
+    Mark up to `limit` pending jobs, oldest first, as processing by `worker`
+    and return them.
+    """
+    now = timezone.now()
+    requeue_stale(now)
+    due = list(
+        TryOnJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True)[:limit]
+    )
+    if not due:
+        return []
+    token = f'{worker}:{uuid.uuid4().hex[:8]}'
+    TryOnJob.objects.filter(pk__in=due, status='pending').update(
+        status='processing', locked_by=token, locked_at=now, attempts=F('attempts') + 1
+    )
+    return list(
+        TryOnJob.objects.filter(locked_by=token, status='processing')
+        .select_related('product', 'product_image').order_by('created_at')
+    )
+
+
+def process(job):
+    """Run the try-on of a claimed job and return the fields to store on it"""
+    try:
+        garment = assets.garment_for(job.product_image, job.product.try_on_category)
+    except (OSError, ValueError):
+        raise engine.TryOnError('This product image cannot be used for try-on')
+    with default_storage.open(job.input_path, 'rb') as f:
+        data = f.read()
+    result = engine.try_on(data, garment, job.product_id)
+    return {
+        'result_path': default_storage.save(f'tryon/results/{job.id.hex}.jpg', ContentFile(result['image'])),
+        'width': result['width'],
+        'height': result['height'],
+        'confidence': result['confidence'],
+        'timings': result['timings'],
+    }
+
+
+def _finish(job, **fields):
+    # Guarded by the claim token in case the job was requeued as stale
+    return TryOnJob.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        locked_by='', locked_at=None, finished_at=timezone.now(), **fields
+    )
+
+
+def run_job(job):
+    """Process a claimed job and record the outcome. Returns the new status."""
+    try:
+        fields = process(job)
+    except engine.TryOnError as exc:
+        status, fields = 'failed', {'error': str(exc)}
+    except Exception:
+        logger.exception('Try-on job %s failed', job.pk)
+        status, fields = 'failed', {'error': 'The try-on could not be processed'}
+    else:
+        status = 'done'
+        fields['timings']['queued'] = round((job.locked_at - job.created_at).total_seconds() * 1000, 1)
+    if _finish(job, status=status, **fields):
+        default_storage.delete(job.input_path)
+    elif 'result_path' in fields:
+        # Requeued as stale meanwhile; the worker running it now stores its own
+        default_storage.delete(fields['result_path'])
+    return status
+
+
+def purge_expired(now=None):
+    """Delete jobs older than RESULT_TTL with their files. Returns the count."""
+    now = now or timezone.now()
+    expired = TryOnJob.objects.filter(created_at__lt=now - timedelta(seconds=RESULT_TTL)).exclude(status='processing')
+    purged = 0
+    for pk, input_path, result_path in list(expired.values_list('pk', 'input_path', 'result_path')):
+        for name in (input_path, result_path):
+            if name:
+                default_storage.delete(name)
+        purged += TryOnJob.objects.filter(pk=pk).delete()[0]
+    return purged
+
+
+def run_pending(worker=None, limit=None):
+    """Run pending jobs in this process until none are left (or `limit` ran). Returns the count."""
+    worker = worker or worker_name()
+    ran = 0
+    while limit is None or ran < limit:
+        jobs = claim(worker)
+        if not jobs:
+            break
+        for job in jobs:
+            run_job(job)
+            ran += 1
+    return ran
+
+
+def work(worker=None, poll=0.1, once=False, purge_every=60):
+    """
+    Worker loop: claim and run jobs one at a time, sleeping `poll` seconds
+    when the queue is empty, and purging expired jobs (and pruning the result
+    cache) every `purge_every` seconds. With `once` it returns as soon as the
+    queue is empty.
+    """
+    worker = worker or worker_name()
+    ran = 0
+    purged_at = 0.0
+    while True:
+        close_old_connections()
+        if time.monotonic() - purged_at > purge_every:
+            purge_expired()
+            cache.prune()
+            purged_at = time.monotonic()
+        jobs = claim(worker)
+        if not jobs:
+            if once:
+                return ran
+            time.sleep(poll)
+            continue
+        for job in jobs:
+            run_job(job)
+            ran += 1
@@ -0,0 +1,106 @@
+"""
+Django management command to benchmark the try-on engine.
+It prepares one synthetic garment per try-on category, compares that with
+loading its precomputed assets (what a request pays per garment on a cold
+worker), and then times full try-on requests on synthetic 720p and 1080p
+photos, with the median time of each stage. Finally it times 1080p try-ons
+served from the result cache and with only the person analysis cached (a
+garment switch on the same photo).
+"""
+
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+
+from catalog.benchmarking import time_calls, percentile
+from tryon import assets, cache, engine, garments
+from tryon.benchmarking import synthetic_garment, synthetic_person, jpeg_bytes
+
+RESOLUTIONS = {'720p': (1280, 720), '1080p': (1920, 1080)}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark p50/p95 latency of try-on requests at 720p and 1080p'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Timed try-ons per resolution and category (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        prepared = {}
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        try:
+            for category in garments.CATEGORIES:
+                img = synthetic_garment(category)
+                started = time.perf_counter()
+                prepared[category] = garments.prepare_garment(img, category)
+                prepare_ms = (time.perf_counter() - started) * 1000
+
+                manifest = assets.generate(storage.save(f'{category}.jpg', ContentFile(jpeg_bytes(img))), storage)
+                assets._mapped_levels.cache_clear()
+                started = time.perf_counter()
+                assets.load(manifest, category)
+                load_ms = (time.perf_counter() - started) * 1000
+                shutil.rmtree(os.path.join(assets.ASSET_ROOT, manifest['path']))
+                self.stdout.write(
+                    f'  garment {category:<12} prepare={prepare_ms:.1f}ms load precomputed={load_ms:.2f}ms'
+                )
+        finally:
+            shutil.rmtree(storage.location)
+
+        for label, (width, height) in RESOLUTIONS.items():
+            photo = jpeg_bytes(synthetic_person(width, height))
+            all_timings = []
+            for category, garment in prepared.items():
+                stages = []
+                timings = time_calls(lambda: stages.append(engine.try_on(photo, garment, use_cache=False)['timings']), options['repeat'])
+                all_timings.extend(timings)
+                breakdown = ' '.join(
+                    f'{stage}={statistics.median(run[stage] for run in stages):.1f}'
+                    for stage in stages[0]
+                )
+                self.stdout.write(
+                    f'  {label:<5} {category:<12} p50={percentile(timings, 50):.1f}ms '
+                    f'p95={percentile(timings, 95):.1f}ms  ({breakdown})'
+                )
+            all_timings.sort()
+            self.stdout.write(self.style.SUCCESS(
+                f'{label}: overall p50={percentile(all_timings, 50):.1f}ms p95={percentile(all_timings, 95):.1f}ms'
+            ))
+
+        self._benchmark_cache(prepared['tops'], options['repeat'])
+
+    def _benchmark_cache(self, garment, repeat):
+        photo = jpeg_bytes(synthetic_person(*RESOLUTIONS['1080p'], seed=1))
+        versioned = {**garment, 'version': 'benchmark'}
+        engine.try_on(photo, versioned)
+        cases = {
+            'uncached': lambda: engine.try_on(photo, garment, use_cache=False),
+            'person cached': lambda: engine.try_on(photo, garment),
+            'result cached': lambda: engine.try_on(photo, versioned),
+        }
+        for label, call in cases.items():
+            timings = time_calls(call, repeat)
+            self.stdout.write(
+                f'  1080p {label:<14} p50={percentile(timings, 50):.1f}ms p95={percentile(timings, 95):.1f}ms'
+            )
+
+        # Leave nothing behind in the shared cache
+        img = engine.decode_photo(photo)
+        photo_hash = cache.photo_hash(np.array(img))
+        key = cache.result_key(photo_hash, None, versioned, img.size)
+        for path in (cache._path('person', photo_hash, 'json'),
+                     cache._path('results', key, 'jpg'), cache._path('results', key, 'json')):
+            if os.path.exists(path):
+                os.remove(path)
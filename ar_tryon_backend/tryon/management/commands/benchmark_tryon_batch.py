@@ -0,0 +1,67 @@
+"""
+Django management command to benchmark batch try-on against single try-ons.
+A product grid previewing N products on the user's photo can either make N
+/tryon/process/ calls, each decoding and analyzing the photo again, or one
+/tryon/batch/ call. It times the engine work of both on a synthetic 1080p
+photo with N synthetic garments, caches off: N sequential try-ons, the batch
+at full size (what sharing the photo saves) and the batch at preview size
+(what the endpoint does).
+"""
+
+from django.core.management.base import BaseCommand
+
+from catalog.benchmarking import time_calls, percentile
+from tryon import engine, garments
+from tryon.benchmarking import synthetic_garment, synthetic_person, jpeg_bytes
+
+
+class Command(BaseCommand):
+    help = 'Benchmark a batch try-on of N products against N sequential try-ons'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=12,
+            help='Products per batch (default: 12)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timed runs of each variant (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        n = options['products']
+        prepared = []
+        for i in range(n):
+            category = garments.CATEGORIES[i % len(garments.CATEGORIES)]
+            prepared.append(garments.prepare_garment(synthetic_garment(category, seed=i), category))
+        photo = jpeg_bytes(synthetic_person(1920, 1080))
+
+        def sequential():
+            for garment in prepared:
+                engine.try_on(photo, garment, use_cache=False)
+
+        def batch(max_side):
+            def run():
+                loaded = engine.load_photo(photo, max_side, use_cache=False)
+                for garment in prepared:
+                    engine.dress(loaded, garment)
+            return run
+
+        variants = {
+            f'{n} sequential try-ons': sequential,
+            'batch, full size': batch(engine.MAX_PHOTO_SIDE),
+            f'batch, {engine.PREVIEW_SIDE}px previews': batch(engine.PREVIEW_SIDE),
+        }
+        baseline = None
+        for label, run in variants.items():
+            timings = time_calls(run, options['repeat'])
+            p50 = percentile(timings, 50)
+            baseline = baseline or p50
+            self.stdout.write(
+                f'  {label:<28} p50={p50:.0f}ms p95={percentile(timings, 95):.0f}ms '
+                f'({p50 / n:.1f}ms per product, {baseline / p50:.1f}x)'
+            )
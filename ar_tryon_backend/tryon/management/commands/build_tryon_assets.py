@@ -0,0 +1,86 @@
+"""
+Django management command to build try-on assets for garment images.
+Only images flagged as a product's try-on garment get assets; --flag-primary
+first flags the primary image of products that have none. Images without
+current assets are prepared in a pool of --workers processes (--all rebuilds
+every one, e.g. after ASSET_VERSION changed), or with --queue-only they are
+queued for the run_image_worker processes instead.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Exists, OuterRef
+
+from catalog import image_jobs, response_cache
+from catalog.models import ImageJob, ProductImage
+from tryon import assets
+
+
+def _generate(name):
+    try:
+        return name, assets.generate(name), None
+    except (OSError, ValueError) as exc:
+        return name, {'source': name, 'version': assets.ASSET_VERSION}, str(exc)
+
+
+class Command(BaseCommand):
+    help = 'Precompute try-on assets (cutout pyramid, alpha mask, anchors) for garment images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild every garment image, not only those without current assets',
+        )
+        parser.add_argument(
+            '--flag-primary',
+            action='store_true',
+            help='Flag the primary image of products without a garment image first',
+        )
+        parser.add_argument('--workers', type=int, default=4, help='Processes preparing garments')
+        parser.add_argument(
+            '--queue-only',
+            action='store_true',
+            help='Only queue the jobs and leave them to run_image_worker',
+        )
+
+    def handle(self, *args, **options):
+        if options['flag_primary']:
+            flagged = ProductImage.objects.filter(product=OuterRef('product'), is_try_on_garment=True)
+            flagged = ProductImage.objects.filter(is_primary=True).exclude(Exists(flagged)).update(
+                is_try_on_garment=True
+            )
+            if flagged:
+                # The flag is part of the cached catalog responses; update() sends no signals
+                response_cache.invalidate()
+            self.stdout.write(f'{flagged} primary images flagged as garments')
+
+        images = [
+            image for image in ProductImage.objects.filter(is_try_on_garment=True).exclude(image='')
+            .only('image', 'try_on_assets')
+            if options['all'] or not assets.is_current(image.try_on_assets, image.image)
+        ]
+        if options['queue_only']:
+            queued = sum(bool(image_jobs.enqueue(ImageJob.TRYON_GARMENT, image.pk)) for image in images)
+            self.stdout.write(self.style.SUCCESS(f'{queued} try-on asset jobs queued.'))
+            return
+
+        pks = {}
+        for image in images:
+            pks.setdefault(image.image.name, []).append(image.pk)
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        built = failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            for future in as_completed([pool.submit(_generate, name) for name in pks]):
+                name, manifest, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                else:
+                    built += 1
+                # Skip images whose file was replaced meanwhile; that queued its own job
+                ProductImage.objects.filter(pk__in=pks[name], image=name).update(try_on_assets=manifest)
+        self.stdout.write(self.style.SUCCESS(f'Try-on assets built for {built} images ({failed} failed).'))
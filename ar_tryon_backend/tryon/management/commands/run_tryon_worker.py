@@ -0,0 +1,84 @@
+"""
+Django management command to run try-on workers.
+Each worker process claims TryOnJobs one at a time and runs the engine, so
+submitting a try-on never holds a web worker for the render. One process per
+core is the default, since a try-on is CPU-bound; each keeps its own garment
+caches warm. Run it under a process supervisor; --once drains the queue and
+exits.
+"""
+
+import multiprocessing
+import os
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+
+from tryon import jobs
+from tryon.models import TryOnJob
+
+
+def _work(index, poll, once):
+    # Each process opens its own database connection on first use
+    name = f'{jobs.worker_name()}-{index}'
+    try:
+        jobs.work(name, poll=poll, once=once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Process queued try-on jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes (default: one per core)',
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=0.1,
+            help='Seconds to wait when the queue is empty (default: 0.1)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs',
+        )
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        pending = TryOnJob.objects.filter(status='pending').count()
+        self.stdout.write(
+            f'Starting {processes} try-on worker(s), {pending} jobs pending (limit {jobs.MAX_QUEUED})...'
+        )
+
+        worker_args = (options['poll'], options['once'])
+        if processes == 1:
+            _work(0, *worker_args)
+        else:
+            # Children must not share the parent's database connection
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            workers = [context.Process(target=_work, args=(i, *worker_args)) for i in range(processes)]
+            for worker in workers:
+                worker.start()
+            # A supervisor stopping the parent stops the workers too
+            signal.signal(signal.SIGTERM, lambda *_: [worker.terminate() for worker in workers])
+            try:
+                for worker in workers:
+                    worker.join()
+            except KeyboardInterrupt:
+                for worker in workers:
+                    worker.join()
+
+        counts = dict(TryOnJob.objects.values_list('status').annotate(n=Count('pk')).order_by())
+        self.stdout.write(self.style.SUCCESS(
+            'Try-on workers stopped. ' + ', '.join(f'{status}: {counts.get(status, 0)}' for status, _ in TryOnJob.STATUS_CHOICES)
+        ))
@@ -0,0 +1,73 @@
+"""
+Mask helpers shared by the person analysis and the garment cutouts.
+Everything works on NumPy arrays: images as float32 (h, w, 3) in 0..255,
+masks as bool (h, w).
+"""
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+# Smallest colour difference from the background that counts as foreground
+MIN_CONTRAST = 28
+# Grid size for filling holes in a mask
+FILL_SIDE = 160
+
+
+def key_out(rgb, background, noise=0.0):
+    """Pixels that differ from `background` (broadcastable to rgb) by more than the noise"""
+    distance = np.abs(rgb - background).max(axis=2)
+    return distance > max(MIN_CONTRAST, 4 * noise)
+
+
+def clean(mask, size=3):
+    """Drop specks and close small gaps with a morphological opening and closing"""
+    img = Image.fromarray(mask.astype(np.uint8) * 255)
+    img = (
+        img.filter(ImageFilter.MinFilter(size))
+        .filter(ImageFilter.MaxFilter(size + 2))
+        .filter(ImageFilter.MinFilter(size))
+    )
+    return np.asarray(img) > 127
+
+
+def fill_holes(mask):
+    """
+    Fill the parts of the background that can't be reached from the border,
+    e.g. a white print inside a shirt shot on white.
+    The flood fill (pure Python in Pillow) runs on a grid of about FILL_SIDE
+    cells; background pixels next to a reachable cell stay background.
+    """
+    h, w = mask.shape
+    factor = max(1, -(-max(h, w) // FILL_SIDE))
+    background = Image.fromarray((~mask).astype(np.uint8) * 255)
+    # A cell is background only if all of its pixels are
+    coarse = background.reduce(factor).point(lambda v: 255 if v == 255 else 0)
+    cw, ch = coarse.size
+    for x, y in [(0, 0), (cw - 1, 0), (0, ch - 1), (cw - 1, ch - 1),
+                 (cw // 2, 0), (cw // 2, ch - 1), (0, ch // 2), (cw - 1, ch // 2)]:
+        if coarse.getpixel((x, y)) == 255:
+            ImageDraw.floodfill(coarse, (x, y), 128)
+    reachable = coarse.point(lambda v: 255 if v == 128 else 0).filter(ImageFilter.MaxFilter(3))
+    reachable = np.asarray(reachable.resize((w, h), Image.NEAREST)) > 0
+    return mask | ~reachable
+
+
+def row_extents(mask, lo=0.05, hi=0.95):
+    """
+    Per-row pixel count and left/right edges of a mask. The edges are the
+    `lo` and `hi` quantiles of the foreground columns, so stray pixels far
+    from the body don't widen a row.
+    """
+    counts = mask.sum(axis=1)
+    cumulative = np.cumsum(mask, axis=1)
+    left = (cumulative < np.maximum(counts * lo, 1)[:, None]).sum(axis=1)
+    right = (cumulative < np.maximum(counts * hi, 1)[:, None]).sum(axis=1)
+    return counts, left, right
+
+
+def smooth(values, size=5):
+    """Moving average with edges padded by repetition"""
+    if size < 2 or len(values) < size:
+        return values.astype(np.float32)
+    padded = np.pad(values.astype(np.float32), size // 2, mode='edge')
+    return np.convolve(padded, np.ones(size, dtype=np.float32) / size, mode='valid')[:len(values)]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:45
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('catalog', '0010_productimage_try_on_garment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TryOnJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('input_hash', models.CharField(max_length=64)),
+                ('input_path', models.CharField(max_length=255)),
+                ('result_path', models.CharField(blank=True, max_length=255)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('confidence', models.FloatField(blank=True, null=True)),
+                ('timings', models.JSONField(blank=True, default=dict)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='try_on_jobs', to='catalog.product')),
+                ('product_image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.productimage')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='tryon_tryon_status_bac873_idx')],
+            },
+        ),
+    ]
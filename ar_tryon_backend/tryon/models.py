@@ -1,3 +1,54 @@
+"""
+Models for tryon app.
+"""
+
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class TryOnJob(models.Model):
+    """
+    A try-on request waiting for or processed by `manage.py run_tryon_worker`
+    (see tryon.jobs). The id is random so a job's photo and result can only be
+    fetched by whoever submitted it.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey('catalog.Product', on_delete=models.CASCADE, related_name='try_on_jobs')
+    product_image = models.ForeignKey('catalog.ProductImage', on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    # SHA-256 of the uploaded photo
+    input_hash = models.CharField(max_length=64)
+    # Storage names of the uploaded photo (removed once processed) and the result
+    input_path = models.CharField(max_length=255)
+    result_path = models.CharField(max_length=255, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    confidence = models.FloatField(null=True, blank=True)
+    # Milliseconds per engine stage, plus the time spent queued
+    timings = models.JSONField(default=dict, blank=True)
+
+    # Claim token of the worker running the job
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Try-on {self.id} of product {self.product_id} ({self.status})"
@@ -0,0 +1,130 @@
+"""
+Person analysis for try-on: where the body is in a photo.
+The photo is downscaled to ANALYSIS_SIDE pixels and the person separated from
+the background by keying against the colours along the left and right edges
+(interpolated across each row, so a gradient or a lamp on one side is fine).
+The width of the silhouette per row gives the top of the head and the
+shoulders, where the width jumps; the rest of the body follows from standard
+figure proportions measured in head lengths.
+
+The result is a dict of landmarks as fractions of the photo size, so it
+applies to the photo at any resolution:
+
+    {'top': 0.08, 'neck': 0.21, 'shoulder': 0.26, 'waist': 0.45, 'hip': 0.57,
+     'knee': 0.83, 'ankle': 1.04, 'head': 0.1, 'center_x': 0.5,
+     'head_width': 0.12, 'shoulder_width': 0.34, 'hip_width': 0.29,
+     'confidence': 0.9}
+
+Landmarks below the frame (> 1) are fine: garments reaching them are cut at
+the bottom edge. When no person can be found the proportions of a centred,
+upright figure are returned with a low confidence.
+"""
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .masks import clean, key_out, row_extents, smooth
+
+ANALYSIS_SIDE = getattr(settings, 'TRYON_ANALYSIS_SIDE', 256)
+
+# Landmarks in head lengths from the top of the head (an eight-head figure)
+PROPORTIONS = {'neck': 1.1, 'shoulder': 1.4, 'waist': 3.0, 'hip': 4.0, 'knee': 6.0, 'ankle': 7.6}
+# The shoulders are the first row at least this much wider than the head
+SHOULDER_JUMP = 1.6
+# A row with fewer foreground pixels than this share of the width is empty
+MIN_ROW_SHARE = 0.02
+
+FALLBACK = {
+    'top': 0.06, 'head': 0.11, 'center_x': 0.5,
+    'head_width': 0.14, 'shoulder_width': 0.42, 'hip_width': 0.36,
+}
+
+
+def _analysis_array(img):
+    scale = ANALYSIS_SIDE / max(img.size)
+    if scale < 1:
+        img = img.resize(
+            (max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+            Image.BILINEAR, reducing_gap=2.0,
+        )
+    return np.asarray(img.convert('RGB'), dtype=np.float32)
+
+
+def foreground_mask(rgb):
+    """Mask of everything that doesn't look like the background at the left and right edges"""
+    h, w, _ = rgb.shape
+    strip = max(2, w // 25)
+    left = np.median(rgb[:, :strip], axis=1)
+    right = np.median(rgb[:, -strip:], axis=1)
+    t = np.linspace(0, 1, w, dtype=np.float32)[None, :, None]
+    background = left[:, None, :] * (1 - t) + right[:, None, :] * t
+    noise = float(np.median(np.abs(rgb[:, :strip] - left[:, None, :]).max(axis=2)))
+    return clean(key_out(rgb, background, noise))
+
+
+def _landmarks(top, head, **measures):
+    body = {name: top + head * heads for name, heads in PROPORTIONS.items()}
+    body.update(top=top, head=head, **measures)
+    return body
+
+
+def fallback_body(confidence=0.1):
+    """Landmarks of a centred, upright person filling most of the frame"""
+    body = _landmarks(**FALLBACK)
+    body['confidence'] = confidence
+    return body
+
+
+def analyze(rgb):
+    """Landmarks for an analysis-size float32 RGB array"""
+    h, w, _ = rgb.shape
+    mask = foreground_mask(rgb)
+    coverage = float(mask.mean())
+    counts, left, right = row_extents(mask)
+    rows = np.flatnonzero(counts >= MIN_ROW_SHARE * w)
+    if len(rows) < 0.2 * h or not 0.03 < coverage < 0.9:
+        return fallback_body()
+
+    top, bottom = int(rows[0]), int(rows[-1])
+    widths = smooth(np.where(counts >= MIN_ROW_SHARE * w, right - left + 1, 0), 5)
+    centers = (left + right) / 2
+
+    head_rows = slice(top, top + max(3, int(0.06 * h)))
+    head_width = float(np.median(widths[head_rows]))
+    confidence = 1.0
+
+    start = head_rows.stop
+    jumps = np.flatnonzero(widths[start:bottom + 1] >= SHOULDER_JUMP * head_width)
+    if len(jumps):
+        shoulder = start + int(jumps[0])
+    else:
+        shoulder = top + 0.2 * (h - top)
+        confidence *= 0.5
+    head = max((shoulder - top) / PROPORTIONS['shoulder'], 2.0)
+
+    measure = min(int(shoulder + 0.2 * head), bottom)
+    shoulder_width = float(widths[measure])
+    hip = int(top + PROPORTIONS['hip'] * head)
+    hip_width = float(widths[hip]) if hip <= bottom and widths[hip] > 0 else 0.85 * shoulder_width
+    center_x = float(np.median(centers[top:min(int(top + PROPORTIONS['hip'] * head), bottom) + 1]))
+
+    if not 1.8 <= shoulder_width / max(head_width, 1) <= 5:
+        confidence *= 0.7
+    if not 0.08 <= coverage <= 0.6:
+        confidence *= 0.8
+
+    body = _landmarks(
+        top / h, head / h,
+        center_x=center_x / w,
+        head_width=head_width / w,
+        shoulder_width=shoulder_width / w,
+        hip_width=hip_width / w,
+    )
+    body['confidence'] = round(min(max(confidence, 0.05), 0.99), 2)
+    return body
+
+
+def analyze_person(img):
+    """Landmarks of the person in a PIL image"""
+    return analyze(_analysis_array(img))
@@ -1,3 +1,186 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from catalog.models import Brand, Category, Product, ProductImage
+from . import api_views, cache, jobs
+from .models import TryOnJob
+
+
+class CachePruneTests(SimpleTestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        patcher = mock.patch.multiple(cache, CACHE_ROOT=root, _pruned_at=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def put(self, photo, age):
+        cache._write(cache._path('person', photo, 'json'), json.dumps('x' * 98))
+        used = time.time() - age
+        os.utime(cache._path('person', photo, 'json'), (used, used))
+
+    def test_prune_removes_expired_then_least_recently_used_entries(self):
+        for photo, age in [('aa-expired', 2 * cache.TTL), ('bb-old', 300), ('cc-recent', 200), ('dd-new', 100)]:
+            self.put(photo, age)
+        with mock.patch.object(cache, 'MAX_BYTES', 250):
+            removed, left = cache.prune()
+        self.assertEqual((removed, left), (2, 200))
+        self.assertIsNone(cache.get_person('bb-old'))
+        self.assertIsNotNone(cache.get_person('cc-recent'))
+        self.assertIsNotNone(cache.get_person('dd-new'))
+
+    def test_writes_prune_in_the_background_at_most_once_per_interval(self):
+        with mock.patch.object(cache, 'prune') as prune:
+            cache.put_person('aa-photo', {'landmarks': []})
+            cache.put_person('bb-photo', {'landmarks': []})
+            # The lock is held until the background prune is done
+            self.assertTrue(cache._prune_lock.acquire(timeout=5))
+            cache._prune_lock.release()
+        prune.assert_called_once_with()
+
+
+def create_garment():
+    """A try-on product with a flagged garment image: (product, product_image)"""
+    category = Category.objects.create(name='Shirts', slug='shirts')
+    brand = Brand.objects.create(name='Acme', slug='acme')
+    product = Product.objects.create(
+        name='Shirt', slug='shirt', description='A shirt', price=Decimal('20.00'),
+        category=category, brand=brand, is_try_on_enabled=True,
+    )
+    product_image = ProductImage.objects.create(product=product, image='products/shirt.jpg', is_try_on_garment=True)
+    return product, product_image
+
+
+class TempMediaMixin:
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        media = override_settings(MEDIA_ROOT=root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class TryOnJobQueueTests(TempMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product, cls.product_image = create_garment()
+
+    def submit(self, photo=b'photo'):
+        return jobs.submit(photo, self.product, self.product_image)
+
+    def test_full_queue_answers_429_with_retry_after(self):
+        request_factory = APIRequestFactory()
+
+        def post():
+            request = request_factory.post('/tryon/jobs/', {
+                'user_image': SimpleUploadedFile('me.jpg', b'photo', content_type='image/jpeg'),
+                'product_id': self.product.pk,
+            }, format='multipart')
+            return api_views.submit_tryon(request)
+
+        with mock.patch.object(jobs, 'MAX_QUEUED', 2):
+            self.assertEqual([post().status_code, post().status_code], [202, 202])
+            response = post()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(jobs.RETRY_AFTER))
+        self.assertEqual(TryOnJob.objects.count(), 2)
+
+    def test_submission_past_the_limit_is_withdrawn(self):
+        save = default_storage.save
+
+        def save_while_another_submits(name, content):
+            # Another submission passes the check and inserts meanwhile
+            TryOnJob.objects.create(product=self.product, product_image=self.product_image, input_path='other')
+            return save(name, content)
+
+        with mock.patch.object(jobs, 'MAX_QUEUED', 1):
+            with mock.patch.object(default_storage, 'save', side_effect=save_while_another_submits):
+                with self.assertRaises(jobs.QueueFull):
+                    self.submit()
+        self.assertEqual(list(TryOnJob.objects.values_list('input_path', flat=True)), ['other'])
+        self.assertEqual(default_storage.listdir('tryon/inputs')[1], [])
+
+    def test_claim_takes_the_oldest_pending_jobs_once(self):
+        first, second, third = self.submit(), self.submit(), self.submit()
+        claimed = jobs.claim('worker-a', limit=2)
+        self.assertEqual([job.pk for job in claimed], [first.pk, second.pk])
+        self.assertEqual({job.attempts for job in claimed}, {1})
+        self.assertEqual([job.pk for job in jobs.claim('worker-b', limit=2)], [third.pk])
+        self.assertEqual(jobs.claim('worker-c'), [])
+
+    def test_stale_jobs_are_requeued_then_failed(self):
+        job = self.submit()
+        [claimed] = jobs.claim('lost-worker')
+        later = timezone.now() + jobs.LOCK_TIMEOUT + timedelta(seconds=1)
+        self.assertEqual(jobs.requeue_stale(later), 1)
+        self.assertEqual(TryOnJob.objects.get(pk=job.pk).status, 'pending')
+
+        # The lost worker finishing late doesn't overwrite the new run
+        with mock.patch.object(jobs, 'process', return_value={'timings': {}}):
+            with mock.patch.object(jobs, 'MAX_ATTEMPTS', 2):
+                self.assertEqual(jobs.run_job(claimed), 'done')
+        self.assertEqual(TryOnJob.objects.get(pk=job.pk).status, 'pending')
+
+        with mock.patch.object(jobs, 'MAX_ATTEMPTS', 2):
+            jobs.claim('second-worker')
+            jobs.requeue_stale(timezone.now() + jobs.LOCK_TIMEOUT + timedelta(seconds=1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('failed', 2, ''))
+
+    def test_eager_jobs_run_when_the_submission_commits(self):
+        result = {'result_path': 'tryon/results/x.jpg', 'width': 10, 'height': 20, 'confidence': 0.9, 'timings': {}}
+        with mock.patch.object(jobs, 'EAGER', True), mock.patch.object(jobs, 'process', return_value=result):
+            with self.captureOnCommitCallbacks(execute=True):
+                job = self.submit()
+                self.assertEqual(TryOnJob.objects.get(pk=job.pk).status, 'pending')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.width, job.locked_by), ('done', 10, ''))
+        self.assertIn('queued', job.timings)
+        self.assertFalse(default_storage.exists(job.input_path))
+
+
+class TryOnJobBurstTests(TempMediaMixin, TransactionTestCase):
+
+    def test_a_burst_never_queues_more_than_the_limit(self):
+        product, product_image = create_garment()
+        barrier = threading.Barrier(8)
+        outcomes = []
+
+        def submit():
+            try:
+                barrier.wait()
+                jobs.submit(b'photo', product, product_image)
+                outcomes.append('queued')
+            except jobs.QueueFull:
+                outcomes.append('refused')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(8)]
+        with mock.patch.object(jobs, 'MAX_QUEUED', 3):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(outcomes), 8)
+        self.assertLessEqual(outcomes.count('queued'), 3)
+        self.assertEqual(TryOnJob.objects.count(), outcomes.count('queued'))
+        self.assertEqual(len(default_storage.listdir('tryon/inputs')[1]), outcomes.count('queued'))
@@ -4,7 +4,7 @@ This file defines all the URL patterns for virtual try-on functionality.
 """
 
 from django.urls import path
-from . import views
+from . import api_views, views
 
 app_name = 'tryon'
 
@@ -14,5 +14,10 @@ urlpatterns = [
     
     # Try-on URLs (we'll add these in later phases)
     path('upload/', views.upload_image, name='upload_image'),
-    path('results/', views.tryon_results, name='tryon_results'),
+    path('process/', api_views.process_tryon, name='process'),
+    path('jobs/', api_views.submit_tryon, name='submit'),
+    path('batch/', api_views.batch_tryon, name='batch'),
+    path('cached/<str:key>/', api_views.cached_result, name='cached_result'),
+    path('results/<uuid:job_id>/', api_views.tryon_results, name='tryon_results'),
+    path('results/<uuid:job_id>/image/', api_views.result_image, name='result_image'),
 ]
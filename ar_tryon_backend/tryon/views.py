@@ -21,7 +21,3 @@ def tryon_home(request):
 def upload_image(request):
     """Image upload view - to be implemented in Phase 5"""
     return JsonResponse({'message': 'Image upload - coming in Phase 5!'})
-
-def tryon_results(request):
-    """Try-on results view - to be implemented in Phase 6"""
-    return JsonResponse({'message': 'Try-on results - coming in Phase 6!'})
@@ -7,7 +7,6 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from PIL import Image
 
 class UserProfile(models.Model):
     """
@@ -29,6 +28,8 @@ class UserProfile(models.Model):
         default='avatars/default.png',  # Default avatar if none uploaded
         blank=True
     )
+    # Responsive sizes of the avatar, built in the background (see catalog.image_jobs)
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
     
     # Physical measurements for better try-on experience
     height = models.IntegerField(help_text="Height in centimeters", blank=True, null=True)
@@ -63,24 +64,6 @@ class UserProfile(models.Model):
         This is what shows up when we print a UserProfile object.
         """
         return f"{self.user.username}'s Profile"
-    
-    def save(self, *args, **kwargs):
-        """
-        Override the save method to resize large images.
-        This prevents huge image files from taking up too much space.
-        """
-        super().save(*args, **kwargs)
-        
-        if self.avatar:
-            try:
-                img = Image.open(self.avatar.path)
-                if img.height > 300 or img.width > 300:
-                    output_size = (300, 300)
-                    img.thumbnail(output_size)
-                    img.save(self.avatar.path)
-            except Exception as e:
-                # If image processing fails, just continue
-                pass
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -6,6 +6,7 @@ Serializers convert Django model instances to JSON and vice versa.
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from catalog import renditions
 from .models import UserProfile
 
 
@@ -49,12 +50,17 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for user profile.
+    avatar_srcset maps each avatar rendition format to a srcset string.
     """
     user = serializers.StringRelatedField(read_only=True)
+    avatar_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = UserProfile
-        fields = '__all__'
+        exclude = ['avatar_renditions']
+
+    def get_avatar_srcset(self, obj):
+        return renditions.srcset_map(obj.avatar_renditions, self.context.get('request'))
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -23,6 +23,9 @@ const ProductCard = ({ product }) => {
   const imageUrl = images.length > 0 
     ? images[0].image || images[0].url 
     : 'https://via.placeholder.com/300x400?text=No+Image';
+  // Responsive renditions ({format: srcset}), most efficient format first
+  const srcset = (images.length > 0 && images[0].srcset) || {};
+  const imageSizes = '(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw';
 
   // Format price
   const formatPrice = (price) => {
@@ -66,14 +69,21 @@ const ProductCard = ({ product }) => {
       {/* Product Image */}
       <div className="relative">
         <Link to={`/products/${slug}`}>
-          <img
-            src={imageUrl}
-            alt={name}
-            className="w-full h-48 sm:h-64 object-cover group-hover:scale-105 transition-transform duration-300"
-            onError={(e) => {
-              e.target.src = 'https://via.placeholder.com/300x400?text=No+Image';
-            }}
-          />
+          <picture>
+            {Object.entries(srcset).map(([format, set]) => (
+              <source key={format} type={`image/${format}`} srcSet={set} sizes={imageSizes} />
+            ))}
+            <img
+              src={imageUrl}
+              alt={name}
+              loading="lazy"
+              className="w-full h-48 sm:h-64 object-cover group-hover:scale-105 transition-transform duration-300"
+              onError={(e) => {
+                e.target.closest('picture').querySelectorAll('source').forEach((source) => source.remove());
+                e.target.src = 'https://via.placeholder.com/300x400?text=No+Image';
+              }}
+            />
+          </picture>
         </Link>
         
         {/* AR Badge */}
@@ -1,6 +1,6 @@
-import React, { createContext, useContext, useReducer, useEffect } from 'react';
+import React, { createContext, useContext, useReducer, useEffect, useRef } from 'react';
 import { useAuth } from './AuthContext';
-import api from '../services/api';
+import api, { idempotencyHeaders, newIdempotencyKey } from '../services/api';
 
 const CartContext = createContext();
 
@@ -9,6 +9,7 @@ const CART_ACTIONS = {
   SET_CART: 'SET_CART',
   ADD_ITEM: 'ADD_ITEM',
   UPDATE_ITEM: 'UPDATE_ITEM',
+  UPSERT_ITEM: 'UPSERT_ITEM',
   REMOVE_ITEM: 'REMOVE_ITEM',
   CLEAR_CART: 'CLEAR_CART',
   SET_LOADING: 'SET_LOADING',
@@ -24,6 +25,7 @@ const cartReducer = (state, action) => {
         ...state,
         items: action.payload.items || [],
         total: action.payload.total || 0,
+        version: action.payload.version ?? state.version,
         loading: false,
         error: null
       };
@@ -59,6 +61,21 @@ const cartReducer = (state, action) => {
         loading: false
       };
     
+    case CART_ACTIONS.UPSERT_ITEM:
+      // A cart line returned by the backend, new or with its updated quantity
+      return {
+        ...state,
+        items: state.items.some(item => item.id === action.payload.item.id)
+          ? state.items.map(item =>
+              item.id === action.payload.item.id
+                ? { ...item, quantity: action.payload.item.quantity }
+                : item
+            )
+          : [...state.items, action.payload.item],
+        version: action.payload.version,
+        loading: false
+      };
+    
     case CART_ACTIONS.REMOVE_ITEM:
       return {
         ...state,
@@ -102,6 +119,8 @@ const cartReducer = (state, action) => {
 const initialState = {
   items: [],
   total: 0,
+  // Backend cart version; the cart is only refetched when it changes
+  version: null,
   loading: false,
   error: null
 };
@@ -109,6 +128,8 @@ const initialState = {
 export const CartProvider = ({ children }) => {
   const [state, dispatch] = useReducer(cartReducer, initialState);
   const { user, isAuthenticated } = useAuth();
+  const versionRef = useRef(null);
+  versionRef.current = state.version;
 
   // Calculate total whenever items change
   useEffect(() => {
@@ -140,13 +161,7 @@ export const CartProvider = ({ children }) => {
       const response = await api.get('/orders/cart/');
       console.log('✅ Backend cart response:', response.data);
       
-      dispatch({ 
-        type: CART_ACTIONS.SET_CART, 
-        payload: {
-          items: response.data.items || [],
-          total: response.data.total || 0
-        }
-      });
+      setBackendCart(response.data);
       console.log('✅ Cart state updated');
     } catch (error) {
       console.error('❌ Error loading cart from backend:', error);
@@ -156,6 +171,40 @@ export const CartProvider = ({ children }) => {
     }
   };
 
+  // Put a cart returned by the backend (full fetch or mutation response) in state
+  const setBackendCart = (cart) => {
+    dispatch({ 
+      type: CART_ACTIONS.SET_CART, 
+      payload: {
+        items: cart.items || [],
+        total: cart.total || 0,
+        version: cart.version
+      }
+    });
+  };
+
+  // Refetch the cart only if it changed elsewhere (another tab or device).
+  // The summary is a single cached lookup; the full cart request is
+  // revalidated with its ETag by the browser.
+  const syncCart = async () => {
+    try {
+      const { data } = await api.get('/orders/cart/summary/');
+      if (data.version !== versionRef.current) {
+        await loadCartFromBackend();
+      }
+    } catch (error) {
+      console.error('Error checking cart version:', error);
+    }
+  };
+
+  useEffect(() => {
+    if (!isAuthenticated) {
+      return undefined;
+    }
+    window.addEventListener('focus', syncCart);
+    return () => window.removeEventListener('focus', syncCart);
+  }, [isAuthenticated]);
+
   // Load cart from localStorage
   const loadCartFromLocalStorage = () => {
     try {
@@ -218,14 +267,25 @@ export const CartProvider = ({ children }) => {
         console.log('🌐 API URL:', '/orders/cart/add/');
         
         // Add to backend cart
-        const response = await api.post('/orders/cart/add/', requestData);
+        const response = await api.post('/orders/cart/add/', requestData, {
+          headers: idempotencyHeaders(newIdempotencyKey())
+        });
         
         console.log('✅ Backend response:', response.data);
         
-        // Reload cart from backend to get updated data
-        console.log('🔄 Reloading cart from backend...');
-        await loadCartFromBackend();
-        console.log('✅ Cart reloaded successfully');
+        // The response only carries the changed line; if anything else
+        // changed the cart in the meantime, refetch it
+        const expectedVersion = versionRef.current === null ? null : versionRef.current + 1;
+        dispatch({
+          type: CART_ACTIONS.UPSERT_ITEM,
+          payload: {
+            item: { ...response.data.item, product },
+            version: response.data.version
+          }
+        });
+        if (expectedVersion === null || response.data.version !== expectedVersion) {
+          await loadCartFromBackend();
+        }
       } else {
         console.log('❌ User not authenticated, adding to local cart');
         // Add to local cart
@@ -264,8 +324,8 @@ export const CartProvider = ({ children }) => {
       }
 
       if (isAuthenticated) {
-        await api.patch(`/orders/cart/items/${itemId}/`, { quantity });
-        await loadCartFromBackend();
+        const response = await api.put(`/orders/cart/item/${itemId}/update/`, { quantity });
+        setBackendCart(response.data.cart);
       } else {
         dispatch({ 
           type: CART_ACTIONS.UPDATE_ITEM, 
@@ -292,8 +352,8 @@ export const CartProvider = ({ children }) => {
       dispatch({ type: CART_ACTIONS.CLEAR_ERROR });
 
       if (isAuthenticated) {
-        await api.delete(`/orders/cart/items/${itemId}/`);
-        await loadCartFromBackend();
+        const response = await api.delete(`/orders/cart/item/${itemId}/remove/`);
+        setBackendCart(response.data.cart);
       } else {
         dispatch({ type: CART_ACTIONS.REMOVE_ITEM, payload: { id: itemId } });
         const updatedItems = state.items.filter(item => item.id !== itemId);
@@ -315,7 +375,11 @@ export const CartProvider = ({ children }) => {
       dispatch({ type: CART_ACTIONS.CLEAR_ERROR });
 
       if (isAuthenticated) {
-        await api.delete('/orders/cart/clear/');
+        const response = await api.delete('/orders/cart/clear/');
+        if (response.data.cart) {
+          setBackendCart(response.data.cart);
+          return;
+        }
       } else {
         localStorage.removeItem('cart');
       }
@@ -358,6 +422,7 @@ export const CartProvider = ({ children }) => {
     removeFromCart,
     clearCart,
     loadCartFromBackend,
+    syncCart,
     
     // Helpers
     getCartItemCount,
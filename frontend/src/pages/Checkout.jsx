@@ -1,11 +1,11 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { ArrowLeftIcon, CreditCardIcon, TruckIcon, CheckCircleIcon } from '@heroicons/react/24/outline';
 import { useCart } from '../contexts/CartContext';
 import { useAuth } from '../contexts/AuthContext';
 import ShippingAddressForm from '../components/Checkout/ShippingAddressForm';
 import OrderSummary from '../components/Checkout/OrderSummary';
-import api from '../services/api';
+import api, { idempotencyHeaders, newIdempotencyKey } from '../services/api';
 
 const Checkout = () => {
   const navigate = useNavigate();
@@ -18,6 +18,9 @@ const Checkout = () => {
   const [error, setError] = useState(null);
   const [orderNotes, setOrderNotes] = useState('');
   const [orderEmail, setOrderEmail] = useState('');
+  // Retrying an order that got no answer (e.g. after a timeout) reuses its
+  // key, so the backend creates it at most once
+  const orderAttemptRef = useRef({ payload: null, key: null });
 
   const itemCount = getCartItemCount();
 
@@ -102,7 +105,14 @@ const Checkout = () => {
       console.log('📦 Order data:', orderData);
       console.log('🌐 API URL: /orders/orders/create/');
       
-      const response = await api.post('/orders/orders/create/', orderData);
+      const payload = JSON.stringify(orderData);
+      if (orderAttemptRef.current.payload !== payload) {
+        orderAttemptRef.current = { payload, key: newIdempotencyKey() };
+      }
+      const response = await api.post('/orders/orders/create/', orderData, {
+        headers: idempotencyHeaders(orderAttemptRef.current.key)
+      });
+      orderAttemptRef.current = { payload: null, key: null };
       console.log('✅ Order placed successfully:', response.data);
       
       // Clear cart after successful order
@@ -111,6 +121,11 @@ const Checkout = () => {
       // Redirect to order confirmation
       navigate(`/order-confirmation/${response.data.id}`);
     } catch (error) {
+      if (error.response) {
+        // The server answered, so nothing is in flight: the next attempt
+        // (e.g. after fixing the cart) is a new order
+        orderAttemptRef.current = { payload: null, key: null };
+      }
       console.error('❌ Error placing order:', error);
       console.error('❌ Error response:', error.response);
       console.error('❌ Error data:', error.response?.data);
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, Link, useNavigate } from 'react-router-dom';
 import { ArrowLeftIcon, ClockIcon, TruckIcon, CheckCircleIcon, XCircleIcon, CreditCardIcon } from '@heroicons/react/24/outline';
-import api from '../services/api';
+import api, { idempotencyHeaders, newIdempotencyKey } from '../services/api';
 
 const OrderDetail = () => {
   const { orderId } = useParams();
@@ -35,7 +35,9 @@ const OrderDetail = () => {
 
     setCancelling(true);
     try {
-      await api.patch(`/orders/orders/${orderId}/cancel/`);
+      await api.post(`/orders/orders/${orderId}/cancel/`, null, {
+        headers: idempotencyHeaders(newIdempotencyKey())
+      });
       // Reload order to get updated status
       await loadOrder();
     } catch (error) {
@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { ClockIcon, TruckIcon, CheckCircleIcon, XCircleIcon } from '@heroicons/react/24/outline';
 import { useAuth } from '../contexts/AuthContext';
-import api from '../services/api';
+import api, { idempotencyHeaders, newIdempotencyKey } from '../services/api';
 
 const Orders = () => {
   const { isAuthenticated } = useAuth();
@@ -77,7 +77,9 @@ const Orders = () => {
     }
 
     try {
-      await api.patch(`/orders/orders/${orderId}/cancel/`);
+      await api.post(`/orders/orders/${orderId}/cancel/`, null, {
+        headers: idempotencyHeaders(newIdempotencyKey())
+      });
       // Reload orders to get updated status
       loadOrders();
     } catch (error) {
@@ -182,10 +184,10 @@ const Orders = () => {
                     </div>
                     <div className="text-right">
                       <p className="text-lg font-semibold text-gray-900">
-                        {formatPrice(order.total)}
+                        {formatPrice(order.total_amount)}
                       </p>
                       <p className="text-sm text-gray-600">
-                        {order.items.length} {order.items.length === 1 ? 'item' : 'items'}
+                        {order.item_count} {order.item_count === 1 ? 'item' : 'items'}
                       </p>
                     </div>
                   </div>
@@ -193,37 +195,36 @@ const Orders = () => {
 
                 {/* Order Items Preview */}
                 <div className="px-6 py-4">
-                  <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-4 mb-4">
-                    {order.items.slice(0, 4).map((item) => (
-                      <div key={item.id} className="flex items-center space-x-3">
-                        <div className="flex-shrink-0 w-12 h-12 bg-gray-200 rounded-lg overflow-hidden">
-                          {item.product.images && item.product.images.length > 0 ? (
-                            <img
-                              src={item.product.images[0].image}
-                              alt={item.product.name}
-                              className="w-full h-full object-cover"
-                            />
-                          ) : (
-                            <div className="w-full h-full flex items-center justify-center text-gray-400 text-xs">
-                              No Image
-                            </div>
-                          )}
-                        </div>
-                        <div className="min-w-0 flex-1">
-                          <p className="text-sm font-medium text-gray-900 truncate">
-                            {item.product.name}
-                          </p>
-                          <p className="text-xs text-gray-500">
-                            Qty: {item.quantity}
-                          </p>
+                  <div className="flex items-center space-x-3 mb-4">
+                    <div
+                      className="flex-shrink-0 w-12 h-12 bg-gray-200 rounded-lg overflow-hidden"
+                      style={order.thumbnail?.color ? { backgroundColor: order.thumbnail.color } : undefined}
+                    >
+                      {order.thumbnail ? (
+                        <img
+                          src={order.thumbnail.url}
+                          srcSet={order.thumbnail.srcset?.webp || undefined}
+                          sizes="48px"
+                          alt={order.first_product_name}
+                          loading="lazy"
+                          className="w-full h-full object-cover"
+                        />
+                      ) : (
+                        <div className="w-full h-full flex items-center justify-center text-gray-400 text-xs">
+                          No Image
                         </div>
-                      </div>
-                    ))}
-                    {order.items.length > 4 && (
-                      <div className="flex items-center justify-center text-sm text-gray-500">
-                        +{order.items.length - 4} more items
-                      </div>
-                    )}
+                      )}
+                    </div>
+                    <div className="min-w-0 flex-1">
+                      <p className="text-sm font-medium text-gray-900 truncate">
+                        {order.first_product_name}
+                      </p>
+                      {order.line_count > 1 && (
+                        <p className="text-xs text-gray-500">
+                          +{order.line_count - 1} more {order.line_count === 2 ? 'item' : 'items'}
+                        </p>
+                      )}
+                    </div>
                   </div>
 
                   {/* Action Buttons */}
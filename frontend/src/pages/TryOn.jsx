@@ -21,6 +21,7 @@ const TryOn = () => {
   const [tryOnResult, setTryOnResult] = useState(null);
   const [loading, setLoading] = useState(false);
   const [processing, setProcessing] = useState(false);
+  const [jobStatus, setJobStatus] = useState(null);
   const [error, setError] = useState(null);
   const [selectedProductImage, setSelectedProductImage] = useState(0);
   
@@ -41,6 +42,11 @@ const TryOn = () => {
       setLoading(true);
       const response = await api.get(`/catalog/products/${productId}/`);
       setProduct(response.data);
+      // Start on the flat garment shot, which is what the try-on uses
+      const garmentIndex = (response.data.images || []).findIndex((image) => image.is_try_on_garment);
+      if (garmentIndex >= 0) {
+        setSelectedProductImage(garmentIndex);
+      }
     } catch (error) {
       console.error('Error fetching product:', error);
       setError('Product not found');
@@ -121,19 +127,44 @@ const TryOn = () => {
       formData.append('product_id', product.id);
       formData.append('product_image_index', selectedProductImage);
 
-      const response = await api.post('/tryon/process/', formData, {
+      const submitted = await api.post('/tryon/jobs/', formData, {
         headers: {
           'Content-Type': 'multipart/form-data'
         }
       });
 
-      setTryOnResult(response.data);
+      // The render runs on a try-on worker; poll until it is done, less
+      // often the further back in the queue the job is
+      let job = submitted.data;
+      setJobStatus(job);
+      while (job.status === 'pending' || job.status === 'processing') {
+        const delay = Math.min(500 + (job.position || 0) * 250, 3000);
+        await new Promise((resolve) => setTimeout(resolve, delay));
+        const response = await api.get(`/tryon/results/${job.job_id}/`);
+        job = response.data;
+        setJobStatus(job);
+      }
+      if (job.status === 'failed') {
+        setError(job.error || 'Failed to process try-on. Please try again.');
+      } else {
+        setTryOnResult(job);
+      }
     } catch (error) {
       console.error('Error processing try-on:', error);
-      setError('Failed to process try-on. Please try again.');
+      setError(error.response?.data?.error || 'Failed to process try-on. Please try again.');
     } finally {
       setProcessing(false);
+      setJobStatus(null);
+    }
+  };
+
+  const progressMessage = () => {
+    if (jobStatus?.status === 'pending') {
+      return jobStatus.position > 0
+        ? `Waiting for ${jobStatus.position} try-on${jobStatus.position === 1 ? '' : 's'} ahead of yours...`
+        : 'Starting your try-on...';
     }
+    return 'Processing your try-on...';
   };
 
   const clearUserImage = () => {
@@ -353,7 +384,7 @@ const TryOn = () => {
               {processing ? (
                 <>
                   <ArrowPathIcon className="h-5 w-5 mr-2 animate-spin" />
-                  Processing...
+                  {jobStatus?.status === 'pending' ? 'Queued...' : 'Processing...'}
                 </>
               ) : (
                 <>
@@ -401,7 +432,7 @@ const TryOn = () => {
             <div className="text-center py-12">
               <EyeIcon className="h-12 w-12 text-gray-400 mx-auto mb-4" />
               <p className="text-gray-600">
-                {processing ? 'Processing your try-on...' : 'Your try-on result will appear here'}
+                {processing ? progressMessage() : 'Your try-on result will appear here'}
               </p>
             </div>
           )}
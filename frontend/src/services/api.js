@@ -57,6 +57,16 @@ api.interceptors.response.use(
   }
 );
 
+// Header for order and cart mutations that may be retried: the backend runs
+// a request once per key and replays its response to retries with the same key
+export const idempotencyHeaders = (key) => ({ 'Idempotency-Key': key });
+
+export const newIdempotencyKey = () => (
+  window.crypto?.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+);
+
 // Auth API
 export const authAPI = {
   login: (credentials) => {
@@ -79,6 +89,7 @@ export const productsAPI = {
   getCategories: () => api.get('/catalog/categories/'),
   getBrands: () => api.get('/catalog/brands/'),
   searchProducts: (query) => api.get(`/catalog/products/search/?q=${query}`),
+  suggest: (query, limit = 8) => api.get('/catalog/suggest/', { params: { q: query, limit } }),
 };
 
 // Try-on API